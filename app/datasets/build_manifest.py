@@ -0,0 +1,78 @@
+import os
+import glob
+import hashlib
+from typing import Dict, List, Optional
+
+
+# A manifest record describes the files consumed or produced by a build task
+# as {path: [size, mtime_ns, sha1]}. The size and mtime serve only as a cache
+# key, so that unchanged files are not hashed again on every build.
+
+APP_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sha1_of_file(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def collect_files(globs: List[str]) -> List[str]:
+    paths = set()
+    for pattern in globs:
+        paths.update(p for p in glob.glob(pattern) if os.path.isfile(p))
+    return sorted(paths)
+
+
+def describe_files(
+    globs: List[str],
+    previous: Optional[Dict[str, list]] = None
+) -> Dict[str, list]:
+    """Builds the manifest record of the files matching the globs,
+    reusing hashes of the previous record for files with the same
+    size and modification time"""
+    previous = previous or {}
+    record = {}
+    for path in collect_files(globs):
+        stat = os.stat(path)
+        cached = previous.get(path)
+        if cached is not None and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            record[path] = cached
+        else:
+            record[path] = [stat.st_size, stat.st_mtime_ns, sha1_of_file(path)]
+    return record
+
+
+def files_are_intact(record: Dict[str, list]) -> bool:
+    """Checks that the recorded outputs still exist, untouched"""
+    for path, (size, mtime_ns, _) in record.items():
+        if not os.path.isfile(path):
+            return False
+        stat = os.stat(path)
+        if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+            return False
+    return True
+
+
+def source_fingerprint(*paths: str, extra: str = "") -> str:
+    """
+    Version fingerprint of a build stage, computed from its source code.
+    Paths are relative to the `app` package, folders are taken recursively.
+    Anything else the stage depends on (e.g. parameters) goes into the extra.
+    """
+    digest = hashlib.sha1(extra.encode("utf-8"))
+    for path in paths:
+        full_path = os.path.join(APP_PATH, path)
+        if os.path.isdir(full_path):
+            files = sorted(glob.glob(
+                os.path.join(full_path, "**", "*.py"), recursive=True
+            ))
+        else:
+            files = [full_path]
+        for file_path in files:
+            digest.update(os.path.relpath(file_path, APP_PATH).encode("utf-8"))
+            with open(file_path, "rb") as file:
+                digest.update(hashlib.sha1(file.read()).digest())
+    return digest.hexdigest()
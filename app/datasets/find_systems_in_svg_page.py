@@ -1,5 +1,6 @@
 import re
-from svgelements import *
+from typing import Tuple
+from .svg_page_geometry import scan_svg_page, union_bbox
 
 
 def _svg_path_to_signature(d: str):
@@ -8,6 +9,21 @@ def _svg_path_to_signature(d: str):
     return re.sub(r"-?\d+(\.\d+)?", "_", d)
 
 
+_PATH_COMMAND_RE = re.compile(r"([MmZzLlHhVvCcSsQqTtAa])")
+_PATH_NUMBER_RE = re.compile(r"_|-?\d+(?:\.\d+)?")
+
+
+def _svg_path_to_structure(d: str) -> Tuple:
+    """The sequence of path commands with the number of their arguments.
+    It equals for two paths exactly when their signatures do
+    (up to the separators, which MuseScore writes always the same)."""
+    parts = _PATH_COMMAND_RE.split(d)
+    return tuple(
+        (parts[i], len(_PATH_NUMBER_RE.findall(parts[i + 1])))
+        for i in range(1, len(parts), 2)
+    )
+
+
 PIANO_BRACKET_SIGNATURES = [
     "M_,_ C_,_ _,_ _,_ C_,_ _,_ _,_ C_,_ _,_ _,_ C_,_ _,_ _,_ C_,_ _,_ _,_ C_,_ _,_ _,_ C_,_ _,_ _,_ C_,_ _,_ _,_ C_,_ _,_ _,_ L_,_ L_,_ C_,_ _,_ _,_ C_,_ _,_ _,_ C_,_ _,_ _,_ C_,_ _,_ _,_ C_,_ _,_ _,_ C_,_ _,_ _,_ C_,_ _,_ _,_ C_,_ _,_ _,_",
 
@@ -26,10 +42,86 @@ NON_PIANO_BRACKET_SIGNATURES = [
 ]
 
 
+# signatures precompiled to their structures
+PIANO_BRACKET_STRUCTURES = frozenset(
+    _svg_path_to_structure(s) for s in PIANO_BRACKET_SIGNATURES
+)
+NON_PIANO_BRACKET_STRUCTURES = frozenset(
+    _svg_path_to_structure(s) for s in NON_PIANO_BRACKET_SIGNATURES
+)
+
+
 def find_systems_in_svg_page(
     svg_path: str,
     bracket_grow=1.1, # multiplier
 ):
+    """Detects the bounding boxes of piano systems on a MuseScore SVG page.
+    The SVG file is streamed and only the Bracket and StaffLines elements
+    are parsed. Brackets are told apart by their path structures,
+    so that only piano brackets get their path coordinates parsed."""
+    page = scan_svg_page(svg_path, ["Bracket", "StaffLines"])
+    
+    # vertical pixel ranges (from-to) for system stafflines
+    system_ranges = []
+    for element in page.elements:
+        if element.css_class == "Bracket":
+            d = element.attributes.get("d", "")
+            structure = _svg_path_to_structure(d)
+            if structure in NON_PIANO_BRACKET_STRUCTURES:
+                continue
+            if structure not in PIANO_BRACKET_STRUCTURES:
+                print("UNKNOWN BRACKET:", d)
+                print(_svg_path_to_signature(d))
+                continue
+
+            _, start, _, stop = element.bbox(with_stroke=True)
+            height = stop - start
+            start -= height * (bracket_grow - 1) / 2
+            stop += height * (bracket_grow - 1) / 2
+            system_ranges.append((start, stop))
+    system_ranges.sort(key=lambda range: range[0])
+    
+    # check the number is reasonable (these actually occur in the corpus)
+    assert len(system_ranges) in [0, 1, 2, 3, 4, 5, 6]
+    
+    # sort stafflines into system bins
+    system_stafflines = [[] for _ in system_ranges]
+    for element in page.elements:
+        if element.css_class == "StaffLines":
+            _, y, _, _ = element.bbox()
+            for i, (start, stop) in enumerate(system_ranges):
+                if start <= y and y <= stop:
+                    system_stafflines[i].append(element)
+    
+    # get system bounding boxes (tight)
+    system_bboxes = [
+        union_bbox([element.bbox() for element in stafflines])
+        for stafflines in system_stafflines
+    ]
+    
+    return {
+        "page_width": int(page.width),
+        "page_height": int(page.height),
+        "systems": [
+            {
+                "left": int(x1),
+                "top": int(y1),
+                "right": int(x2),
+                "bottom": int(y2)
+            }
+            for x1, y1, x2, y2 in system_bboxes
+        ],
+    }
+
+
+def find_systems_in_svg_page_svgelements(
+    svg_path: str,
+    bracket_grow=1.1, # multiplier
+):
+    """The original implementation of find_systems_in_svg_page, parsing
+    the whole SVG file with svgelements, kept as the reference"""
+    from svgelements import SVG, Group
+
     with open(svg_path) as file:
         svg_file: SVG = SVG.parse(file, reify=True)
     
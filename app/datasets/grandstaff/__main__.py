@@ -32,6 +32,11 @@ build_parser.add_argument(
     "--soft", action="store_true", default=False,
     help="Skips processing for already processed files"
 )
+build_parser.add_argument(
+    "--musescore_workers", type=int, default=1,
+    help="Number of MuseScore processes converting the files " + \
+        "(each on its own Xvfb display when more than one)"
+)
 
 subparsers.add_parser(
     "tar-dataset",
@@ -63,7 +68,8 @@ if args.command_name == "build":
     build(
         slice_index=args.slice_index,
         slice_count=args.slice_count,
-        soft=args.soft
+        soft=args.soft,
+        musescore_workers=args.musescore_workers
     )
 elif args.command_name == "tar-dataset":
     tar_path = os.path.realpath(GRANDSTAFF_DATASET_PATH + "-lmx.tgz")
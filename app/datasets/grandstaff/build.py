@@ -4,17 +4,17 @@ import sys
 import xml.etree.ElementTree as ET
 from ...linearization.Linearizer import Linearizer
 from ...symbolic.part_to_score import part_to_score
-from ..config import GRANDSTAFF_DATASET_PATH, MSCORE
+from ..config import GRANDSTAFF_DATASET_PATH
+from ..musescore_pool import MuseScorePool
 import music21
-import tempfile
-import json
-from typing import List
+from typing import List, Set
 
 
 def build(
     slice_index: int,
     slice_count: int,
-    soft: bool
+    soft: bool,
+    musescore_workers: int = 1
 ):
     # load files to parse
     paths = glob.glob(
@@ -26,7 +26,13 @@ def build(
     print(f"Loaded {len(paths)} paths to convert, slice {slice_index}/{slice_count}")
 
     _kern_to_crude_musicxml(paths, soft)
-    _refine_musicxml_via_musescore(paths, soft)
+    failed_paths = _refine_musicxml_via_musescore(paths, soft, musescore_workers)
+    if len(failed_paths) > 0:
+        print(
+            f"Leaving out {len(failed_paths)} paths, MuseScore failed to convert them:",
+            *failed_paths, sep="\n", file=sys.stderr
+        )
+        paths = [path for path in paths if path not in failed_paths]
     _finalize_lmx_and_musicxml_annotations(paths)
 
 
@@ -140,12 +146,17 @@ def _load_kern_file(path: str) -> str:
     return "".join(lines) # each line already contains "\n"
 
 
-def _refine_musicxml_via_musescore(base_paths: List[str], soft: bool):
+def _refine_musicxml_via_musescore(
+    base_paths: List[str],
+    soft: bool,
+    musescore_workers: int
+) -> Set[str]:
     """We feed the crude musicxml files through musescore to normalize voice numbers,
-    measure numbers, part IDs, etc. - to get the "canonical" MusicXML document."""
+    measure numbers, part IDs, etc. - to get the "canonical" MusicXML document.
+    Returns the base paths that failed to convert."""
 
-    # create the conversion json file
-    print(f"Preparing musescore batch file...")
+    # create the conversion list
+    print(f"Preparing musescore conversions...")
     conversion = []
     for base_path in base_paths:
         if soft:
@@ -157,20 +168,17 @@ def _refine_musicxml_via_musescore(base_paths: List[str], soft: bool):
         })
     
     if len(conversion) == 0:
-        return
+        return set()
 
     # run musescore conversion
-    tmp = tempfile.NamedTemporaryFile(mode="w", delete=False)
-    try:
-        json.dump(conversion, tmp)
-        tmp.close()
-
-        assert os.system(
-            f"{MSCORE} -j \"{tmp.name}\""
-        ) == 0
-    finally:
-        tmp.close()
-        os.unlink(tmp.name)
+    log_path = os.path.join(GRANDSTAFF_DATASET_PATH, "musescore-conversions.jsonl")
+    with MuseScorePool(musescore_workers, log_path=log_path) as pool:
+        records = pool.convert(conversion)
+    
+    return set(
+        record["out"][:-len(".musescore.musicxml")]
+        for record in records if record["status"] != "ok"
+    )
 
 
 def _finalize_lmx_and_musicxml_annotations(base_paths: List[str]):
@@ -1,16 +1,23 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import os
-import tempfile
-import json
-from .config import LIEDER_CORPUS_PATH, MSCORE
+import sys
+from .config import LIEDER_CORPUS_PATH
+from .musescore_pool import MuseScorePool, find_conversion_outputs
+
+
+# per-file conversion records are appended here
+MUSESCORE_LOG_PATH = os.path.join(LIEDER_CORPUS_PATH, "musescore-conversions.jsonl")
 
 
 def musescore_corpus_conversion(
     scores: Dict[int, Dict[str, Any]],
     format="mxl",
-    soft=False
-):
-    """Executes MuseScore batch conversion on the OpenScore-Lieder corpus for selected scores"""
+    soft=False,
+    pool: Optional[MuseScorePool] = None
+) -> List[dict]:
+    """Executes MuseScore batch conversion on the OpenScore-Lieder corpus for selected scores.
+    Returns the conversion records (see MuseScorePool), failed conversions
+    are reported, but do not stop the others (see drop_failed_scores)."""
 
     # create the conversion json file
     conversion = []
@@ -22,11 +29,7 @@ def musescore_corpus_conversion(
 
         # skip already exported files
         if soft:
-            if os.path.isfile(out_path):
-                continue
-            if os.path.isfile(out_path.replace(f".{format}", f"-1.{format}")):
-                continue
-            if os.path.isfile(out_path.replace(f".{format}", f"-01.{format}")):
+            if len(find_conversion_outputs(out_path)) > 0:
                 continue
 
         conversion.append({
@@ -35,23 +38,36 @@ def musescore_corpus_conversion(
         })
     
     if len(conversion) == 0:
-        return
+        return []
+    
+    # run musescore conversion (each pool worker has its own settings,
+    # so MuseScore does not remember not to print page and system breaks)
+    if pool is not None:
+        return pool.convert(conversion)
+    with MuseScorePool(log_path=MUSESCORE_LOG_PATH) as pool:
+        return pool.convert(conversion)
+
+
+def drop_failed_scores(
+    scores: Dict[int, Dict[str, Any]],
+    records: List[dict]
+) -> Dict[int, Dict[str, Any]]:
+    """Returns the scores without those whose conversion failed (even after
+    the retries), so that the later build stages do not process them"""
+    failed_inputs = set(r["in"] for r in records if r["status"] != "ok")
+    if len(failed_inputs) == 0:
+        return scores
     
-    # run musescore conversion
-    tmp = tempfile.NamedTemporaryFile(mode="w", delete=False)
-    try:
-        json.dump(conversion, tmp)
-        tmp.close()
-
-        # clear musescore settings, since it may remember not to print
-        # page and system breaks, but we do want those to be printed
-        assert os.system(
-            f"rm -f ~/.config/MuseScore/MuseScore3.ini"
-        ) == 0
-
-        assert os.system(
-            f"{MSCORE} -j \"{tmp.name}\""
-        ) == 0
-    finally:
-        tmp.close()
-        os.unlink(tmp.name)
+    kept_scores = {}
+    for score_id, score in scores.items():
+        in_path = os.path.join(
+            LIEDER_CORPUS_PATH, "scores", score["path"], f"lc{score_id}.mscx"
+        )
+        if in_path in failed_inputs:
+            print(
+                f"Leaving out the score {score_id}, MuseScore failed to convert:",
+                in_path, file=sys.stderr
+            )
+            continue
+        kept_scores[score_id] = score
+    return kept_scores
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import queue
+import shutil
+import tempfile
+import threading
+import subprocess
+from typing import Dict, List, Optional
+from .config import MSCORE
+
+
+def find_conversion_outputs(out_path: str) -> List[str]:
+    """MuseScore writes multi-page formats (svg, png) page by page,
+    as `name-1.svg` or `name-01.svg`, instead of the requested `name.svg`"""
+    base, extension = os.path.splitext(out_path)
+    candidates = [
+        out_path,
+        base + "-1" + extension,
+        base + "-01" + extension
+    ]
+    return [path for path in candidates if os.path.isfile(path)]
+
+
+class _Worker:
+    """One MuseScore slot: its own X display (optionally a private Xvfb
+    server, kept for the lifetime of the pool) and its own MuseScore
+    settings folder (so that no settings leak between conversions)"""
+    def __init__(self, index: int, xvfb: bool):
+        self.index = index
+        self.folder = tempfile.mkdtemp(prefix=f"musescore-{index}-")
+        self.env = dict(os.environ)
+        self.env["XDG_CONFIG_HOME"] = os.path.join(self.folder, "config")
+        self.xvfb_process = None
+        if xvfb:
+            self._start_xvfb()
+
+    def _start_xvfb(self):
+        read_fd, write_fd = os.pipe()
+        self.xvfb_process = subprocess.Popen(
+            [
+                "Xvfb", "-displayfd", str(write_fd),
+                "-screen", "0", "1280x1024x24", "-nolisten", "tcp"
+            ],
+            pass_fds=(write_fd,),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        os.close(write_fd)
+        with os.fdopen(read_fd) as display_file:
+            display = display_file.readline().strip()
+        if display == "":
+            raise Exception("Xvfb failed to start")
+        self.env["DISPLAY"] = ":" + display
+
+    def close(self):
+        if self.xvfb_process is not None:
+            self.xvfb_process.terminate()
+            self.xvfb_process.wait()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+class MuseScorePool:
+    """
+    Executes MuseScore batch conversions (the `-j` job format) in K worker
+    slots. The conversion list is sharded into job files of batch_size
+    items and the slots take them from a queue. An item whose output is
+    missing after its batch (the batch may crash at any item) is retried
+    alone, up to `retries` times. Every item gets a record with its status,
+    the number of attempts, the worker and the conversion time. Within a
+    batch, the time is measured between the completions of consecutive
+    outputs (MuseScore converts the items one after another), so the first
+    item of a batch also includes the MuseScore startup.
+
+    The command is the MuseScore executable (with any leading arguments),
+    which can be replaced by any program accepting `-j job.json`.
+    """
+    def __init__(
+        self,
+        workers: int = 1,
+        command: Optional[List[str]] = None,
+        xvfb: Optional[bool] = None,
+        batch_size: int = 16,
+        retries: int = 1,
+        timeout: float = 600,
+        log_path: Optional[str] = None
+    ):
+        assert workers >= 1
+        self.command = list(command or [MSCORE])
+        if xvfb is None:
+            # a private display is needed when there is none, or when
+            # several MuseScore instances should not share one
+            xvfb = shutil.which("Xvfb") is not None \
+                and (workers > 1 or "DISPLAY" not in os.environ)
+        self.batch_size = batch_size
+        self.retries = retries
+        self.timeout = timeout
+        self.log_path = log_path
+        self._workers = []
+        try:
+            for i in range(workers):
+                self._workers.append(_Worker(i, xvfb))
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self) -> "MuseScorePool":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+        self._workers = []
+
+    def convert(self, conversion: List[Dict[str, str]]) -> List[dict]:
+        """Converts the items ({"in": path, "out": path}) and returns
+        their records, in the order of the items"""
+        records = [
+            {"in": item["in"], "out": item["out"], "status": "pending",
+                "attempts": 0, "seconds": None, "worker": None}
+            for item in conversion
+        ]
+        batches = queue.Queue()
+        for start in range(0, len(records), self.batch_size):
+            batches.put(records[start:start + self.batch_size])
+
+        threads = [
+            threading.Thread(target=self._work, args=(worker, batches))
+            for worker in self._workers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        failed = [r for r in records if r["status"] != "ok"]
+        print(
+            f"MuseScore converted {len(records) - len(failed)} files " +
+            f"({len(failed)} failed) on {len(self._workers)} workers."
+        )
+        for record in failed:
+            print("MuseScore conversion failed:", record["in"], file=sys.stderr)
+
+        if self.log_path is not None:
+            with open(self.log_path, "a") as file:
+                for record in records:
+                    print(json.dumps(record), file=file)
+
+        return records
+
+    def _work(self, worker: _Worker, batches: queue.Queue):
+        while True:
+            try:
+                batch = batches.get_nowait()
+            except queue.Empty:
+                return
+            self._run_batch(worker, batch)
+            for _ in range(self.retries):
+                missing = [r for r in batch if r["status"] != "ok"]
+                for record in missing:
+                    self._run_batch(worker, [record])
+
+    def _run_batch(self, worker: _Worker, batch: List[dict]):
+        job_path = os.path.join(worker.folder, "job.json")
+        with open(job_path, "w") as file:
+            json.dump([{"in": r["in"], "out": r["out"]} for r in batch], file)
+
+        start_time = time.time()
+        try:
+            subprocess.run(
+                [*self.command, "-j", job_path],
+                env=worker.env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=self.timeout * len(batch)
+            )
+        except subprocess.TimeoutExpired:
+            pass
+        end_time = time.time()
+
+        # outputs written (or rewritten) by this run, in their order
+        finished = []
+        for record in batch:
+            record["attempts"] += 1
+            record["worker"] = worker.index
+            outputs = find_conversion_outputs(record["out"])
+            if len(outputs) == 0:
+                record["status"] = "failed"
+                continue
+            written = max(os.path.getmtime(path) for path in outputs)
+            if written < start_time - 1: # mtime resolution
+                record["status"] = "failed"
+                continue
+            record["status"] = "ok"
+            finished.append((min(max(written, start_time), end_time), record))
+
+        previous = start_time
+        for written, record in sorted(finished, key=lambda pair: pair[0]):
+            record["seconds"] = round(written - previous, 3)
+            previous = written
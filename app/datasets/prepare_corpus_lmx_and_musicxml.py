@@ -2,6 +2,7 @@ import os
 from typing import Dict, Any
 from .config import LIEDER_CORPUS_PATH
 from ..symbolic.MxlFile import MxlFile
+from ..symbolic.PianoPartStream import PianoPartStream
 from ..linearization.Linearizer import Linearizer
 from ..symbolic.split_part_to_systems import split_part_to_systems
 from ..symbolic.part_to_score import part_to_score
@@ -29,8 +30,9 @@ def prepare_corpus_lmx_and_musicxml(
 
         print("Preparing LMX and MusicXML:", score_folder, "...")
         
-        mxl = MxlFile.load_mxl(mxl_path)
-        part = mxl.get_piano_part()
+        # only the piano part is built, other parts are skipped while parsing
+        with MxlFile.open_mxl(mxl_path) as file:
+            part = PianoPartStream(file).load_part()
         pages = split_part_to_systems(part)
 
         for pi, page in enumerate(pages):
@@ -0,0 +1,39 @@
+import os
+import glob
+import json
+from typing import Dict, Any
+from .config import LIEDER_CORPUS_PATH
+from .find_systems_in_svg_page import find_systems_in_svg_page
+from .rasterize_svg_page import rasterize_svg_page
+
+
+def prepare_corpus_single_render_pages(scores: Dict[int, Dict[str, Any]]):
+    """Derives both the page geometry and the PNG page from the SVG page,
+    replacing the MuseScore PNG export and prepare_corpus_page_geometries"""
+    for score_id, score in scores.items():
+        score_folder = os.path.join(LIEDER_CORPUS_PATH, "scores", score["path"])
+
+        svg_glob = os.path.join(glob.escape(score_folder), f"lc{score_id}-*.svg")
+        for svg_path in sorted(glob.glob(svg_glob)):
+            basename = os.path.basename(svg_path)
+            page_number_str = basename[len(f"lc{score_id}-"):-len(".svg")]
+
+            print("Detecting page geometry and rasterizing:", svg_path, "...")
+            page_geometry = find_systems_in_svg_page(svg_path)
+
+            page_geometry_filename = os.path.join(
+                score_folder,
+                f"lc{score_id}-{page_number_str}.geometry.json"
+            )
+            with open(page_geometry_filename, "w") as file:
+                json.dump(page_geometry, file, indent=2)
+
+            rasterize_svg_page(
+                svg_path=svg_path,
+                png_path=os.path.join(
+                    score_folder,
+                    f"lc{score_id}-{page_number_str}.png"
+                ),
+                width=page_geometry["page_width"],
+                height=page_geometry["page_height"]
+            )
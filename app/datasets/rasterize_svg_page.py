@@ -0,0 +1,16 @@
+def rasterize_svg_page(svg_path: str, png_path: str, width: int, height: int):
+    """Renders the SVG page into a PNG of the given size, on a transparent
+    background (as the PNG pages exported by MuseScore)"""
+    try:
+        import cairosvg
+    except ImportError:
+        raise Exception(
+            "Rasterizing SVG pages requires the cairosvg package " +
+            "(pip install cairosvg)"
+        )
+    cairosvg.svg2png(
+        url=svg_path,
+        write_to=png_path,
+        output_width=width,
+        output_height=height
+    )
@@ -1,13 +1,14 @@
 import os
 import yaml
 from ..config import SCANNED_DATASET_PATH
-from ..musescore_corpus_conversion import musescore_corpus_conversion
+from ..musescore_corpus_conversion import musescore_corpus_conversion, \
+    drop_failed_scores
 from ..prepare_corpus_lmx_and_musicxml import prepare_corpus_lmx_and_musicxml
 from ..take_scores import take_scores
 from ..transfer_samples import transfer_samples
-from ..crop_system_from_png_page import crop_system_from_png_page
+from ..crop_system_from_png_page import PageCropper
 from .prepare_imslp_pngs import prepare_imslp_pngs
-from typing import Optional
+from typing import Optional, Dict, List, Tuple
 
 
 def build(
@@ -26,8 +27,9 @@ def build(
         inspect=inspect
     )
 
-    # prepare corpus MXL files
-    musescore_corpus_conversion(scores=scores, format="mxl", soft=soft)
+    # prepare corpus MXL files (scores failing to convert are left out)
+    records = musescore_corpus_conversion(scores=scores, format="mxl", soft=soft)
+    scores = drop_failed_scores(scores, records)
 
     # split xml files into systems and convert to sequences
     prepare_corpus_lmx_and_musicxml(scores=scores, soft=soft)
@@ -51,9 +53,11 @@ def build(
     # make sure all IMSLP PNGs are extracted
     prepare_imslp_pngs()
     
-    # crop out PNG images
+    # collect the systems to crop out, by IMSLP page
+    systems_maps: Dict[str, Optional[dict]] = {}
+    page_systems: Dict[str, List[Tuple[tuple, str]]] = {}
     for score_id, score in scores.items():
-        print("Cropping out PNG systems for", score_id, "...")
+        print("Collecting PNG systems for", score_id, "...")
 
         # get the defined mapping
         mappings_path = os.path.join(
@@ -67,10 +71,31 @@ def build(
         
         # go through all the defined system mappings
         for sample, mapping in mappings.items():
-            process_sample(sample, mapping)
+            resolved = process_sample(sample, mapping, systems_maps)
+            if resolved is not None:
+                page_png, bbox, out_system_png = resolved
+                page_systems.setdefault(page_png, []).append((bbox, out_system_png))
 
+    # crop out PNG images, each page is decoded only once
+    with PageCropper() as cropper:
+        for page_png, systems in page_systems.items():
+            print("Cropping out PNG systems from", page_png, "...")
+            cropper.crop_page(
+                page_png=page_png,
+                bboxes=[bbox for bbox, _ in systems],
+                out_system_pngs=[out_system_png for _, out_system_png in systems]
+            )
+
+
+def process_sample(
+    sample: str,
+    mapping,
+    systems_maps: Dict[str, Optional[dict]]
+) -> Optional[Tuple[str, tuple, str]]:
+    """Resolves the sample into the IMSLP page PNG, the system bounding box
+    and the output PNG path. The loaded IMSLP systems maps are cached
+    in the given dictionary."""
 
-def process_sample(sample: str, mapping):
     # extract mapping data
     imslp_id = mapping["imslpDocument"][1:] # without hash
     imslp_page = mapping["imslpPage"]
@@ -80,11 +105,16 @@ def process_sample(sample: str, mapping):
     systems_path = os.path.join(
         SCANNED_DATASET_PATH, "imslp_systems", "IMSLP" + imslp_id + ".yaml"
     )
-    if not os.path.isfile(systems_path):
+    if systems_path not in systems_maps:
+        if os.path.isfile(systems_path):
+            with open(systems_path) as file:
+                systems_maps[systems_path] = yaml.safe_load(file)
+        else:
+            systems_maps[systems_path] = None
+    systems_map = systems_maps[systems_path]
+    if systems_map is None:
         print("[ERROR] Missing IMSLP systems file:", systems_path)
         return
-    with open(systems_path) as file:
-        systems_map = yaml.safe_load(file)
     pages = systems_map["pages"]
     if imslp_page not in pages:
         print(f"[ERROR] Page {imslp_page} not found in", systems_path)
@@ -99,14 +129,14 @@ def process_sample(sample: str, mapping):
     # get the bounding box
     bbox = system["boundingBox"]
 
-    crop_system_from_png_page(
-        page_png=os.path.join(SCANNED_DATASET_PATH, "imslp_pngs", *page["image"].split("/")),
-        bbox=(
+    return (
+        os.path.join(SCANNED_DATASET_PATH, "imslp_pngs", *page["image"].split("/")),
+        (
             bbox["left"],
             bbox["top"],
             bbox["left"] + bbox["width"],
             bbox["top"] + bbox["height"]
         ),
-        out_system_png=os.path.join(SCANNED_DATASET_PATH, "samples", sample + ".png")
+        os.path.join(SCANNED_DATASET_PATH, "samples", sample + ".png")
     )
 
@@ -33,11 +33,13 @@ def load_workbench(score_id: int):
     
     start_page = int(input("Enter the starting page: "))
 
-    musescore_corpus_conversion(
+    records = musescore_corpus_conversion(
         {score_id: all_scores[score_id]},
         format="svg",
         soft=True
     )
+    if any(record["status"] != "ok" for record in records):
+        raise Exception(f"MuseScore failed to export SVG pages of {score_id}")
 
     svg_pages = detect_systems_in_svg(score_id)
     imslp_pages = get_imslp_pages(imslp_id, start_page, len(svg_pages))
@@ -0,0 +1,421 @@
+import re
+import math
+import xml.parsers.expat
+from typing import Dict, List, Optional, Tuple
+
+
+# Streaming (SAX) reading of MuseScore SVG pages. Only the elements
+# with the requested classes are parsed, everything else is skipped while
+# tracking the transforms and the inherited stroke of the enclosing groups.
+# Bounding boxes are computed the same way as by svgelements with reify=True
+# (transforms applied to the coordinates, tight bounds of the curves).
+
+Matrix = Tuple[float, float, float, float, float, float] # a, b, c, d, e, f
+BBox = Tuple[float, float, float, float] # x1, y1, x2, y2
+
+IDENTITY: Matrix = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+# pixels per unit, at 96 DPI (with the rounded inches per centimeter
+# of svgelements, so that the bounding boxes stay the same)
+LENGTH_UNITS = {
+    "": 1.0, "px": 1.0, "pt": 4 / 3, "pc": 16.0,
+    "in": 96.0, "cm": 96 * 0.393701, "mm": 96 * 0.0393701
+}
+
+NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+PATH_TOKEN_RE = re.compile(
+    r"([MmLlHhVvCcSsQqTtAaZz])|([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+)
+TRANSFORM_RE = re.compile(r"(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)")
+
+
+class SvgElement:
+    """An element of the requested class, with its absolute transform"""
+    def __init__(
+        self,
+        tag: str,
+        attributes: Dict[str, str],
+        matrix: Matrix,
+        stroke: Optional[str],
+        stroke_width: float
+    ):
+        self.tag = tag
+        self.attributes = attributes
+        self.matrix = matrix
+        self.stroke = stroke
+        self.stroke_width = stroke_width
+
+    @property
+    def css_class(self) -> Optional[str]:
+        return self.attributes.get("class")
+
+    def bbox(self, with_stroke=False) -> Optional[BBox]:
+        if self.tag == "path":
+            bbox = path_bbox(self.attributes.get("d", ""), self.matrix)
+        elif self.tag in ["polyline", "polygon"]:
+            bbox = points_bbox(self.attributes.get("points", ""), self.matrix)
+        elif self.tag == "line":
+            bbox = points_bbox(" ".join(
+                self.attributes.get(name, "0")
+                for name in ["x1", "y1", "x2", "y2"]
+            ), self.matrix)
+        elif self.tag == "rect":
+            x = parse_length(self.attributes.get("x", "0"))
+            y = parse_length(self.attributes.get("y", "0"))
+            w = parse_length(self.attributes.get("width", "0"))
+            h = parse_length(self.attributes.get("height", "0"))
+            bbox = points_bbox(
+                f"{x},{y} {x + w},{y} {x + w},{y + h} {x},{y + h}",
+                self.matrix
+            )
+        else:
+            raise Exception(f"Unsupported SVG element {self.tag}")
+
+        if bbox is None or not with_stroke or not self.has_stroke:
+            return bbox
+        a, b, c, d, _, _ = self.matrix
+        delta = self.stroke_width * math.sqrt(abs(a * d - b * c)) / 2
+        x1, y1, x2, y2 = bbox
+        return (x1 - delta, y1 - delta, x2 + delta, y2 + delta)
+
+    @property
+    def has_stroke(self) -> bool:
+        return self.stroke is not None and self.stroke != "none"
+
+
+def union_bbox(bboxes: List[Optional[BBox]]) -> Optional[BBox]:
+    bboxes = [b for b in bboxes if b is not None]
+    if len(bboxes) == 0:
+        return None
+    return (
+        min(b[0] for b in bboxes),
+        min(b[1] for b in bboxes),
+        max(b[2] for b in bboxes),
+        max(b[3] for b in bboxes)
+    )
+
+
+def parse_length(value: str) -> Optional[float]:
+    match = re.fullmatch(r"\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([a-z]*)\s*", value)
+    if match is None or match.group(2) not in LENGTH_UNITS:
+        return None
+    return float(match.group(1)) * LENGTH_UNITS[match.group(2)]
+
+
+def multiply(m1: Matrix, m2: Matrix) -> Matrix:
+    """Returns the matrix applying m2 first and then m1"""
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return (
+        a1 * a2 + c1 * b2,
+        b1 * a2 + d1 * b2,
+        a1 * c2 + c1 * d2,
+        b1 * c2 + d1 * d2,
+        a1 * e2 + c1 * f2 + e1,
+        b1 * e2 + d1 * f2 + f1
+    )
+
+
+def parse_transform(value: str) -> Matrix:
+    matrix = IDENTITY
+    for name, args in TRANSFORM_RE.findall(value):
+        numbers = [float(n) for n in NUMBER_RE.findall(args)]
+        if name == "matrix":
+            step = tuple(numbers)
+        elif name == "translate":
+            step = (1.0, 0.0, 0.0, 1.0, numbers[0], numbers[1] if len(numbers) > 1 else 0.0)
+        elif name == "scale":
+            sy = numbers[1] if len(numbers) > 1 else numbers[0]
+            step = (numbers[0], 0.0, 0.0, sy, 0.0, 0.0)
+        elif name == "rotate":
+            angle = math.radians(numbers[0])
+            cos, sin = math.cos(angle), math.sin(angle)
+            step = (cos, sin, -sin, cos, 0.0, 0.0)
+            if len(numbers) == 3:
+                cx, cy = numbers[1], numbers[2]
+                step = multiply(
+                    multiply((1.0, 0.0, 0.0, 1.0, cx, cy), step),
+                    (1.0, 0.0, 0.0, 1.0, -cx, -cy)
+                )
+        elif name == "skewX":
+            step = (1.0, 0.0, math.tan(math.radians(numbers[0])), 1.0, 0.0, 0.0)
+        else:
+            step = (1.0, math.tan(math.radians(numbers[0])), 0.0, 1.0, 0.0, 0.0)
+        matrix = multiply(matrix, step)
+    return matrix
+
+
+def viewbox_matrix(
+    width: float,
+    height: float,
+    viewbox: Optional[str],
+    preserve_aspect_ratio: str = "xMidYMid meet"
+) -> Matrix:
+    """The transform of the viewBox into the viewport of the given size"""
+    if viewbox is None:
+        return IDENTITY
+    vx, vy, vw, vh = [float(n) for n in NUMBER_RE.findall(viewbox)]
+    if vw <= 0 or vh <= 0:
+        return IDENTITY
+    sx, sy = width / vw, height / vh
+    align, *meet_or_slice = preserve_aspect_ratio.split()
+    if align != "none":
+        sx = sy = max(sx, sy) if meet_or_slice == ["slice"] else min(sx, sy)
+    tx, ty = -vx * sx, -vy * sy
+    if "xMid" in align:
+        tx += (width - vw * sx) / 2
+    if "xMax" in align:
+        tx += width - vw * sx
+    if "YMid" in align:
+        ty += (height - vh * sy) / 2
+    if "YMax" in align:
+        ty += height - vh * sy
+    return (sx, 0.0, 0.0, sy, tx, ty)
+
+
+def _apply(matrix: Matrix, x: float, y: float) -> Tuple[float, float]:
+    a, b, c, d, e, f = matrix
+    return (a * x + c * y + e, b * x + d * y + f)
+
+
+def _cubic_extremes(a: List[float]) -> Tuple[float, float]:
+    """Minimum and maximum of a cubic bezier coordinate
+    (the same computation as in svgelements)"""
+    extremizers = [0.0, 1.0]
+    denom = a[0] - 3 * a[1] + 3 * a[2] - a[3]
+    if abs(denom) >= 1e-12:
+        delta = a[1] * a[1] - (a[0] + a[1]) * a[2] + a[2] * a[2] + (a[0] - a[1]) * a[3]
+        if delta >= 0:
+            sqdelta = math.sqrt(delta)
+            tau = a[0] - 2 * a[1] + a[2]
+            r1 = (tau + sqdelta) / denom
+            r2 = (tau - sqdelta) / denom
+            if 0 < r1 < 1:
+                extremizers.append(r1)
+            if 0 < r2 < 1:
+                extremizers.append(r2)
+    else:
+        c = a[1] - a[0]
+        b = 2 * (a[0] - 2 * a[1] + a[2])
+        if b != 0:
+            r0 = -c / b
+            if 0 < r0 < 1:
+                extremizers.append(r0)
+    values = [
+        (1 - t) ** 3 * a[0] + 3 * (1 - t) ** 2 * t * a[1] \
+            + 3 * (1 - t) * t ** 2 * a[2] + t ** 3 * a[3]
+        for t in extremizers
+    ]
+    return min(values), max(values)
+
+
+def _quadratic_extremes(a: List[float]) -> Tuple[float, float]:
+    values = [a[0], a[2]]
+    denom = a[0] - 2 * a[1] + a[2]
+    if denom != 0:
+        t = (a[0] - a[1]) / denom
+        if 0 < t < 1:
+            values.append((1 - t) ** 2 * a[0] + 2 * (1 - t) * t * a[1] + t ** 2 * a[2])
+    return min(values), max(values)
+
+
+def tokenize_path(d: str) -> List[str]:
+    """Splits the path data into commands and numbers"""
+    return [
+        command or number
+        for command, number in PATH_TOKEN_RE.findall(d)
+    ]
+
+
+def path_bbox(d: str, matrix: Matrix = IDENTITY) -> Optional[BBox]:
+    """Tight bounding box of the path data, transformed by the matrix"""
+    tokens = tokenize_path(d)
+    xs: List[float] = []
+    ys: List[float] = []
+
+    x = y = 0.0 # current point
+    start_x = start_y = 0.0 # start of the subpath
+    control = None # last control point (for the smooth curves)
+    command = None
+    i = 0
+
+    def _numbers(count: int) -> List[float]:
+        nonlocal i
+        values = [float(t) for t in tokens[i:i + count]]
+        i += count
+        return values
+
+    def _add_cubic(p0, p1, p2, p3):
+        q = [_apply(matrix, *p) for p in [p0, p1, p2, p3]]
+        xs.extend(_cubic_extremes([p[0] for p in q]))
+        ys.extend(_cubic_extremes([p[1] for p in q]))
+
+    def _add_quadratic(p0, p1, p2):
+        q = [_apply(matrix, *p) for p in [p0, p1, p2]]
+        xs.extend(_quadratic_extremes([p[0] for p in q]))
+        ys.extend(_quadratic_extremes([p[1] for p in q]))
+
+    def _add_point(px, py):
+        tx, ty = _apply(matrix, px, py)
+        xs.append(tx)
+        ys.append(ty)
+
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+            if command in "Zz":
+                x, y = start_x, start_y
+                control = None
+                continue
+        elif command is None:
+            raise Exception(f"Path data does not start with a command: {d[:20]}")
+        elif command == "M":
+            command = "L" # implicit lineto after moveto
+        elif command == "m":
+            command = "l"
+
+        relative = command.islower()
+        ox, oy = (x, y) if relative else (0.0, 0.0)
+        upper = command.upper()
+
+        if upper in "ML":
+            px, py = _numbers(2)
+            x, y = ox + px, oy + py
+            if upper == "M":
+                start_x, start_y = x, y
+            _add_point(x, y)
+            control = None
+        elif upper == "H":
+            x = _numbers(1)[0] + (ox if relative else 0.0)
+            _add_point(x, y)
+            control = None
+        elif upper == "V":
+            y = _numbers(1)[0] + (oy if relative else 0.0)
+            _add_point(x, y)
+            control = None
+        elif upper in "CS":
+            if upper == "C":
+                x1, y1, x2, y2, px, py = _numbers(6)
+                c1 = (ox + x1, oy + y1)
+            else:
+                x2, y2, px, py = _numbers(4)
+                c1 = (2 * x - control[0], 2 * y - control[1]) \
+                    if control is not None else (x, y)
+            c2 = (ox + x2, oy + y2)
+            end = (ox + px, oy + py)
+            _add_cubic((x, y), c1, c2, end)
+            control = c2
+            x, y = end
+        elif upper in "QT":
+            if upper == "Q":
+                x1, y1, px, py = _numbers(4)
+                c1 = (ox + x1, oy + y1)
+            else:
+                px, py = _numbers(2)
+                c1 = (2 * x - control[0], 2 * y - control[1]) \
+                    if control is not None else (x, y)
+            end = (ox + px, oy + py)
+            _add_quadratic((x, y), c1, end)
+            control = c1
+            x, y = end
+        else:
+            raise Exception(f"Unsupported path command {command}")
+
+    if len(xs) == 0:
+        return None
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def points_bbox(points: str, matrix: Matrix = IDENTITY) -> Optional[BBox]:
+    numbers = [float(n) for n in NUMBER_RE.findall(points)]
+    transformed = [
+        _apply(matrix, numbers[k], numbers[k + 1])
+        for k in range(0, len(numbers) - 1, 2)
+    ]
+    if len(transformed) == 0:
+        return None
+    return (
+        min(p[0] for p in transformed),
+        min(p[1] for p in transformed),
+        max(p[0] for p in transformed),
+        max(p[1] for p in transformed)
+    )
+
+
+class SvgPage:
+    """The page size and the elements of the requested classes"""
+    def __init__(self, width: float, height: float, elements: List[SvgElement]):
+        self.width = width
+        self.height = height
+        self.elements = elements
+
+
+def scan_svg_page(svg_path: str, classes: List[str]) -> SvgPage:
+    """Stream-parses the SVG file and collects the elements of the given
+    classes, in the document order"""
+    classes = set(classes)
+    elements: List[SvgElement] = []
+    size = [None, None]
+
+    # [matrix, transform, parent, stroke, stroke-width] of the enclosing
+    # elements, the matrix is resolved only when needed, since most elements
+    # have a transform but are not of the requested classes
+    stack: List[list] = [[IDENTITY, None, None, None, "1"]]
+
+    def _matrix(entry: list) -> Matrix:
+        if entry[0] is None:
+            matrix = _matrix(entry[2])
+            if entry[1] is not None:
+                matrix = multiply(matrix, parse_transform(entry[1]))
+            entry[0] = matrix
+        return entry[0]
+
+    def _start(tag: str, attributes: Dict[str, str]):
+        tag = tag.rsplit(":", 1)[-1]
+        parent = stack[-1]
+        transform = attributes.get("transform")
+        entry = [
+            parent[0] if transform is None else None,
+            transform,
+            parent,
+            attributes.get("stroke", parent[3]),
+            attributes.get("stroke-width", parent[4])
+        ]
+
+        if tag == "svg" and size[0] is None:
+            viewbox = attributes.get("viewBox")
+            vw = vh = None
+            if viewbox is not None:
+                _, _, vw, vh = [float(n) for n in NUMBER_RE.findall(viewbox)]
+            width = parse_length(attributes.get("width", ""))
+            height = parse_length(attributes.get("height", ""))
+            size[0] = width if width is not None else vw
+            size[1] = height if height is not None else vh
+            if size[0] is not None and size[1] is not None:
+                matrix = multiply(_matrix(parent), viewbox_matrix(
+                    size[0], size[1], viewbox,
+                    attributes.get("preserveAspectRatio", "xMidYMid meet")
+                ))
+                if transform is not None:
+                    matrix = multiply(matrix, parse_transform(transform))
+                entry[0] = matrix
+        stack.append(entry)
+
+        if attributes.get("class") in classes:
+            elements.append(SvgElement(
+                tag, attributes, _matrix(entry), entry[3],
+                parse_length(entry[4]) or 0.0
+            ))
+
+    def _end(tag: str):
+        stack.pop()
+
+    parser = xml.parsers.expat.ParserCreate()
+    parser.StartElementHandler = _start
+    parser.EndElementHandler = _end
+    parser.buffer_text = True
+    with open(svg_path, "rb") as file:
+        parser.ParseFile(file)
+
+    return SvgPage(size[0] or 0.0, size[1] or 0.0, elements)
@@ -41,7 +41,24 @@ build_parser.add_argument(
 )
 build_parser.add_argument(
     "--soft", action="store_true", default=False,
-    help="Skips processing for already processed files"
+    help="Skips processing for already processed files " + \
+        "(with --workers, resumes from the stage completion markers)"
+)
+build_parser.add_argument(
+    "--musescore_workers", type=int, default=1,
+    help="Number of MuseScore processes converting the scores " + \
+        "(each on its own Xvfb display when more than one), " + \
+        "has no effect with --workers"
+)
+build_parser.add_argument(
+    "--single_render", action="store_true", default=False,
+    help="Export only SVG pages from MuseScore, rasterize the PNG pages " + \
+        "from them locally (requires cairosvg)"
+)
+build_parser.add_argument(
+    "--workers", type=int, default=None,
+    help="Build the scores in a local process pool, " + \
+        "as a graph of per-score tasks"
 )
 
 subparsers.add_parser(
@@ -87,7 +104,10 @@ elif args.command_name == "build":
         slice_count=args.slice_count,
         inspect=args.inspect,
         linearize_only=args.linearize_only,
-        soft=args.soft
+        soft=args.soft,
+        workers=args.workers,
+        musescore_workers=args.musescore_workers,
+        single_render=args.single_render
     )
 elif args.command_name == "finalize":
     finalize()
@@ -1,11 +1,20 @@
-from typing import Optional
-from ..config import SYNTHETIC_DATASET_PATH
-from ..musescore_corpus_conversion import musescore_corpus_conversion
+import os
+import sys
+import glob
+import shutil
+from typing import Optional, Dict, Any, List
+from ..config import SYNTHETIC_DATASET_PATH, LIEDER_CORPUS_PATH, MSCORE
+from ..musescore_corpus_conversion import musescore_corpus_conversion, \
+    drop_failed_scores, MUSESCORE_LOG_PATH
+from ..musescore_pool import MuseScorePool
 from ..prepare_corpus_lmx_and_musicxml import prepare_corpus_lmx_and_musicxml
 from ..prepare_corpus_png_systems import prepare_corpus_png_systems
 from ..take_scores import take_scores
 from ..transfer_samples import transfer_samples
 from ..prepare_corpus_page_geometries import prepare_corpus_page_geometries
+from ..prepare_corpus_single_render_pages import prepare_corpus_single_render_pages
+from ..task_graph import Task, run_task_graph
+from ..build_manifest import source_fingerprint
 
 
 def build(
@@ -13,7 +22,10 @@ def build(
     slice_count: int,
     inspect: Optional[int],
     linearize_only: bool,
-    soft: bool
+    soft: bool,
+    workers: Optional[int] = None,
+    musescore_workers: int = 1,
+    single_render: bool = False
 ):
     scores, slice_index, slice_count = take_scores(
         train=True,
@@ -24,8 +36,37 @@ def build(
         inspect=inspect
     )
 
-    # prepare corpus MXL files
-    musescore_corpus_conversion(scores=scores, format="mxl", soft=soft)
+    if workers is not None:
+        # the tasks run in separate processes, each export task converts
+        # its score in its own MuseScore process
+        if musescore_workers != 1:
+            print(
+                "The --musescore_workers option has no effect with --workers, " +
+                "up to --workers MuseScore processes run at once.",
+                file=sys.stderr
+            )
+        return build_in_parallel(
+            scores=scores,
+            linearize_only=linearize_only,
+            workers=workers,
+            resume=soft,
+            single_render=single_render
+        )
+
+    with MuseScorePool(musescore_workers, log_path=MUSESCORE_LOG_PATH) as pool:
+        _build_serially(scores, linearize_only, soft, pool, single_render)
+
+
+def _build_serially(
+    scores: Dict[int, Dict[str, Any]],
+    linearize_only: bool,
+    soft: bool,
+    pool: MuseScorePool,
+    single_render: bool
+):
+    # prepare corpus MXL files (scores failing to convert are left out)
+    records = musescore_corpus_conversion(scores=scores, format="mxl", soft=soft, pool=pool)
+    scores = drop_failed_scores(scores, records)
 
     # split xml files into systems and convert to sequences
     prepare_corpus_lmx_and_musicxml(scores=scores, soft=soft)
@@ -47,13 +88,19 @@ def build(
         return
 
     # prepare corpus full-page SVG files
-    musescore_corpus_conversion(scores=scores, format="svg", soft=soft)
+    records = musescore_corpus_conversion(scores=scores, format="svg", soft=soft, pool=pool)
+    scores = drop_failed_scores(scores, records)
 
-    # prepare corpus full-page PNG files
-    musescore_corpus_conversion(scores=scores, format="png", soft=soft)
+    if single_render:
+        # detect systems in SVG pages and rasterize them to PNG pages
+        prepare_corpus_single_render_pages(scores=scores)
+    else:
+        # prepare corpus full-page PNG files
+        records = musescore_corpus_conversion(scores=scores, format="png", soft=soft, pool=pool)
+        scores = drop_failed_scores(scores, records)
 
-    # detect systems in SVG pages
-    prepare_corpus_page_geometries(scores=scores)
+        # detect systems in SVG pages
+        prepare_corpus_page_geometries(scores=scores)
 
     # slice up full-page PNGs to system-level PNGs
     prepare_corpus_png_systems(scores=scores, soft=soft)
@@ -64,4 +111,217 @@ def build(
         corpus_glob="png/*.png",
         dataset_folder=SYNTHETIC_DATASET_PATH
     )
-    
\ No newline at end of file
+
+
+##################
+# Parallel build #
+##################
+
+# The same stages as above, but executed per score as a task graph,
+# with a completion marker for each stage of each score. Markers of the
+# corpus stages live next to their outputs in the corpus (so they survive
+# clearing the dataset), markers of the transfers live in the dataset.
+#
+# The tasks are content-addressed, each marker is a manifest record with
+# the hashes of the stage inputs and outputs and with the fingerprint
+# of the stage source code. A stage is executed again only when these
+# change, e.g. a fix in the Linearizer re-linearizes all the scores,
+# but does not render any page again.
+
+
+def _stage_versions() -> Dict[str, str]:
+    musescore = MSCORE
+    if os.path.isfile(MSCORE):
+        musescore += f" {os.path.getsize(MSCORE)}"
+    return {
+        "export": source_fingerprint(
+            "datasets/musescore_corpus_conversion.py", extra=musescore
+        ),
+        "lmx": source_fingerprint(
+            "datasets/prepare_corpus_lmx_and_musicxml.py",
+            "linearization/Linearizer.py",
+            "linearization/vocabulary.py",
+            "symbolic"
+        ),
+        "geometry": source_fingerprint(
+            "datasets/prepare_corpus_page_geometries.py",
+            "datasets/find_systems_in_svg_page.py",
+            "datasets/svg_page_geometry.py"
+        ),
+        "pages": source_fingerprint(
+            "datasets/prepare_corpus_single_render_pages.py",
+            "datasets/find_systems_in_svg_page.py",
+            "datasets/svg_page_geometry.py",
+            "datasets/rasterize_svg_page.py"
+        ),
+        "png-systems": source_fingerprint(
+            "datasets/prepare_corpus_png_systems.py",
+            "datasets/crop_system_from_png_page.py"
+        ),
+        "transfer": source_fingerprint(
+            "datasets/transfer_samples.py"
+        )
+    }
+
+
+def _score_folder(score: Dict[str, Any]) -> str:
+    return os.path.join(LIEDER_CORPUS_PATH, "scores", score["path"])
+
+
+def _export_score(score_id: int, score: Dict[str, Any], format: str):
+    records = musescore_corpus_conversion(scores={score_id: score}, format=format)
+    if any(record["status"] != "ok" for record in records):
+        raise Exception(f"MuseScore failed to export lc{score_id}.{format}")
+
+
+def _split_score(score_id: int, score: Dict[str, Any]):
+    # start from scratch so that no system of an interrupted run survives
+    for folder in ["lmx", "musicxml"]:
+        shutil.rmtree(os.path.join(_score_folder(score), folder), ignore_errors=True)
+    prepare_corpus_lmx_and_musicxml(scores={score_id: score})
+
+
+def _detect_score_geometries(score_id: int, score: Dict[str, Any]):
+    prepare_corpus_page_geometries(scores={score_id: score})
+
+
+def _render_score_pages(score_id: int, score: Dict[str, Any]):
+    prepare_corpus_single_render_pages(scores={score_id: score})
+
+
+def _crop_score_systems(score_id: int, score: Dict[str, Any]):
+    shutil.rmtree(os.path.join(_score_folder(score), "png"), ignore_errors=True)
+    prepare_corpus_png_systems(scores={score_id: score})
+
+
+def _transfer_score_samples(score_id: int, score: Dict[str, Any], globs: List[str]):
+    # remove the previous copies, the score may now have fewer systems
+    sample_folder = os.path.join(SYNTHETIC_DATASET_PATH, "samples", str(score_id))
+    for corpus_glob in globs:
+        for path in glob.glob(os.path.join(
+            glob.escape(sample_folder), os.path.basename(corpus_glob)
+        )):
+            os.remove(path)
+
+    for corpus_glob in globs:
+        transfer_samples(
+            scores={score_id: score},
+            corpus_glob=corpus_glob,
+            dataset_folder=SYNTHETIC_DATASET_PATH
+        )
+
+
+def build_tasks(
+    scores: Dict[int, Dict[str, Any]],
+    linearize_only: bool,
+    single_render: bool = False
+) -> List[Task]:
+    """Builds the task graph of the synthetic dataset, in a topological order"""
+    versions = _stage_versions()
+    tasks = []
+    for score_id, score in scores.items():
+        score_folder = glob.escape(_score_folder(score))
+        sample_folder = glob.escape(
+            os.path.join(SYNTHETIC_DATASET_PATH, "samples", str(score_id))
+        )
+        corpus_markers = os.path.join(_score_folder(score), ".build")
+        dataset_markers = os.path.join(SYNTHETIC_DATASET_PATH, ".build", str(score_id))
+
+        def _task(
+            stage, function, args, dependencies, markers,
+            version, inputs, outputs
+        ):
+            tasks.append(Task(
+                name=f"{score_id}:{stage}",
+                function=function,
+                args=(score_id, score, *args),
+                dependencies=[f"{score_id}:{d}" for d in dependencies],
+                marker_path=os.path.join(markers, f"{stage}.done"),
+                inputs=inputs,
+                outputs=outputs,
+                version=version
+            ))
+
+        def _corpus(*globs):
+            return [os.path.join(score_folder, g) for g in globs]
+
+        def _samples(*globs):
+            return [os.path.join(sample_folder, g) for g in globs]
+
+        mscx = _corpus(f"lc{score_id}.mscx")
+        lmx = _corpus("lmx/*.lmx", "musicxml/*.musicxml")
+        svg_pages = _corpus(f"lc{score_id}-*.svg")
+        png_pages = _corpus(f"lc{score_id}-*.png")
+        geometries = _corpus(f"lc{score_id}-*.geometry.json")
+        png_systems = _corpus("png/*.png")
+
+        _task(
+            "mxl", _export_score, ["mxl"], [], corpus_markers,
+            versions["export"] + " mxl", mscx, _corpus(f"lc{score_id}.mxl")
+        )
+        _task(
+            "lmx", _split_score, [], ["mxl"], corpus_markers,
+            versions["lmx"], _corpus(f"lc{score_id}.mxl"), lmx
+        )
+        _task(
+            "transfer-lmx", _transfer_score_samples,
+            [["lmx/*.lmx", "musicxml/*.musicxml"]], ["lmx"], dataset_markers,
+            versions["transfer"], lmx, _samples("*.lmx", "*.musicxml")
+        )
+
+        if linearize_only:
+            continue
+
+        _task(
+            "svg", _export_score, ["svg"], [], corpus_markers,
+            versions["export"] + " svg", mscx, svg_pages
+        )
+        if single_render:
+            _task(
+                "pages", _render_score_pages, [], ["svg"], corpus_markers,
+                versions["pages"], svg_pages, png_pages + geometries
+            )
+            page_stages = ["pages"]
+        else:
+            _task(
+                "png", _export_score, ["png"], [], corpus_markers,
+                versions["export"] + " png", mscx, png_pages
+            )
+            _task(
+                "geometry", _detect_score_geometries, [], ["svg"], corpus_markers,
+                versions["geometry"], svg_pages, geometries
+            )
+            page_stages = ["png", "geometry"]
+        _task(
+            "png-systems", _crop_score_systems, [],
+            page_stages, corpus_markers,
+            versions["png-systems"], png_pages + geometries, png_systems
+        )
+        _task(
+            "transfer-png", _transfer_score_samples,
+            [["png/*.png"]], ["png-systems"], dataset_markers,
+            versions["transfer"], png_systems, _samples("*.png")
+        )
+    return tasks
+
+
+def build_in_parallel(
+    scores: Dict[int, Dict[str, Any]],
+    linearize_only: bool,
+    workers: int,
+    resume: bool,
+    single_render: bool = False
+):
+    """Builds the given scores in a process pool. When resume is set,
+    only the tasks that did not finish or whose inputs or code changed
+    since the last run are executed."""
+    result = run_task_graph(
+        build_tasks(scores, linearize_only, single_render),
+        workers=workers,
+        resume=resume
+    )
+    if len(result["failed"]) > 0:
+        raise Exception(
+            f"{len(result['failed'])} tasks failed: " +
+            ", ".join(result["failed"])
+        )
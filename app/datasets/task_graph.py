@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+import time
+import traceback
+import concurrent.futures
+from typing import Callable, Dict, List, Optional, Tuple
+from .build_manifest import describe_files, files_are_intact
+
+
+class Task:
+    """
+    A unit of work in a task graph. The function is called with the args
+    in a worker process (so both must be picklable) once all the
+    dependencies (names of other tasks) have finished. The marker file
+    is written when the task succeeds and marks it as done for later runs.
+
+    A task with inputs (a list of globs) is content-addressed: its marker
+    holds the manifest record of the inputs and outputs (globs as well)
+    together with the version of the code producing them. Such task is done
+    only when the version, the hashes of the inputs, and the outputs
+    are the same as when it was last executed.
+    """
+    def __init__(
+        self,
+        name: str,
+        function: Callable,
+        args: Tuple = (),
+        dependencies: Optional[List[str]] = None,
+        marker_path: Optional[str] = None,
+        inputs: Optional[List[str]] = None,
+        outputs: Optional[List[str]] = None,
+        version: str = ""
+    ):
+        self.name = name
+        self.function = function
+        self.args = args
+        self.dependencies = list(dependencies or [])
+        self.marker_path = marker_path
+        self.inputs = inputs
+        self.outputs = list(outputs or [])
+        self.version = version
+        assert inputs is None or marker_path is not None, \
+            "Content-addressed tasks need a marker"
+
+    @property
+    def is_content_addressed(self) -> bool:
+        return self.inputs is not None
+
+    def is_marked_done(self) -> bool:
+        return self.marker_path is not None \
+            and os.path.isfile(self.marker_path)
+
+    def read_marker(self) -> Optional[dict]:
+        if not self.is_marked_done():
+            return None
+        try:
+            with open(self.marker_path, "r") as file:
+                return json.load(file)
+        except ValueError:
+            return None
+
+
+def _hashes(record: Dict[str, list]) -> Dict[str, str]:
+    return {path: value[2] for path, value in record.items()}
+
+
+def _run_task(task: Task, resume: bool) -> Tuple[str, float, Optional[str]]:
+    start_time = time.time()
+    try:
+        inputs = None
+        if task.is_content_addressed:
+            previous = task.read_marker() or {}
+            inputs = describe_files(task.inputs, previous.get("inputs"))
+            if resume and previous.get("version") == task.version \
+                    and _hashes(previous.get("inputs", {})) == _hashes(inputs) \
+                    and files_are_intact(previous.get("outputs", {})):
+                return "unchanged", time.time() - start_time, None
+
+        _remove_marker(task)
+        task.function(*task.args)
+        seconds = time.time() - start_time
+
+        if task.marker_path is not None:
+            _write_marker(task, seconds, inputs)
+    except Exception:
+        return "failed", time.time() - start_time, traceback.format_exc()
+    return "done", seconds, None
+
+
+def _write_marker(task: Task, seconds: float, inputs: Optional[Dict[str, list]]):
+    marker = {
+        "task": task.name,
+        "seconds": round(seconds, 3),
+        "finished": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+    if task.is_content_addressed:
+        marker["version"] = task.version
+        marker["inputs"] = inputs
+        marker["outputs"] = describe_files(task.outputs)
+
+    folder = os.path.dirname(task.marker_path)
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = task.marker_path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(marker, file, indent=2)
+    os.replace(tmp_path, task.marker_path)
+
+
+def _remove_marker(task: Task):
+    if task.marker_path is not None and os.path.isfile(task.marker_path):
+        os.remove(task.marker_path)
+
+
+def pending_tasks(tasks: List[Task]) -> List[Task]:
+    """
+    Returns the tasks that must run: those without a completion marker
+    and all the tasks that (transitively) depend on them. Content-addressed
+    tasks are always returned, they are checked only once their inputs
+    are ready. Tasks must be given in a topological order.
+    """
+    pending = set()
+    for task in tasks:
+        if task.is_content_addressed or not task.is_marked_done() \
+                or any(d in pending for d in task.dependencies):
+            pending.add(task.name)
+    return [task for task in tasks if task.name in pending]
+
+
+def run_task_graph(
+    tasks: List[Task],
+    workers: int = 1,
+    resume: bool = True
+) -> Dict[str, List[str]]:
+    """
+    Runs the tasks in a process pool, each as soon as its dependencies
+    have succeeded. With resume, tasks marked as done by a previous run
+    (and not depending on a pending task) are skipped and content-addressed
+    tasks with unchanged inputs are not executed again. Markers of the tasks
+    to run are removed before starting, so that an interrupted run never
+    leaves a stale marker behind. A failed task is reported and its
+    dependents are not run, other tasks continue. Returns the names of the
+    "done", "unchanged", "skipped", "failed" and "blocked" tasks.
+    """
+    by_name: Dict[str, Task] = {}
+    for task in tasks:
+        assert task.name not in by_name, f"Duplicate task {task.name}"
+        assert all(d in by_name for d in task.dependencies), \
+            f"Dependencies of {task.name} must precede it"
+        by_name[task.name] = task
+
+    to_run = pending_tasks(tasks) if resume else list(tasks)
+    for task in to_run:
+        if not task.is_content_addressed:
+            _remove_marker(task)
+    to_run_names = set(task.name for task in to_run)
+
+    result: Dict[str, List[str]] = {
+        "done": [], "unchanged": [], "skipped": [], "failed": [], "blocked": []
+    }
+    result["skipped"] = [t.name for t in tasks if t.name not in to_run_names]
+
+    # number of unfinished dependencies and the reverse edges
+    waiting_for = {
+        task.name: sum(d in to_run_names for d in task.dependencies)
+        for task in to_run
+    }
+    dependents: Dict[str, List[str]] = {task.name: [] for task in to_run}
+    for task in to_run:
+        for d in task.dependencies:
+            if d in to_run_names:
+                dependents[d].append(task.name)
+
+    def _block(name: str):
+        for dependent in dependents[name]:
+            if dependent not in result["blocked"]:
+                result["blocked"].append(dependent)
+                _block(dependent)
+
+    print(
+        f"Running {len(to_run)} tasks " +
+        f"({len(result['skipped'])} already done) on {workers} workers..."
+    )
+    start_time = time.time()
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        running: Dict[concurrent.futures.Future, Task] = {}
+
+        def _submit_ready(names: List[str]):
+            for name in names:
+                if waiting_for[name] == 0 and name not in result["blocked"]:
+                    task = by_name[name]
+                    future = executor.submit(_run_task, task, resume)
+                    running[future] = task
+
+        _submit_ready([task.name for task in to_run])
+        while len(running) > 0:
+            finished, _ = concurrent.futures.wait(
+                running.keys(), return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in finished:
+                task = running.pop(future)
+                status, seconds, error = future.result()
+                if status == "failed":
+                    result["failed"].append(task.name)
+                    print(f"Task {task.name} failed:\n{error}", file=sys.stderr)
+                    _block(task.name)
+                    continue
+                result[status].append(task.name)
+                for dependent in dependents[task.name]:
+                    waiting_for[dependent] -= 1
+                _submit_ready(dependents[task.name])
+
+    print(
+        f"Finished {len(result['done'])} tasks " +
+        f"({len(result['unchanged'])} unchanged, " +
+        f"{len(result['failed'])} failed, {len(result['blocked'])} blocked) " +
+        f"in {time.time() - start_time:.1f}s"
+    )
+    return result
@@ -2,8 +2,10 @@ import xml.etree.ElementTree as ET
 import zss
 import time
 import Levenshtein
-from typing import List, Tuple
+from rapidfuzz.process import cdist # installed together with Levenshtein
+from typing import List, Tuple, Literal, Callable, Optional, Iterator, Union
 import copy
+import numpy as np
 
 
 # Modifications, bugfixes, and notes regarding the source code:
@@ -30,9 +32,31 @@ import copy
 # 11. Filtered out some additional sound-related and metadata-related elements.
 # 12. Added more pitch encoding characters, since the corpus required it.
 # 13. Added .strip() for Xml4ZSS_Levenshtein in text comparison (was forgotten).
-
-
-def TEDn(predicted_element: ET.Element, gold_element: ET.Element) -> "TEDnResult":
+# 14. Added a built-in Zhang-Shasha engine working over flattened numpy arrays
+#       (see the "Fast engine" section), selectable via TEDn(..., engine="fast").
+#       It computes exactly the same distance as zss, only much faster.
+# 15. Update costs are precomputed into a matrix before the tree edit distance
+#       starts (see PrecomputedCosts). Xml4ZSS_Levenshtein interns node labels
+#       and runs the Levenshtein distance only once per distinct label pair.
+# 16. Added cheap lower and upper bounds of the edit cost and a banded
+#       computation for the fast engine, see TEDn(..., bound_only, max_cost).
+# 17. The gold tree can be preprocessed once and reused for many
+#       evaluations, see the PreparedGold class.
+
+
+# Version of the metric, stored with cached results (see TEDn_cache.py).
+# Increment it whenever a change in the code changes the computed costs
+# (including changes to the delinearization and pruning in TEDn_lmx_xml).
+METRIC_VERSION = 1
+
+
+def TEDn(
+    predicted_element: ET.Element,
+    gold_element: Union[ET.Element, "PreparedGold"],
+    engine: Literal["zss", "fast"] = "zss",
+    bound_only: bool = False,
+    max_cost: Optional[int] = None
+) -> "TEDnResult":
     """
     Provide two <part> elements or <score-partwise> elements to compute
     the edit cost via the TEDn edit distance from the paper:
@@ -43,43 +67,81 @@ def TEDn(predicted_element: ET.Element, gold_element: ET.Element) -> "TEDnResult
 
     The code is based on:
     https://github.com/ufal/omreval/blob/master/evaluations/code/omreval/omreval/treedist_eval.py
+
+    The engine argument selects the tree edit distance implementation:
+    "zss" uses the zss package with python cost callbacks, "fast" uses
+    the built-in Zhang-Shasha implementation over numpy arrays.
+    Both engines compute exactly the same costs.
+
+    When only a rough answer is needed, the edit cost can be bounded
+    instead of computed exactly (see the "Bounds" section):
+    - bound_only=True only computes the cheap lower and upper bounds
+    - max_cost=k returns early when the lower bound already exceeds k,
+        otherwise computes the exact cost if it is at most k (the fast
+        engine skips all the subproblems that cannot lead to such cost)
+    The returned result then tells whether its edit cost is exact.
+
+    When evaluating many predictions against the same gold tree, pass
+    a PreparedGold instance instead of the gold element.
     """
-    assert gold_element.tag in ["part", "score-partwise"], "Unsupported input element type"
-    assert gold_element.tag == predicted_element.tag, "Both arguments must be of the same element type"
+    assert engine in {"zss", "fast"}, "Unsupported engine"
     
     start_time = time.time()
 
-    # what metric to use (hardcode the TEDn metric)
-    metric_class = Xml4ZSS_Levenshtein
+    # the gold tree is preprocessed here, unless it already is
+    # (also computes the gold cost, used for error normalization)
+    if not isinstance(gold_element, PreparedGold):
+        gold_element = PreparedGold(gold_element)
+    gold = gold_element
+
+    assert gold.element.tag in ["part", "score-partwise"], "Unsupported input element type"
+    assert gold.element.tag == predicted_element.tag, "Both arguments must be of the same element type"
 
     # for the TEDn metric, we need to encode (semi-flatten) notes
-    if metric_class is Xml4ZSS_Levenshtein:
-        coder = NoteContentCoder()
-        gold_element = encode_notes(copy.deepcopy(gold_element), coder)
+    # (the pitch coder continues with the state after encoding the gold tree)
+    if gold.metric_class is Xml4ZSS_Levenshtein:
+        coder = copy.deepcopy(gold.coder)
         predicted_element = encode_notes(copy.deepcopy(predicted_element), coder)
 
-    # Argument order: "How much does it cost to turn prediction into the true tree?"
-    edit_cost = zss.distance(
-        predicted_element, gold_element,
-        get_children=metric_class.get_children,
-        update_cost=metric_class.update,
-        insert_cost=metric_class.insert,
-        remove_cost=metric_class.remove
-    )
+    if engine == "zss":
+        tree_distance = zss_distance
+    else:
+        tree_distance = fast_distance
 
-    # the cost to create the gold tree from one-node tree
-    # (used for error normalization)
-    # (this computation is fast, O(N) compared to the previous one O(N^2))
-    gold_cost = zss.distance(
-        ET.Element(predicted_element.tag), gold_element,
-        get_children=metric_class.get_children,
-        update_cost=metric_class.update,
-        insert_cost=metric_class.insert,
-        remove_cost=metric_class.remove
-    )
+    gold_cost = gold.gold_cost
+
+    # Argument order: "How much does it cost to turn prediction into the true tree?"
+    costs = PrecomputedCosts(predicted_element, gold.tree, gold.metric_class)
+
+    lower_bound, upper_bound = None, None
+    if bound_only or max_cost is not None:
+        lower_bound, upper_bound = edit_cost_bounds(costs)
+
+    if lower_bound is not None and lower_bound == upper_bound:
+        edit_cost = upper_bound # the bounds are tight, no need to compute
+    elif bound_only or (max_cost is not None and lower_bound > max_cost):
+        edit_cost = None # the bounds are enough
+    elif max_cost is not None and engine == "fast":
+        edit_cost = fast_distance(costs, band=max_cost)
+        if edit_cost > max_cost:
+            # the banded distance is not exact, but still an upper bound
+            lower_bound = max(lower_bound, max_cost + 1)
+            upper_bound = min(upper_bound, edit_cost)
+            edit_cost = None
+    else:
+        edit_cost = tree_distance(costs)
     
     end_time = time.time()
 
+    if edit_cost is None:
+        return TEDnResult(
+            gold_cost=gold_cost,
+            edit_cost=upper_bound,
+            evaluation_time_seconds=(end_time - start_time),
+            is_exact=False,
+            edit_cost_lower_bound=lower_bound
+        )
+
     return TEDnResult(
         gold_cost=gold_cost,
         edit_cost=edit_cost,
@@ -87,21 +149,88 @@ def TEDn(predicted_element: ET.Element, gold_element: ET.Element) -> "TEDnResult
     )
 
 
+class PreparedGold:
+    """
+    Gold tree preprocessed for TEDn evaluation: with encoded notes,
+    flattened into the post-order, and with the gold cost computed.
+    Prepare it once and pass it to TEDn instead of the gold element when
+    evaluating many predictions against the same gold tree. It can be
+    pickled to store the preprocessing on the disk.
+    """
+    def __init__(
+        self,
+        gold_element: ET.Element,
+        source_hash: Optional[str] = None,
+        flavor: Optional[str] = None,
+        canonicalize_gold: Optional[bool] = None
+    ):
+        # what metric to use (hardcode the TEDn metric)
+        self.metric_class = Xml4ZSS_Levenshtein
+
+        self.coder = NoteContentCoder()
+        """Note coder with the state after encoding the gold tree"""
+        
+        self.element = copy.deepcopy(gold_element)
+        """The gold element with encoded notes (if the metric needs it)"""
+        if self.metric_class is Xml4ZSS_Levenshtein:
+            self.element = encode_notes(self.element, self.coder)
+        
+        self.tree = FlatTree(self.element, self.metric_class.get_children)
+        
+        # the cost to create the gold tree from one-node tree
+        # (this computation is fast, O(N) compared to the edit cost O(N^2))
+        self.gold_cost = fast_distance(PrecomputedCosts(
+            ET.Element(self.element.tag), self.tree, self.metric_class
+        ))
+
+        # metadata describing the gold source and its preprocessing
+        # (used by TEDn_lmx_xml and TEDnCache)
+        self.source_hash = source_hash
+        self.flavor = flavor
+        self.canonicalize_gold = canonicalize_gold
+
+
 class TEDnResult:
     def __init__(self,
         gold_cost: int,
         edit_cost: int,
-        evaluation_time_seconds: float
+        evaluation_time_seconds: float,
+        is_exact: bool = True,
+        edit_cost_lower_bound: Optional[int] = None
     ):
         self.gold_cost = int(gold_cost)
         self.edit_cost = int(edit_cost)
         self.evaluation_time_seconds: float = evaluation_time_seconds
+
+        self.is_exact = is_exact
+        """When false, the edit cost is only an upper bound of the true cost"""
+
+        self.edit_cost_lower_bound = self.edit_cost
+        """Equals the edit cost for exact results"""
+        if not is_exact:
+            self.edit_cost_lower_bound = int(edit_cost_lower_bound)
+    
+    @property
+    def edit_cost_upper_bound(self) -> int:
+        return self.edit_cost
     
     @property
     def normalized_edit_cost(self) -> float:
         return float(self.edit_cost) / float(self.gold_cost)
     
+    @property
+    def normalized_edit_cost_lower_bound(self) -> float:
+        return float(self.edit_cost_lower_bound) / float(self.gold_cost)
+    
     def __repr__(self) -> str:
+        if not self.is_exact:
+            return (
+                f"TEDnResult(" +
+                f"gold_cost={self.gold_cost}, " +
+                f"edit_cost_lower_bound={self.edit_cost_lower_bound}, " +
+                f"edit_cost_upper_bound={self.edit_cost_upper_bound}, " +
+                f"evaluation_time_seconds={round(self.evaluation_time_seconds, 2)})"
+            )
         return (
             f"TEDnResult(" +
             f"gold_cost={self.gold_cost}, " +
@@ -137,6 +266,15 @@ class ZSSMetricClass(object):
     def remove(e):
         raise NotImplementedError()
 
+    @classmethod
+    def update_costs(cls, a_nodes: list, b_nodes: list) -> np.ndarray:
+        """Computes the matrix of update costs between all the given nodes.
+        Override it when the costs can be computed faster than pair by pair."""
+        return np.array(
+            [[cls.update(e, f) for f in b_nodes] for e in a_nodes],
+            dtype=np.int64
+        ).reshape(len(a_nodes), len(b_nodes))
+
 
 class Xml4ZSS(ZSSMetricClass):
     """A class that defines how edit operation costs should
@@ -254,11 +392,62 @@ class Xml4ZSS_Levenshtein(Xml4ZSS_Filtered):
         else:
             return 1
 
+    @classmethod
+    def update_costs(
+        cls,
+        a_nodes: List[ET.Element],
+        b_nodes: List[ET.Element]
+    ) -> np.ndarray:
+        """Same costs as the update method, but each distinct (tag, text)
+        label is processed only once and the Levenshtein distances
+        are computed in one batch"""
+        a_labels, a_label_ids = _intern([(e.tag, e.text) for e in a_nodes])
+        b_labels, b_label_ids = _intern([(f.tag, f.text) for f in b_nodes])
+
+        _, tag_ids = _intern([tag for tag, _ in a_labels + b_labels])
+        a_tags, b_tags = tag_ids[:len(a_labels)], tag_ids[len(a_labels):]
+        tag_change_costs = (a_tags[:, None] != b_tags[None, :]).astype(np.int64)
+
+        _, stripped_text_ids = _intern([
+            (text or "").strip() for _, text in a_labels + b_labels
+        ])
+        a_texts = stripped_text_ids[:len(a_labels)]
+        b_texts = stripped_text_ids[len(a_labels):]
+        text_change_costs = (a_texts[:, None] != b_texts[None, :]).astype(np.int64)
+
+        # missing text is the same as empty text for Levenshtein distance
+        text_edit_costs = cdist(
+            [text or "" for _, text in a_labels],
+            [text or "" for _, text in b_labels],
+            scorer=Levenshtein.distance,
+            dtype=np.int64
+        ).reshape(len(a_labels), len(b_labels))
+        a_notes = np.array([tag == "note" for tag, _ in a_labels], dtype=bool)
+        b_notes = np.array([tag == "note" for tag, _ in b_labels], dtype=bool)
+        label_costs = tag_change_costs + np.where(
+            a_notes[:, None] | b_notes[None, :],
+            text_edit_costs,
+            text_change_costs
+        )
+
+        return label_costs[np.ix_(a_label_ids, b_label_ids)]
+
     @staticmethod
     def remove(e: ET.Element) -> int:
         return 1
 
 
+def _intern(values: list) -> Tuple[list, np.ndarray]:
+    """Returns the list of distinct values and the index
+    of each given value in that list"""
+    index = {}
+    ids = np.array(
+        [index.setdefault(value, len(index)) for value in values],
+        dtype=np.int64
+    )
+    return list(index.keys()), ids
+
+
 ###################
 # Note flattening #
 ###################
@@ -417,3 +606,413 @@ def encode_notes(root: ET.Element, coder: NoteContentCoder):
             note.remove(e)
 
     return root
+
+
+###############
+# Fast engine #
+###############
+
+# Zhang-Shasha tree edit distance, the same algorithm as in zss, see:
+# https://github.com/timtadh/zhang-shasha/blob/master/zss/compare.py
+#
+# The difference is that both trees are first flattened into post-order
+# arrays with all the edit costs precomputed, so the dynamic programming
+# never calls back into python cost functions. Also, each row of the forest
+# distance table is computed at once with numpy: the recurrence
+#   fd[x][y] = min(c[y], fd[x][y-1] + insert[y])
+# (where c[y] is the minimum of the remove and update/match candidates)
+# unrolls to fd[x] = S + cumulative_min(c - S), with S being the prefix sums
+# of insert costs. All costs are integers, so the result is exact.
+
+
+def zss_distance(costs: "PrecomputedCosts") -> int:
+    """Computes the tree edit distance via the zss package"""
+    return zss.distance(
+        costs.a.root, costs.b.root,
+        get_children=costs.metric_class.get_children,
+        update_cost=costs.update,
+        insert_cost=costs.insert,
+        remove_cost=costs.remove
+    )
+
+
+def fast_distance(costs: "PrecomputedCosts", band: Optional[int] = None) -> int:
+    """Computes the tree edit distance via the built-in numpy engine,
+    the result is identical to the zss_distance function
+    (see the zhang_shasha function for the band argument)"""
+    return zhang_shasha(
+        costs.a, costs.b,
+        costs.remove_costs, costs.insert_costs, costs.update_costs,
+        band=band
+    )
+
+
+class PrecomputedCosts:
+    """Edit costs of the given metric class precomputed for a pair of trees
+    (A is the tree being edited into the tree B). The callback methods
+    have the zss signature, but only look up the precomputed values."""
+    def __init__(
+        self,
+        A: Union[ET.Element, "FlatTree"],
+        B: Union[ET.Element, "FlatTree"],
+        metric_class: ZSSMetricClass
+    ):
+        self.metric_class = metric_class
+        self.a = A if isinstance(A, FlatTree) else FlatTree(A, metric_class.get_children)
+        self.b = B if isinstance(B, FlatTree) else FlatTree(B, metric_class.get_children)
+
+        self.remove_costs = np.array(
+            [metric_class.remove(e) for e in self.a.nodes], dtype=np.int64
+        )
+        self.insert_costs = np.array(
+            [metric_class.insert(f) for f in self.b.nodes], dtype=np.int64
+        )
+        self.update_costs = metric_class.update_costs(self.a.nodes, self.b.nodes)
+
+        # python lists and dicts for fast lookups from the callbacks
+        self._a_index = {id(e): i for i, e in enumerate(self.a.nodes)}
+        self._b_index = {id(f): j for j, f in enumerate(self.b.nodes)}
+        self._remove_costs = self.remove_costs.tolist()
+        self._insert_costs = self.insert_costs.tolist()
+        self._update_costs = self.update_costs.tolist()
+
+    def update(self, e: ET.Element, f: ET.Element) -> int:
+        return self._update_costs[self._a_index[id(e)]][self._b_index[id(f)]]
+
+    def insert(self, f: ET.Element) -> int:
+        return self._insert_costs[self._b_index[id(f)]]
+
+    def remove(self, e: ET.Element) -> int:
+        return self._remove_costs[self._a_index[id(e)]]
+
+
+class FlatTree:
+    """Post-order flattening of a tree, as needed by the Zhang-Shasha algorithm"""
+    def __init__(self, root: ET.Element, get_children: Callable):
+        self.root = root
+
+        self.nodes: List[ET.Element] = []
+        """Nodes in post-order"""
+
+        self.children: List[List[int]] = []
+        """Post-order indices of children of each node"""
+
+        lmds: List[int] = []
+        def visit(node: ET.Element) -> int:
+            lmd = None
+            children = []
+            for child in get_children(node):
+                child_lmd = visit(child)
+                children.append(len(self.nodes) - 1)
+                if lmd is None:
+                    lmd = child_lmd
+            if lmd is None:
+                lmd = len(self.nodes)
+            self.nodes.append(node)
+            self.children.append(children)
+            lmds.append(lmd)
+            return lmd
+        visit(root)
+
+        self.lmds = np.array(lmds, dtype=np.int64)
+        """Post-order index of the leftmost leaf descendant of each node"""
+
+        # keyroot = the highest node for any given leftmost leaf
+        keyroots = {}
+        for i, lmd in enumerate(lmds):
+            keyroots[lmd] = i
+        self.keyroots = np.array(sorted(keyroots.values()), dtype=np.int64)
+        """Post-order indices of keyroots, sorted"""
+    
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+
+def zhang_shasha(
+    a: FlatTree,
+    b: FlatTree,
+    remove_costs: np.ndarray,
+    insert_costs: np.ndarray,
+    update_costs: np.ndarray,
+    band: Optional[int] = None
+) -> int:
+    """Runs the Zhang-Shasha dynamic programming over precomputed costs
+    (remove costs are indexed by nodes of A, insert costs by nodes of B
+    and update costs by pairs of A and B nodes).
+
+    With band=k, subtree pairs whose post-order positions differ by more
+    than k are not computed. Such nodes cannot be matched by any edit
+    with cost at most k (each edit cost is at least 1 and the nodes
+    preceding matched nodes must be matched among themselves), so the
+    result is exact when it is at most k. Otherwise the result is only
+    an upper bound and the exact cost is known to be greater than k.
+    """
+    treedists = np.zeros((len(a), len(b)), dtype=np.int64)
+    if band is not None:
+        treedists.fill(_NOT_COMPUTED)
+
+    # Keyroots in a group have subtrees of the same shape, so their forest
+    # distance tables can be computed together in one batch. Groups are
+    # sorted by subtree size, so that all the subtree distances needed
+    # by a batch are already computed when the batch is reached.
+    a_groups = _KeyrootGroup.group_keyroots(a, remove_costs)
+    b_groups = _KeyrootGroup.group_keyroots(b, insert_costs)
+    for a_group in a_groups:
+        for b_group in b_groups:
+            # iterate over the shorter side of the forest distance tables,
+            # the transposed problem has the roles of remove and insert swapped
+            for a_batch, b_batch in _KeyrootGroup.band_batches(a_group, b_group, band):
+                if a_batch.size <= b_batch.size:
+                    _forest_distances(a_batch, b_batch, update_costs, treedists, band)
+                else:
+                    _forest_distances(b_batch, a_batch, update_costs.T, treedists.T, band)
+
+    return int(treedists[-1, -1])
+
+
+# treedists value for subtree pairs outside of the band
+# (large enough to never be chosen, small enough to never overflow)
+_NOT_COMPUTED = 2 ** 40
+
+
+class _KeyrootGroup:
+    """Keyroots whose subtrees have the same shape (the same leftmost leaves
+    relative to the subtree start), together with their edit costs
+    (remove costs for the tree A, insert costs for the tree B)"""
+    def __init__(self, lmd_offsets: Tuple[int, ...], starts: List[int], costs: np.ndarray):
+        self._lmd_offsets_key = lmd_offsets
+        self._all_costs = costs
+        self.starts = starts
+        """Post-order indices of the first node of each subtree"""
+
+        self.size = len(lmd_offsets)
+        """Number of nodes in each subtree"""
+
+        self.lmd_offsets = np.array(lmd_offsets, dtype=np.int64)
+        self.on_leftmost_path = self.lmd_offsets == 0
+        
+        self.nodes = np.array(starts, dtype=np.int64)[:, None] \
+            + np.arange(self.size, dtype=np.int64)[None, :]
+        """Post-order indices of subtree nodes, shape (keyroots, size)"""
+        
+        self.costs = costs[self.nodes]
+        self.cost_sums = np.zeros((len(starts), self.size + 1), dtype=np.int64)
+        np.cumsum(self.costs, axis=1, out=self.cost_sums[:, 1:])
+    
+    @staticmethod
+    def group_keyroots(tree: FlatTree, costs: np.ndarray) -> List["_KeyrootGroup"]:
+        lmds = tree.lmds.tolist()
+        groups = {}
+        for k in tree.keyroots.tolist():
+            lk = lmds[k]
+            lmd_offsets = tuple(lmd - lk for lmd in lmds[lk:k+1])
+            groups.setdefault(lmd_offsets, []).append(lk)
+        return [
+            _KeyrootGroup(lmd_offsets, starts, costs)
+            for lmd_offsets, starts in sorted(
+                groups.items(), key=lambda item: len(item[0])
+            )
+        ]
+    
+    @staticmethod
+    def band_batches(
+        a_group: "_KeyrootGroup",
+        b_group: "_KeyrootGroup",
+        band: Optional[int]
+    ) -> Iterator[Tuple["_KeyrootGroup", "_KeyrootGroup"]]:
+        """Splits the two groups into batches of keyroots that
+        have some nodes within the band of each other"""
+        if band is None:
+            yield a_group, b_group
+            return
+        
+        # chunks of A keyroots spanning roughly the width of the band
+        chunk = []
+        chunks = []
+        for start in a_group.starts:
+            if len(chunk) > 0 and start - chunk[0] > band:
+                chunks.append(chunk)
+                chunk = []
+            chunk.append(start)
+        chunks.append(chunk)
+        
+        for a_starts in chunks:
+            a_first = a_starts[0] - band
+            a_last = a_starts[-1] + a_group.size - 1 + band
+            b_starts = [
+                start for start in b_group.starts
+                if start <= a_last and start + b_group.size - 1 >= a_first
+            ]
+            if len(b_starts) == 0:
+                continue
+            yield (
+                a_group.subset(a_starts),
+                b_group.subset(b_starts)
+            )
+    
+    def subset(self, starts: List[int]) -> "_KeyrootGroup":
+        if len(starts) == len(self.starts):
+            return self
+        return _KeyrootGroup(self._lmd_offsets_key, starts, self._all_costs)
+
+
+def _forest_distances(
+    a_group: _KeyrootGroup,
+    b_group: _KeyrootGroup,
+    update_costs: np.ndarray,
+    treedists: np.ndarray,
+    band: Optional[int] = None
+):
+    """Computes the forest distance tables for all pairs of keyroots
+    from the two groups at once, row by row, and stores the subtree
+    distances into treedists. The tables have the shape
+    (A rows, A keyroots, B keyroots, B columns).
+    
+    With a band, only the cells where the two forests differ in size by at
+    most the band are computed, since the others cost more than the band."""
+    insert_sums = b_group.cost_sums[None, :, :]
+    
+    fd = np.empty(
+        (a_group.size + 1, len(a_group.nodes), len(b_group.nodes), b_group.size + 1),
+        dtype=np.int64
+    )
+    if band is not None:
+        fd.fill(_NOT_COMPUTED)
+    fd[0] = insert_sums
+    fd[:, :, :, 0] = a_group.cost_sums.T[:, :, None]
+
+    for x in range(1, a_group.size + 1):
+        ax = a_group.nodes[:, x - 1, None, None]
+        a_lmd_offset = a_group.lmd_offsets[x - 1]
+
+        # the computed columns lo:hi correspond to the B nodes lo-1:hi-1
+        lo, hi = 1, b_group.size + 1
+        if band is not None:
+            lo, hi = max(lo, x - band), min(hi, x + band + 1)
+            if lo >= hi:
+                continue
+        b_nodes = b_group.nodes[None, :, lo-1:hi-1]
+        b_on_leftmost_path = b_group.on_leftmost_path[lo-1:hi-1]
+
+        # replace the two subtrees (whole or partial), or remove the node
+        candidates = fd[a_lmd_offset][:, :, b_group.lmd_offsets[lo-1:hi-1]] \
+            + treedists[ax, b_nodes]
+        if a_lmd_offset == 0:
+            np.copyto(
+                candidates,
+                fd[x - 1, :, :, lo-1:hi-1] + update_costs[ax, b_nodes],
+                where=b_on_leftmost_path
+            )
+        np.minimum(
+            candidates,
+            fd[x - 1, :, :, lo:hi] + a_group.costs[:, x - 1, None, None],
+            out=candidates
+        )
+
+        # insert nodes, done via the cumulative minimum
+        # (starting from the cell just before the computed columns)
+        row = fd[x, :, :, lo-1:hi]
+        row[:, :, 1:] = candidates
+        row -= insert_sums[:, :, lo-1:hi]
+        np.minimum.accumulate(row, axis=2, out=row)
+        row += insert_sums[:, :, lo-1:hi]
+
+        if a_lmd_offset == 0:
+            treedists[ax, b_nodes[:, :, b_on_leftmost_path]] = \
+                row[:, :, 1:][:, :, b_on_leftmost_path]
+
+
+##########
+# Bounds #
+##########
+
+# Cheap lower and upper bounds of the edit cost. Both rely only on the fact
+# that all the remove and insert costs are at least 1 and that update costs
+# are integers (so the update is either free or costs at least 1).
+
+
+def edit_cost_bounds(costs: PrecomputedCosts) -> Tuple[int, int]:
+    """Returns the lower and upper bound of the edit cost"""
+    upper_bound = top_down_distance(costs)
+    lower_bound = min(label_lower_bound(costs), upper_bound)
+    return lower_bound, upper_bound
+
+
+def label_lower_bound(costs: PrecomputedCosts) -> int:
+    """Lower bound based on the multisets of node labels. Only pairs of
+    nodes with a free update can be matched for free, every other node
+    in B costs at least its insertion or its cheapest non-free update,
+    and every other node in A costs at least 1."""
+    free = costs.update_costs == 0
+    
+    # each node in B outside of the free matching costs at least this
+    paid_updates = np.where(free, _NOT_COMPUTED, costs.update_costs)
+    b_node_costs = np.minimum(costs.insert_costs, paid_updates.min(axis=0))
+
+    # Nodes in A with the same free-update row have the same label.
+    # For each such label, assume the free matching covers the most
+    # expensive B nodes (this is exact when the free updates form an
+    # equivalence, as for all our metric classes, otherwise it
+    # overestimates the matching, which still gives a valid bound).
+    _, a_label_rows, a_label_counts = np.unique(
+        np.packbits(free, axis=1), axis=0, return_index=True, return_counts=True
+    )
+    matched_nodes = 0
+    matched_b_costs = 0
+    for label, count in zip(free[a_label_rows], a_label_counts):
+        b_label_costs = np.sort(b_node_costs[label])[::-1][:count]
+        matched_nodes += len(b_label_costs)
+        matched_b_costs += int(b_label_costs.sum())
+
+    return max(
+        len(costs.a) - matched_nodes,
+        int(b_node_costs.sum()) - matched_b_costs
+    )
+
+
+def top_down_distance(costs: PrecomputedCosts) -> int:
+    """Upper bound, computed as the cost of the best edit that matches
+    nodes only when their parents are matched (Selkow's distance).
+    Measures are aligned as sequences, then their contents, and so on."""
+    remove_sums = np.zeros(len(costs.a) + 1, dtype=np.int64)
+    np.cumsum(costs.remove_costs, out=remove_sums[1:])
+    insert_sums = np.zeros(len(costs.b) + 1, dtype=np.int64)
+    np.cumsum(costs.insert_costs, out=insert_sums[1:])
+
+    # costs of removing and inserting whole subtrees
+    subtree_remove_costs = (
+        remove_sums[1:] - remove_sums[costs.a.lmds]
+    ).tolist()
+    subtree_insert_costs = (
+        insert_sums[1:] - insert_sums[costs.b.lmds]
+    ).tolist()
+    update_costs = costs.update_costs.tolist()
+    a_sizes = (np.arange(len(costs.a)) - costs.a.lmds + 1).tolist()
+    b_sizes = (np.arange(len(costs.b)) - costs.b.lmds + 1).tolist()
+
+    def distance(i: int, j: int) -> int:
+        a_children = costs.a.children[i]
+        b_children = costs.b.children[j]
+        
+        # sequence alignment of children
+        row = [0]
+        for y in b_children:
+            row.append(row[-1] + subtree_insert_costs[y])
+        for x in a_children:
+            previous_row = row
+            row = [previous_row[0] + subtree_remove_costs[x]]
+            for k, y in enumerate(b_children):
+                best = min(
+                    previous_row[k + 1] + subtree_remove_costs[x],
+                    row[k] + subtree_insert_costs[y]
+                )
+                # recurse only when the subtree distance can be better
+                # (every node without a pair costs at least 1)
+                if previous_row[k] + update_costs[x][y] \
+                        + abs(a_sizes[x] - b_sizes[y]) < best:
+                    best = min(best, previous_row[k] + distance(x, y))
+                row.append(best)
+        
+        return update_costs[i][j] + row[-1]
+
+    return distance(len(costs.a) - 1, len(costs.b) - 1)
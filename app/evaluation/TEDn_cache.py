@@ -0,0 +1,131 @@
+import sqlite3
+import hashlib
+import json
+from typing import Optional, Union
+from .TEDn import TEDnResult, PreparedGold, METRIC_VERSION
+
+
+class TEDnCache:
+    """
+    Persistent cache of TEDn results backed by an SQLite file. Results are
+    keyed by the hash of all the inputs that influence them (see make_key).
+    When the cache grows over max_entries, the least recently used
+    entries are evicted.
+
+    The cache is meant to be used from a single process at a time.
+    """
+    def __init__(self, path: str, max_entries: int = 1_000_000):
+        self.path = path
+        self.max_entries = max_entries
+        
+        self.hits = 0
+        """Number of successful lookups"""
+
+        self.misses = 0
+        """Number of failed lookups"""
+
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                gold_cost INTEGER NOT NULL,
+                edit_cost INTEGER NOT NULL,
+                is_exact INTEGER NOT NULL,
+                edit_cost_lower_bound INTEGER NOT NULL,
+                evaluation_time_seconds REAL NOT NULL,
+                last_used INTEGER NOT NULL
+            )
+        """)
+        self._connection.execute("""
+            CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)
+        """)
+        self._connection.commit()
+        self._size, self._clock = self._connection.execute(
+            "SELECT COUNT(*), COALESCE(MAX(last_used), 0) FROM results"
+        ).fetchone()
+    
+    def _tick(self) -> int:
+        """Logical clock for the least-recently-used ordering"""
+        self._clock += 1
+        return self._clock
+    
+    @staticmethod
+    def make_key(
+        predicted_lmx: str,
+        gold_musicxml: Union[str, PreparedGold],
+        flavor: str,
+        **options
+    ) -> str:
+        """Builds the cache key, options are any other arguments
+        of the metric function that change the result. The gold may also
+        be given as a PreparedGold (by its source hash)."""
+        if isinstance(gold_musicxml, PreparedGold):
+            gold_hash = gold_musicxml.source_hash
+            assert gold_hash is not None, "Prepared gold lacks the source hash"
+        else:
+            gold_hash = hashlib.sha256(gold_musicxml.encode("utf-8")).hexdigest()
+        data = json.dumps([
+            METRIC_VERSION,
+            predicted_lmx,
+            gold_hash,
+            flavor,
+            sorted(options.items())
+        ])
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[TEDnResult]:
+        row = self._connection.execute(
+            "SELECT gold_cost, edit_cost, is_exact, edit_cost_lower_bound, " +
+            "evaluation_time_seconds FROM results WHERE key = ?",
+            (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._connection.execute(
+            "UPDATE results SET last_used = ? WHERE key = ?",
+            (self._tick(), key)
+        )
+        gold_cost, edit_cost, is_exact, lower_bound, evaluation_time = row
+        return TEDnResult(
+            gold_cost=gold_cost,
+            edit_cost=edit_cost,
+            evaluation_time_seconds=evaluation_time,
+            is_exact=bool(is_exact),
+            edit_cost_lower_bound=lower_bound
+        )
+    
+    def put(self, key: str, result: TEDnResult):
+        inserted = self._connection.execute(
+            "INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                result.gold_cost,
+                result.edit_cost,
+                int(result.is_exact),
+                result.edit_cost_lower_bound,
+                result.evaluation_time_seconds,
+                self._tick()
+            )
+        ).rowcount
+        self._size += inserted
+        
+        if self._size > self.max_entries:
+            self._connection.execute(
+                "DELETE FROM results WHERE key IN (" +
+                "SELECT key FROM results ORDER BY last_used LIMIT ?)",
+                (self._size - self.max_entries,)
+            )
+            self._size = self.max_entries
+        self._connection.commit()
+    
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,161 @@
+import xml.etree.ElementTree as ET
+import copy
+import time
+import Levenshtein
+from rapidfuzz.process import cdist
+from typing import List, Tuple, Optional, Literal
+from .TEDn import TEDn, TEDnResult, Xml4ZSS_Levenshtein, NoteContentCoder, \
+    encode_notes, PrecomputedCosts, FlatTree, zss_distance, fast_distance
+
+
+def TEDn_decomposed(
+    predicted_part: ET.Element,
+    gold_part: ET.Element,
+    engine: Literal["zss", "fast"] = "fast",
+    exact_max_nodes: Optional[int] = 500
+) -> TEDnResult:
+    """
+    Approximates the TEDn metric for whole scores, where the exact tree
+    edit distance is too expensive. Measures of the two parts are first
+    aligned as sequences (by comparing their direct children) and then
+    the tree edit distance is computed for each aligned pair of measures.
+    Unaligned measures are removed or inserted as whole subtrees.
+
+    The result is the cost of a valid edit of the predicted part into
+    the gold part, so it is an upper bound of the exact TEDn edit cost
+    (the returned TEDnResult is marked as not exact). It equals the exact
+    cost whenever the optimal edit keeps measures aligned, which is the
+    usual case. The gold cost is the same as in the exact metric.
+
+    :param predicted_part: The predicted <part> element
+    :param gold_part: The gold <part> element
+    :param engine: Tree edit distance implementation, see the TEDn function.
+    :param exact_max_nodes: When both parts have at most this many nodes,
+        the exact TEDn is computed instead. Set to None to always decompose.
+    """
+    assert gold_part.tag == "part", "Only <part> elements are supported"
+    assert predicted_part.tag == "part", "Only <part> elements are supported"
+
+    if exact_max_nodes is not None:
+        predicted_nodes = sum(1 for _ in predicted_part.iter())
+        gold_nodes = sum(1 for _ in gold_part.iter())
+        if max(predicted_nodes, gold_nodes) <= exact_max_nodes:
+            return TEDn(predicted_part, gold_part, engine=engine)
+
+    start_time = time.time()
+
+    if engine == "zss":
+        tree_distance = zss_distance
+    else:
+        tree_distance = fast_distance
+
+    # encode notes just like TEDn does, with one coder for the whole score
+    metric_class = Xml4ZSS_Levenshtein
+    coder = NoteContentCoder()
+    gold_part = encode_notes(copy.deepcopy(gold_part), coder)
+    predicted_part = encode_notes(copy.deepcopy(predicted_part), coder)
+
+    gold_cost = tree_distance(PrecomputedCosts(
+        ET.Element(predicted_part.tag), gold_part, metric_class
+    ))
+
+    predicted_measures = metric_class.get_children(predicted_part)
+    gold_measures = metric_class.get_children(gold_part)
+
+    edit_cost = metric_class.update(predicted_part, gold_part)
+    aligned_pairs = align_measures(predicted_measures, gold_measures)
+    for p, g in aligned_pairs:
+        if p is None:
+            edit_cost += _subtree_insert_cost(gold_measures[g])
+        elif g is None:
+            edit_cost += _subtree_remove_cost(predicted_measures[p])
+        else:
+            edit_cost += tree_distance(PrecomputedCosts(
+                predicted_measures[p], gold_measures[g], metric_class
+            ))
+
+    # each node without a pair costs at least 1
+    predicted_nodes = len(FlatTree(predicted_part, metric_class.get_children))
+    gold_nodes = len(FlatTree(gold_part, metric_class.get_children))
+    lower_bound = min(abs(predicted_nodes - gold_nodes), edit_cost)
+
+    end_time = time.time()
+
+    return TEDnResult(
+        gold_cost=gold_cost,
+        edit_cost=edit_cost,
+        evaluation_time_seconds=(end_time - start_time),
+        is_exact=False,
+        edit_cost_lower_bound=lower_bound
+    )
+
+
+def align_measures(
+    predicted_measures: List[ET.Element],
+    gold_measures: List[ET.Element]
+) -> List[Tuple[Optional[int], Optional[int]]]:
+    """
+    Aligns two sequences of (note-encoded) measures and returns the list
+    of aligned index pairs, where None stands for a removed (or inserted)
+    measure. Each measure is summarized by a signature string with one
+    character per child element (label = tag and text) and measures are
+    compared by the Levenshtein distance of their signatures.
+    """
+    labels = {}
+    def signature(measure: ET.Element) -> str:
+        return "".join(
+            chr(0x100 + labels.setdefault((e.tag, e.text), len(labels)))
+            for e in Xml4ZSS_Levenshtein.get_children(measure)
+        )
+    predicted_signatures = [signature(m) for m in predicted_measures]
+    gold_signatures = [signature(m) for m in gold_measures]
+
+    # removing or inserting a measure costs its node and all its children
+    remove_costs = [len(s) + 1 for s in predicted_signatures]
+    insert_costs = [len(s) + 1 for s in gold_signatures]
+    update_costs = cdist(
+        predicted_signatures,
+        gold_signatures,
+        scorer=Levenshtein.distance
+    ).tolist() if len(predicted_signatures) and len(gold_signatures) else []
+
+    # Needleman-Wunsch alignment
+    P, G = len(predicted_signatures), len(gold_signatures)
+    table = [[0] * (G + 1) for _ in range(P + 1)]
+    for g in range(1, G + 1):
+        table[0][g] = table[0][g - 1] + insert_costs[g - 1]
+    for p in range(1, P + 1):
+        table[p][0] = table[p - 1][0] + remove_costs[p - 1]
+        for g in range(1, G + 1):
+            table[p][g] = min(
+                table[p - 1][g] + remove_costs[p - 1],
+                table[p][g - 1] + insert_costs[g - 1],
+                table[p - 1][g - 1] + update_costs[p - 1][g - 1]
+            )
+
+    # backtracking
+    pairs = []
+    p, g = P, G
+    while p > 0 or g > 0:
+        if p > 0 and g > 0 and table[p][g] == \
+                table[p - 1][g - 1] + update_costs[p - 1][g - 1]:
+            pairs.append((p - 1, g - 1))
+            p, g = p - 1, g - 1
+        elif p > 0 and table[p][g] == table[p - 1][g] + remove_costs[p - 1]:
+            pairs.append((p - 1, None))
+            p -= 1
+        else:
+            pairs.append((None, g - 1))
+            g -= 1
+    pairs.reverse()
+    return pairs
+
+
+def _subtree_insert_cost(element: ET.Element) -> int:
+    tree = FlatTree(element, Xml4ZSS_Levenshtein.get_children)
+    return sum(Xml4ZSS_Levenshtein.insert(e) for e in tree.nodes)
+
+
+def _subtree_remove_cost(element: ET.Element) -> int:
+    tree = FlatTree(element, Xml4ZSS_Levenshtein.get_children)
+    return sum(Xml4ZSS_Levenshtein.remove(e) for e in tree.nodes)
@@ -1,20 +1,27 @@
 from ..linearization.Delinearizer import Delinearizer
-from .TEDn import TEDn, TEDnResult
+from .TEDn import TEDn, TEDnResult, PreparedGold
+from .TEDn_decomposed import TEDn_decomposed
+from .TEDn_cache import TEDnCache
 from ..symbolic.Pruner import Pruner
 from ..symbolic.actual_durations_to_fractional import actual_durations_to_fractional
 from ..symbolic.debug_compare import compare_parts
 import xml.etree.ElementTree as ET
-from typing import TextIO, Optional, Literal
+from typing import TextIO, Optional, Literal, Union
 import traceback
+import hashlib
 
 
 def TEDn_lmx_xml(
     predicted_lmx: str,
-    gold_musicxml: str,
+    gold_musicxml: Union[str, PreparedGold],
     flavor: Literal["full", "lmx"],
     debug=False,
     canonicalize_gold=True,
-    errout: Optional[TextIO] = None
+    errout: Optional[TextIO] = None,
+    engine: Literal["zss", "fast"] = "zss",
+    decomposed: bool = False,
+    cache: Optional[TEDnCache] = None,
+    bound_only: bool = False
 ) -> TEDnResult:
     """
     Provides access to the TEDn metric with a nice string-based interface.
@@ -27,7 +34,9 @@ def TEDn_lmx_xml(
         which is necessary for proper <forward>, <backup> evaluation
 
     :param str predicted_lmx: The LMX string that was predicted by your img2seq model
-    :param str gold_musicxml: The gold XML data loaded from the .musicxml annotation file
+    :param str gold_musicxml: The gold XML data loaded from the .musicxml annotation file,
+        or the gold data already preprocessed by the prepare_gold function
+        (then it must have been prepared with the same flavor and canonicalize_gold).
     :param str flavor: Use 'full' to do a regular TEDn computation, or 'lmx'
         to prune the gold target down to the set of musical concepts covered by LMX,
         for example removing <direction>, <harmony>, or <barline> elements.
@@ -37,25 +46,50 @@ def TEDn_lmx_xml(
         Not necessary, but recommended. It primarily strips away whitespace
         (but TEDn ignores whitespace anyway).
     :param Optional[TextIO] errout: Delinearizer soft and hard errors are sent here.
+    :param str engine: Tree edit distance implementation, see the TEDn function.
+    :param bool decomposed: Compute the measure-decomposed approximation
+        of TEDn instead (see TEDn_decomposed), usable for whole scores.
+    :param Optional[TEDnCache] cache: When given, the result is looked up
+        in the cache first (no debug or error output is produced then),
+        and computed results are stored into it.
+    :param bool bound_only: Only compute cheap bounds of the edit cost,
+        see the TEDn function.
     """
 
     assert flavor in {"full", "lmx"}
 
-    # preprocess gold XML to remove whitespace
-    # (not necessary after the TEDn .strip() bugfix, but present just in case...)
-    if canonicalize_gold:
-        gold_musicxml = ET.canonicalize(
-            gold_musicxml,
-            strip_text=True
+    if cache is not None:
+        cache_key = TEDnCache.make_key(
+            predicted_lmx, gold_musicxml, flavor,
+            canonicalize_gold=canonicalize_gold,
+            decomposed=decomposed,
+            bound_only=bound_only
         )
+        result = cache.get(cache_key)
+        if result is None:
+            result = TEDn_lmx_xml(
+                predicted_lmx, gold_musicxml, flavor,
+                debug=debug,
+                canonicalize_gold=canonicalize_gold,
+                errout=errout,
+                engine=engine,
+                decomposed=decomposed,
+                bound_only=bound_only
+            )
+            cache.put(cache_key, result)
+        return result
 
     # prepare gold data
-    gold_score = ET.fromstring(gold_musicxml)
-    assert gold_score.tag == "score-partwise"
-    gold_parts = gold_score.findall("part")
-    assert len(gold_parts) == 1
-    gold_part = gold_parts[0]
-    actual_durations_to_fractional(gold_part) # evaluate in fractional durations
+    if isinstance(gold_musicxml, PreparedGold):
+        gold = gold_musicxml
+        assert gold.flavor == flavor, "Gold was prepared for a different flavor"
+        assert gold.canonicalize_gold == canonicalize_gold, \
+            "Gold was prepared with a different canonicalization"
+        assert not debug, "Debug comparison needs the raw gold XML"
+        assert not decomposed, "Decomposed TEDn needs the raw gold XML"
+        gold_part = None
+    else:
+        gold_part = _preprocess_gold(gold_musicxml, flavor, canonicalize_gold)
 
     # prepare predicted data
     try:
@@ -74,25 +108,87 @@ def TEDn_lmx_xml(
     # prune down to the elements that we actually predict
     # (otherwise TEDn penalizes missing <direction> and various ornaments)
     if flavor == "lmx":
-        pruner = Pruner(
-            
-            # these are acutally also ignored by TEDn
-            prune_durations=False, # MUST BE FALSE! Is used in backups and forwards
-            prune_measure_attributes=False,
-            prune_prints=True,
-            prune_slur_numbering=True,
-
-            # these measure elements are not encoded in LMX, prune them
-            prune_directions=True,
-            prune_barlines=True,
-            prune_harmony=True,
-            
-        )
-        pruner.process_part(gold_part)
-        pruner.process_part(predicted_part)
+        _create_pruner().process_part(predicted_part)
+
+    if gold_part is None:
+        return TEDn(predicted_part, gold, engine=engine, bound_only=bound_only)
 
     if debug:
         compare_parts(expected=gold_part, given=predicted_part)
 
-    return TEDn(predicted_part, gold_part)
+    if decomposed:
+        assert not bound_only, "Decomposed TEDn does not compute bounds"
+        return TEDn_decomposed(
+            predicted_part, gold_part, engine=engine, exact_max_nodes=None
+        )
+
+    return TEDn(predicted_part, gold_part, engine=engine, bound_only=bound_only)
     # return TEDnResult(1, 1, 1) # debugging
+
+
+def prepare_gold(
+    gold_musicxml: str,
+    flavor: Literal["full", "lmx"],
+    canonicalize_gold=True
+) -> PreparedGold:
+    """
+    Runs the gold-side preprocessing of the TEDn_lmx_xml function once,
+    so that the result can be reused for many evaluations
+    (or pickled and stored next to the dataset).
+    """
+    assert flavor in {"full", "lmx"}
+    return PreparedGold(
+        _preprocess_gold(gold_musicxml, flavor, canonicalize_gold),
+        source_hash=gold_source_hash(gold_musicxml),
+        flavor=flavor,
+        canonicalize_gold=canonicalize_gold
+    )
+
+
+def gold_source_hash(gold_musicxml: str) -> str:
+    """Hash identifying the gold XML string, stored in PreparedGold"""
+    return hashlib.sha256(gold_musicxml.encode("utf-8")).hexdigest()
+
+
+def _preprocess_gold(
+    gold_musicxml: str,
+    flavor: Literal["full", "lmx"],
+    canonicalize_gold: bool
+) -> ET.Element:
+    # preprocess gold XML to remove whitespace
+    # (not necessary after the TEDn .strip() bugfix, but present just in case...)
+    if canonicalize_gold:
+        gold_musicxml = ET.canonicalize(
+            gold_musicxml,
+            strip_text=True
+        )
+
+    # prepare gold data
+    gold_score = ET.fromstring(gold_musicxml)
+    assert gold_score.tag == "score-partwise"
+    gold_parts = gold_score.findall("part")
+    assert len(gold_parts) == 1
+    gold_part = gold_parts[0]
+    actual_durations_to_fractional(gold_part) # evaluate in fractional durations
+
+    if flavor == "lmx":
+        _create_pruner().process_part(gold_part)
+
+    return gold_part
+
+
+def _create_pruner() -> Pruner:
+    return Pruner(
+            
+        # these are acutally also ignored by TEDn
+        prune_durations=False, # MUST BE FALSE! Is used in backups and forwards
+        prune_measure_attributes=False,
+        prune_prints=True,
+        prune_slur_numbering=True,
+
+        # these measure elements are not encoded in LMX, prune them
+        prune_directions=True,
+        prune_barlines=True,
+        prune_harmony=True,
+        
+    )
@@ -0,0 +1,214 @@
+import multiprocessing
+import multiprocessing.connection
+import heapq
+import time
+import traceback
+from typing import Iterable, Iterator, Tuple, Union, Optional, Literal
+from .TEDn import TEDnResult, PreparedGold
+from .TEDn_lmx_xml import TEDn_lmx_xml
+
+
+def estimate_cost(predicted_lmx: str, gold: Union[str, PreparedGold]) -> int:
+    """
+    Estimates the relative cost of a TEDn evaluation from the number
+    of nodes of both trees (the tree edit distance is roughly quadratic).
+    Predicted nodes are estimated by the LMX tokens, gold nodes by the
+    XML start tags (or counted exactly for prepared gold).
+    """
+    predicted_nodes = len(predicted_lmx.split()) + 1
+    if isinstance(gold, PreparedGold):
+        gold_nodes = len(gold.tree)
+    else:
+        gold_nodes = gold.count("<") // 2 + 1
+    return predicted_nodes * gold_nodes
+
+
+class TEDnScheduler:
+    """
+    Evaluates TEDn_lmx_xml over many samples in parallel worker processes.
+
+    Tasks are dispatched one by one to idle workers, the most expensive
+    ones first (see estimate_cost), so that a long evaluation does not
+    end up last. When an evaluation exceeds the timeout, or its worker
+    crashes, the worker is replaced and the sample is evaluated again
+    with bound_only=True, returning a bounded (not exact) result.
+
+    Workers are started as separate processes that receive the tasks
+    over pipes, so any multiprocessing start method can be used.
+    """
+
+    EXACT = "exact"
+    """The result was computed exactly"""
+
+    TIMEOUT = "timeout"
+    """The evaluation timed out, the result only holds the bounds"""
+
+    CRASH = "crash"
+    """The evaluation crashed, the result only holds the bounds"""
+
+    FAILED = "failed"
+    """Even the bounds could not be computed, there is no result"""
+
+    def __init__(
+        self,
+        workers: int,
+        flavor: Literal["full", "lmx"],
+        engine: Literal["zss", "fast"] = "zss",
+        timeout: Optional[float] = None,
+        context: Optional[multiprocessing.context.BaseContext] = None
+    ):
+        assert workers >= 1
+        self.workers = workers
+        self.flavor = flavor
+        self.engine = engine
+        self.timeout = timeout
+        self.context = context or multiprocessing.get_context()
+
+    def run(
+        self,
+        tasks: Iterable[Tuple[int, str, Union[str, PreparedGold]]]
+    ) -> Iterator[Tuple[int, Optional[TEDnResult], str]]:
+        """
+        Evaluates the (index, predicted_lmx, gold) tasks and yields
+        (index, result, status) triples in the order of completion,
+        where status is one of EXACT, TIMEOUT, CRASH, FAILED.
+        """
+        # pending tasks, bounded re-evaluations come before all others
+        pending = []
+        for order, (index, predicted_lmx, gold) in enumerate(tasks):
+            heapq.heappush(pending, (
+                1, -estimate_cost(predicted_lmx, gold), order, index,
+                predicted_lmx, gold, TEDnScheduler.EXACT
+            ))
+        if len(pending) == 0:
+            return
+
+        workers = [
+            _Worker(self.context, self.flavor, self.engine)
+            for _ in range(min(self.workers, len(pending)))
+        ]
+        try:
+            running = 0
+            while len(pending) > 0 or running > 0:
+                # dispatch
+                for worker in workers:
+                    if worker.task is None and len(pending) > 0:
+                        worker.dispatch(heapq.heappop(pending))
+                        running += 1
+
+                # wait for results, crashes or the nearest timeout
+                busy = [w for w in workers if w.task is not None]
+                wait_time = None
+                if self.timeout is not None:
+                    deadlines = [
+                        w.started + self.timeout for w in busy
+                        if w.task[-1] == TEDnScheduler.EXACT
+                    ]
+                    if len(deadlines) > 0:
+                        wait_time = max(0, min(deadlines) - time.time())
+                multiprocessing.connection.wait(
+                    [w.connection for w in busy] + [w.process.sentinel for w in busy],
+                    timeout=wait_time
+                )
+
+                for worker in busy:
+                    task = worker.task
+                    message = worker.receive() if worker.connection.poll() else None
+                    if isinstance(message, TEDnResult):
+                        running -= 1
+                        yield task[3], message, task[-1]
+                        continue
+                    elif message is not None:
+                        # the evaluation raised an exception
+                        failure = TEDnScheduler.CRASH
+                        running -= 1
+                    elif not worker.process.is_alive():
+                        failure = TEDnScheduler.CRASH
+                        worker.restart()
+                        running -= 1
+                    elif self.timeout is not None \
+                            and task[-1] == TEDnScheduler.EXACT \
+                            and time.time() - worker.started >= self.timeout:
+                        failure = TEDnScheduler.TIMEOUT
+                        worker.restart()
+                        running -= 1
+                    else:
+                        continue
+
+                    # failed exact evaluations are retried for the bounds only
+                    if task[-1] == TEDnScheduler.EXACT:
+                        heapq.heappush(pending, (0, *task[1:-1], failure))
+                    else:
+                        yield task[3], None, TEDnScheduler.FAILED
+        finally:
+            for worker in workers:
+                worker.stop()
+
+
+class _Worker:
+    """One worker process of the TEDnScheduler with its current task"""
+    def __init__(self, context, flavor: str, engine: str):
+        self.context = context
+        self.flavor = flavor
+        self.engine = engine
+        self.task = None
+        self.started = None
+        self._start()
+
+    def _start(self):
+        self.connection, child_connection = self.context.Pipe()
+        self.process = self.context.Process(
+            target=_worker_main,
+            args=(child_connection, self.flavor, self.engine),
+            daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+
+    def dispatch(self, task):
+        if not self.process.is_alive():
+            self.restart()
+        self.task = task
+        self.started = time.time()
+        _, _, _, index, predicted_lmx, gold, status = task
+        self.connection.send(
+            (predicted_lmx, gold, status != TEDnScheduler.EXACT)
+        )
+
+    def receive(self):
+        """Returns the result, or None when the process has died"""
+        try:
+            message = self.connection.recv()
+        except EOFError:
+            self.process.join()
+            return None
+        self.task = None
+        return message
+
+    def restart(self):
+        self.task = None
+        self.stop()
+        self._start()
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+def _worker_main(connection, flavor: str, engine: str):
+    while True:
+        try:
+            predicted_lmx, gold, bound_only = connection.recv()
+        except EOFError:
+            return
+        try:
+            result = TEDn_lmx_xml(
+                predicted_lmx, gold, flavor,
+                engine=engine,
+                bound_only=bound_only
+            )
+        except Exception:
+            result = traceback.format_exc()
+        connection.send(result)
@@ -1,5 +1,5 @@
 import xml.etree.ElementTree as ET
-from typing import List, Optional, TextIO, Set
+from typing import List, Optional, TextIO, Set, Iterable
 from .vocabulary import *
 import io
 from fractions import Fraction
@@ -71,20 +71,32 @@ class Delinearizer:
         self._open_beam_count = 0
         self._open_beam_count_grace = 0
 
+        # incremental processing state (see the feed method)
+        self._feeding = False # between the first feed and finish
+        self._fed_token_count = 0 # for token positions
+        self._open_measure_tokens: Optional[List[Token]] = None
+        self._tokens_before_first_measure: List[Token] = []
+
     def _error(self, token: Token, *values):
         header = f"[ERROR][Token '{token.terminal}' at position {token.position}]:"
         print(header, *values, file=self._errout)
 
     def process_text(self, text: str) -> ET.Element:
         # reset within-part state
-        self._fractional_measure_duration = None
-        self._open_slur_count = 0
-        self._pitch_alternator = PitchAlternator()
+        self._reset_part_state()
 
         # process LMX
         tokens = self.lex(text)
         self.process_system(tokens)
 
+        return self._finish_part()
+    
+    def _reset_part_state(self):
+        self._fractional_measure_duration = None
+        self._open_slur_count = 0
+        self._pitch_alternator = PitchAlternator()
+    
+    def _finish_part(self) -> ET.Element:
         # add the <staves> element if 2 or more staves present
         self._add_staves_head_element()
 
@@ -94,6 +106,69 @@ class Delinearizer:
         
         return self.part_element
     
+    def feed(self, terminal: str):
+        """
+        Incremental alternative to process_text, feeds one LMX token.
+        A measure is processed and appended to the part_element as soon
+        as the next 'measure' token arrives, only the tokens of the open
+        measure are kept. Call finish() after the last token to get
+        the same part_element as process_text would produce.
+        """
+        if not self._feeding:
+            self._feeding = True
+            self._fed_token_count = 0
+            self._open_measure_tokens = None
+            self._tokens_before_first_measure = []
+            self._reset_part_state()
+        
+        self._fed_token_count += 1
+        token = Token(terminal, self._fed_token_count)
+        if terminal not in VOCABULARY:
+            self._error(token, "Token not present in the vocabulary.")
+            return
+        
+        if terminal == "measure":
+            if self._open_measure_tokens is not None:
+                self._close_measure()
+            elif len(self._tokens_before_first_measure) > 0:
+                self._error(
+                    self._tokens_before_first_measure[0],
+                    "There are tokens before the first 'measure' token."
+                )
+            self._open_measure_tokens = []
+        elif self._open_measure_tokens is None:
+            self._tokens_before_first_measure.append(token)
+        else:
+            self._open_measure_tokens.append(token)
+    
+    def feed_many(self, terminals: Iterable[str]):
+        """Feeds a sequence of LMX tokens, see the feed method"""
+        for terminal in terminals:
+            self.feed(terminal)
+    
+    def finish(self) -> ET.Element:
+        """Finishes the incremental processing, see the feed method"""
+        if self._open_measure_tokens is None:
+            if len(self._tokens_before_first_measure) > 0:
+                self._error(
+                    self._tokens_before_first_measure[0],
+                    "There are tokens before the first 'measure' token."
+                )
+        elif len(self._open_measure_tokens) > 0:
+            # (a trailing empty measure is dropped, as in process_text)
+            self._close_measure()
+        
+        self._feeding = False
+        self._open_measure_tokens = None
+        self._tokens_before_first_measure = []
+
+        return self._finish_part()
+    
+    def _close_measure(self):
+        measure_element = self.process_measure(self._open_measure_tokens)
+        self.part_element.append(measure_element)
+        self._open_measure_tokens = None
+    
     def _add_staves_head_element(self):
         max_clef_number = max(
             (int(clef.get("number", "1"))
@@ -117,7 +192,7 @@ class Delinearizer:
         for i, terminal in enumerate(terminals):
             position = i + 1
             token = Token(terminal, position)
-            if terminal not in ALL_TOKENS:
+            if terminal not in VOCABULARY:
                 self._error(token, "Token not present in the vocabulary.")
                 continue
             tokens.append(token)
@@ -142,7 +217,10 @@ class Delinearizer:
             if not before_first_measure:
                 clusters.append(this_cluster)
             elif len(this_cluster) > 0:
-                self._error("There are tokens before the first 'measure' token.")
+                self._error(
+                    this_cluster[0],
+                    "There are tokens before the first 'measure' token."
+                )
 
         for token in tokens:
             if token.terminal == "measure":
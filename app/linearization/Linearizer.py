@@ -1,5 +1,6 @@
 import xml.etree.ElementTree as ET
-from typing import Iterator, Optional, List, TextIO, Dict
+from typing import Iterator, Iterable, Optional, List, TextIO, Dict
+from array import array
 import io
 from .vocabulary import *
 from fractions import Fraction
@@ -18,18 +19,65 @@ IGNORED_ATTRIBUTES_ELEMENTS = set([
 ])
 
 
+def _children_by_tag(element: ET.Element) -> Dict[str, List[ET.Element]]:
+    """Buckets children of an element by their tag in a single pass"""
+    children: Dict[str, List[ET.Element]] = {}
+    for child in element:
+        bucket = children.get(child.tag)
+        if bucket is None:
+            children[child.tag] = [child]
+        else:
+            bucket.append(child)
+    return children
+
+
+def _grandchildren_by_tag(
+    children: Dict[str, List[ET.Element]],
+    tag: str
+) -> Dict[str, List[ET.Element]]:
+    """Buckets children of all the children with the given tag"""
+    elements = children.get(tag)
+    if elements is None:
+        return {}
+    if len(elements) == 1:
+        return _children_by_tag(elements[0])
+    grandchildren: Dict[str, List[ET.Element]] = {}
+    for element in elements:
+        for grandchild in element:
+            grandchildren.setdefault(grandchild.tag, []).append(grandchild)
+    return grandchildren
+
+
+def _first(
+    children: Dict[str, List[ET.Element]],
+    tag: str
+) -> Optional[ET.Element]:
+    """Returns the first child with the given tag, like element.find(tag)"""
+    bucket = children.get(tag)
+    return None if bucket is None else bucket[0]
+
+
 # NOTE: Use assert only for very major things. For everything else,
 # use self._error, so that the code works fine with slightly unexpected input
 
 
 class Linearizer:
-    def __init__(self, errout: Optional[TextIO] = None, fail_on_unknown_tokens=True):
+    def __init__(
+        self,
+        errout: Optional[TextIO] = None,
+        fail_on_unknown_tokens=True,
+        emit_ids=False
+    ):
         self._errout = errout or io.StringIO()
         """Print errors and warnings here"""
 
         self.output_tokens: List[str] = []
         """The output linearized sequence, split up into tokens"""
 
+        self.output_ids: Optional[array] = array("H") if emit_ids else None
+        """The output sequence as token ids (see VOCABULARY),
+        only collected when emit_ids is set"""
+
         self.fail_on_unknown_tokens = fail_on_unknown_tokens
         
         # within-part state
@@ -57,16 +105,29 @@ class Linearizer:
 
     def _emit(self, token: str):
         """Emits a token into the output sequence"""
+        token_id = VOCABULARY.token_ids.get(token)
         if self.fail_on_unknown_tokens:
-            assert token in ALL_TOKENS, f"Token '{token}' not in the vocabulary"
+            assert token_id is not None, f"Token '{token}' not in the vocabulary"
         else:
-            if token not in ALL_TOKENS:
+            if token_id is None:
                 self._error(f"Token '{token}' not in the vocabulary")
                 return
         
         self.output_tokens.append(token)
+        if self.output_ids is not None:
+            self.output_ids.append(token_id)
 
     def process_part(self, part: ET.Element):
+        assert part.tag == "part"
+        self.process_measures(part, part_id=part.attrib.get("id"))
+
+    def process_measures(
+        self,
+        measures: Iterable[ET.Element],
+        part_id: Optional[str] = None
+    ):
+        """Processes measures of one part, which can also be streamed
+        one by one (see PianoPartStream), instead of a whole <part>"""
         # reset within-part state
         self._part_id = None
         self._measure_number = None
@@ -78,9 +139,8 @@ class Linearizer:
         self._clefs = {}
         self._key_signature_fifths = None
         
-        assert part.tag == "part"
-        self._part_id = part.attrib.get("id")
-        for measure in part:
+        self._part_id = part_id
+        for measure in measures:
             if measure.tag is ET.Comment:
                 continue # ignore comments
 
@@ -121,12 +181,15 @@ class Linearizer:
     def process_note(self, note: ET.Element, measure: ET.Element):
         assert note.tag == "note"
 
+        # children are visited only once and looked up by tag from then on
+        children = _children_by_tag(note)
+
         # [print-object:no]
         if note.attrib.get("print-object") == "no":
             self._emit("print-object:no")
 
         # [grace]
-        grace_element = note.find("grace")
+        grace_element = _first(children, "grace")
         is_grace_note = grace_element is not None
         if is_grace_note:
             self._emit("grace")
@@ -134,36 +197,32 @@ class Linearizer:
                 self._emit("grace:slash")
         
         # [chord]
-        chord_element = note.find("chord")
-        is_chord = chord_element is not None
+        is_chord = "chord" in children
         if is_chord:
             self._emit("chord")
 
-        # [rest]
-        rest_element = note.find("rest")
-
         # [rest] or [pitch]
-        rest_element = note.find("rest")
+        rest_element = _first(children, "rest")
         is_measure_rest = False
         pitch_token: Optional[str] = None
         if rest_element is not None:
             self._emit("rest")
             is_measure_rest = rest_element.attrib.get("measure") == "yes"
         else:
-            pitch_element = note.find("pitch")
+            pitch_element = _first(children, "pitch")
             pitch_token = pitch_element.find("step").text + pitch_element.find("octave").text
             assert pitch_token in PITCH_TOKENS, "Invalid pitch: " + pitch_token
             self._emit(pitch_token)
         
         # [voice]
-        voice_element = note.find("voice")
+        voice_element = _first(children, "voice")
         if voice_element is not None:
             if self._voice != voice_element.text:
                 self._emit("voice:" + voice_element.text)
                 self._voice = voice_element.text
         
         # [type] or [rest:measure] - the ROOT of the [note] sequence
-        type_element = note.find("type")
+        type_element = _first(children, "type")
         if type_element is not None:
             assert type_element.text in NOTE_TYPE_TOKENS
             self._emit(type_element.text)
@@ -173,18 +232,19 @@ class Linearizer:
             self._error("Note does not have <type>:", ET.tostring(note))
         
         # [time-modification] (tuplets rhythm-wise)
-        if note.find("time-modification") is not None:
-            actual = note.find("time-modification/actual-notes").text
-            normal = note.find("time-modification/normal-notes").text
+        time_modification_element = _first(children, "time-modification")
+        if time_modification_element is not None:
+            actual = time_modification_element.find("actual-notes").text
+            normal = time_modification_element.find("normal-notes").text
             token = actual + "in" + normal
             self._emit(token)
 
         # [dot]
-        for dot_element in note.findall("dot"):
+        for dot_element in children.get("dot", []):
             self._emit("dot")
 
         # [accidental]
-        accidental_element = note.find("accidental")
+        accidental_element = _first(children, "accidental")
         if accidental_element is not None:
             accidental = accidental_element.text
             if accidental not in ACCIDENTAL_TOKENS:
@@ -197,7 +257,7 @@ class Linearizer:
         # DOUBLE STEMS: are encoded as two notes in two voices,
         # this is what MuseScore produces and is reasonable
         # (even though MusicXML allows for "double" as a value here)
-        stem_element = note.find("stem")
+        stem_element = _first(children, "stem")
         if stem_element is not None:
             if stem_element.text not in ["up", "down", "none"]:
                 self._error(
@@ -212,7 +272,7 @@ class Linearizer:
         # [staff]
         # like stems, staves are indicated at the beginning
         # of a measure, voice, and during a change of staff
-        staff_element = note.find("staff")
+        staff_element = _first(children, "staff")
         if staff_element is not None:
             if staff_element.text not in ["1", "2", "3"]:
                 self._error("Only staves 1,2,3 are supported.")
@@ -223,7 +283,7 @@ class Linearizer:
                     self._staff = staff_element.text
 
         # [beam]
-        for beam in note.findall("beam"):
+        for beam in children.get("beam", []):
             assert beam.text in ["begin", "end", "continue", "forward hook", "backward hook"]
             if beam.text != "continue":
                 if beam.text == "forward hook":
@@ -233,23 +293,26 @@ class Linearizer:
                 else:
                     self._emit("beam:" + beam.text)
 
+        # notations are bucketed the same way (over all <notations> elements)
+        notations = _grandchildren_by_tag(children, "notations")
+
         # [tied]
-        for tied_element in note.findall("notations/tied"):
+        for tied_element in notations.get("tied", []):
             tied_type = tied_element.attrib.get("type")
             assert tied_type in ["start", "stop"]
             self._emit("tied:" + tied_type)
 
         # [tuplet]
-        for tuplet_element in note.findall("notations/tuplet"):
+        for tuplet_element in notations.get("tuplet", []):
             tuplet_type = tuplet_element.attrib.get("type")
             assert tuplet_type in ["start", "stop"]
             self._emit("tuplet:" + tuplet_type)
         
         # extended notations and ornaments
-        self._process_extended_notations(note)
+        self._process_extended_notations(children)
         
         # extract duration
-        duration_element = note.find("duration")
+        duration_element = _first(children, "duration")
         duration: Optional[int] = None
         if duration_element is None and not is_grace_note:
             self._error("Note lacks duration:", ET.tostring(note))
@@ -258,7 +321,7 @@ class Linearizer:
             assert duration > 0
 
         # check assumptions about the linearization process
-        self._verify_note_duration(duration, note, measure, is_measure_rest, is_grace_note)
+        self._verify_note_duration(duration, note, children, is_measure_rest, is_grace_note)
         self._verify_chords(duration, pitch_token, is_chord, note, measure)
 
         # perform on-exit state changes
@@ -267,14 +330,17 @@ class Linearizer:
         if duration is not None and not is_chord:
             self._onset += duration
     
-    def _process_extended_notations(self, note: ET.Element):
+    def _process_extended_notations(self, children: Dict[str, List[ET.Element]]):
         # save some compute time
-        notations = note.find("notations")
-        if notations is None:
+        notations_element = _first(children, "notations")
+        if notations_element is None:
             return
+        notations = _children_by_tag(notations_element)
+        articulations = _grandchildren_by_tag(notations, "articulations")
+        ornaments = _grandchildren_by_tag(notations, "ornaments")
 
         # [slur]
-        for slur_element in notations.findall("slur"):
+        for slur_element in notations.get("slur", []):
             slur_type = slur_element.attrib.get("type")
             if slur_type == "continue":
                 pass # ignore
@@ -283,37 +349,31 @@ class Linearizer:
                 self._emit("slur:" + slur_type)
 
         # [fermata]
-        fermata_element = notations.find("fermata")
-        if fermata_element is not None:
+        if "fermata" in notations:
             self._emit("fermata")
 
         # [arpeggiate]
-        arpeggiate_element = notations.find("arpeggiate")
-        if arpeggiate_element is not None:
+        if "arpeggiate" in notations:
             self._emit("arpeggiate")
         
         # [staccato]
-        staccato_element = notations.find("articulations/staccato")
-        if staccato_element is not None:
+        if "staccato" in articulations:
             self._emit("staccato")
 
         # [accent]
-        accent_element = notations.find("articulations/accent")
-        if accent_element is not None:
+        if "accent" in articulations:
             self._emit("accent")
 
         # [strong-accent]
-        strong_accent_element = notations.find("articulations/strong-accent")
-        if strong_accent_element is not None:
+        if "strong-accent" in articulations:
             self._emit("strong-accent")
 
         # [tenuto]
-        tenuto_element = notations.find("articulations/tenuto")
-        if tenuto_element is not None:
+        if "tenuto" in articulations:
             self._emit("tenuto")
         
         # [tremolo]
-        tremolo_element = notations.find("ornaments/tremolo")
+        tremolo_element = _first(ornaments, "tremolo")
         if tremolo_element is not None:
             tremolo_type = tremolo_element.attrib.get("type", "single")
             tremolo_marks = tremolo_element.text
@@ -323,12 +383,12 @@ class Linearizer:
             self._emit("tremolo:" + tremolo_marks)
 
         # [trill-mark]
-        trill_mark_element = notations.find("ornaments/trill-mark")
-        if trill_mark_element is not None:
+        if "trill-mark" in ornaments:
             self._emit("trill-mark")
     
     def _verify_note_duration(
-        self, duration: Optional[int], note: ET.Element, measure: ET.Element,
+        self, duration: Optional[int], note: ET.Element,
+        children: Dict[str, List[ET.Element]],
         is_measure_rest: bool, is_grace_note: bool
     ):
         if duration is None:
@@ -346,7 +406,7 @@ class Linearizer:
             return
         
         # verify for regular notes
-        expected_duration, expected_duration_float = self._expected_note_duration(note)
+        expected_duration, expected_duration_float = self._expected_note_duration(children)
         if expected_duration != duration:
             self._error(
                 "Note does not have expected duration.",
@@ -355,8 +415,8 @@ class Linearizer:
                 ET.tostring(note)
             )
     
-    def _expected_note_duration(self, note: ET.Element) -> int:
-        type_element = note.find("type")
+    def _expected_note_duration(self, children: Dict[str, List[ET.Element]]) -> int:
+        type_element = _first(children, "type")
         note_type = type_element.text
 
         # simple conversion
@@ -364,14 +424,15 @@ class Linearizer:
 
         # handle duration dots
         dot_duration = expected_duration / 2
-        for _ in note.findall("dot"):
+        for _ in children.get("dot", []):
             expected_duration += dot_duration
             dot_duration /= 2
         
         # handle time modification
-        if note.find("time-modification") is not None:
-            actual = int(note.find("time-modification/actual-notes").text)
-            normal = int(note.find("time-modification/normal-notes").text)
+        time_modification_element = _first(children, "time-modification")
+        if time_modification_element is not None:
+            actual = int(time_modification_element.find("actual-notes").text)
+            normal = int(time_modification_element.find("normal-notes").text)
             expected_duration *= Fraction(normal, actual)
         
         # The denominaotor now SHOULD be 1, if the file is valid MusicXML.
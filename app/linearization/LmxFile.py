@@ -53,6 +53,6 @@ class LmxFile:
     def _load_system_line(self, line: str):
         tokens = line.strip().split()
         for token in tokens:
-            if token not in ALL_TOKENS:
+            if token not in VOCABULARY:
                 raise Exception(f"Unknown token '{token}' in the LMX file")
             self.systems[-1].append(token)
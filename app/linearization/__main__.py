@@ -34,81 +34,107 @@ delinearize_parser.add_argument(
     type=str,
 )
 
+for command_name, help_text in [
+    ("linearize-batch", "Generates LMX files from many MusicXML files"),
+    ("delinearize-batch", "Generates MusicXML files from many LMX files"),
+]:
+    batch_parser = subparsers.add_parser(
+        command_name,
+        aliases=[],
+        help=help_text
+    )
+    batch_parser.add_argument(
+        "inputs",
+        type=str,
+        nargs="+",
+        help="Directories, glob patterns, files, or @file-lists"
+    )
+    batch_parser.add_argument(
+        "--output_dir",
+        type=str,
+        default=None,
+        help="Where to write outputs, next to the inputs by default"
+    )
+    batch_parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes"
+    )
+    batch_parser.add_argument(
+        "--errors",
+        type=str,
+        default=None,
+        help="JSONL file for per-file errors, stderr by default"
+    )
+    batch_parser.add_argument(
+        "--soft",
+        action="store_true",
+        help="Skip files whose output already exists"
+    )
+
+export_grammar_parser = subparsers.add_parser(
+    "export-grammar",
+    aliases=[],
+    help="Exports the LMX grammar automaton as a .npz file"
+)
+export_grammar_parser.add_argument(
+    "filename",
+    type=str,
+)
+
 
 ###################
 # Implementations #
 ###################
 
-from .Linearizer import Linearizer
-from .Delinearizer import Delinearizer
+from .batch import linearize_file, delinearize_text, run_batch
 from ..symbolic.MxlFile import MxlFile
-import xml.etree.ElementTree as ET
-from ..symbolic.part_to_score import part_to_score
+import io
 
 
 def linearize(filename: str):
-    if filename == "-":
-        input_xml = sys.stdin.readline()
-        mxl = MxlFile(ET.ElementTree(
-            ET.fromstring(input_xml))
-        )
-    elif filename.endswith(".mxl"):
-        mxl = MxlFile.load_mxl(filename)
-    else:
-        with open(filename, "r") as f:
-            input_xml = f.readline()
-            mxl = MxlFile(ET.ElementTree(
-                ET.fromstring(input_xml))
-            )
-    
+    # the input is streamed measure by measure, only the piano part is built
+    # (or the first part, if there is no piano)
     try:
-        part = mxl.get_piano_part()
-    except:
-        part = mxl.tree.find("part")
-    
-    if part is None or part.tag != "part":
+        if filename == "-":
+            with io.BytesIO(sys.stdin.buffer.read()) as file:
+                output_tokens = linearize_file(file, errout=sys.stderr)
+        elif filename.endswith(".mxl"):
+            with MxlFile.open_mxl(filename) as file:
+                output_tokens = linearize_file(file, errout=sys.stderr)
+        else:
+            with open(filename, "rb") as file:
+                output_tokens = linearize_file(file, errout=sys.stderr)
+    except Exception as e:
+        print(e, file=sys.stderr)
         print("No <part> element found.", file=sys.stderr)
         exit()
-    
-    linearizer = Linearizer(
-        errout=sys.stderr
-    )
-    linearizer.process_part(part)
-    output_lmx = " ".join(linearizer.output_tokens)
+    output_lmx = " ".join(output_tokens)
     
     if filename == "-":
         print(output_lmx)
     else:
-        with open(os.path.splitext(filename) + ".musicxml", "r") as f:
+        with open(os.path.splitext(filename)[0] + ".lmx", "w") as f:
             print(output_lmx, file=f)
 
 
 def delinearize(filename: str):
     if filename == "-":
-        input_lmx = sys.stdin.readline()
+        input_lmx = sys.stdin.read()
     else:
         with open(filename, "r") as f:
-            input_lmx = f.readline()
+            input_lmx = f.read()
 
-    delinearizer = Delinearizer(
-        errout=sys.stderr
-    )
-    delinearizer.process_text(input_lmx)
-    score_etree = part_to_score(delinearizer.part_element)
-    output_xml = str(ET.tostring(
-        score_etree.getroot(),
-        encoding="utf-8",
-        xml_declaration=True
-    ), "utf-8")
+    output_xml = delinearize_text(input_lmx, errout=sys.stderr)
 
     if filename == "-":
         print(output_xml)
     else:
-        with open(os.path.splitext(filename) + ".musicxml", "r") as f:
+        with open(os.path.splitext(filename)[0] + ".musicxml", "w") as f:
             print(output_xml, file=f)
 
 
-
 ########
 # Main #
 ########
@@ -120,6 +146,18 @@ if args.command_name == "linearize":
     linearize(args.filename)
 elif args.command_name == "delinearize":
     delinearize(args.filename)
+elif args.command_name in ["linearize-batch", "delinearize-batch"]:
+    run_batch(
+        command=args.command_name[:-len("-batch")],
+        inputs=args.inputs,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        errors_path=args.errors,
+        soft=args.soft
+    )
+elif args.command_name == "export-grammar":
+    from .grammar import compile_grammar
+    compile_grammar().save(args.filename)
 else:
     parser.print_help()
     exit(2)
@@ -0,0 +1,186 @@
+import glob
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import traceback
+import xml.etree.ElementTree as ET
+from typing import List, Optional, Tuple, TextIO, Literal, IO
+from .Linearizer import Linearizer
+from .Delinearizer import Delinearizer
+from ..symbolic.MxlFile import MxlFile
+from ..symbolic.PianoPartStream import PianoPartStream
+from ..symbolic.part_to_score import part_to_score
+
+
+LINEARIZE_EXTENSIONS = [".mxl", ".musicxml", ".xml"]
+DELINEARIZE_EXTENSIONS = [".lmx"]
+
+
+def linearize_file(file: IO[bytes], errout: Optional[TextIO] = None) -> List[str]:
+    """Linearizes the piano part (or the first part, if there is no piano)
+    of the MusicXML file, streaming it measure by measure"""
+    stream = PianoPartStream(file, fallback_to_first_part=True)
+    linearizer = Linearizer(errout=errout)
+    linearizer.process_measures(stream, part_id=stream.part_id)
+    return linearizer.output_tokens
+
+
+def linearize_path(path: str, errout: Optional[TextIO] = None) -> str:
+    """Linearizes a .mxl or an uncompressed MusicXML file into LMX"""
+    if path.endswith(".mxl"):
+        with MxlFile.open_mxl(path) as file:
+            return " ".join(linearize_file(file, errout))
+    with open(path, "rb") as file:
+        return " ".join(linearize_file(file, errout))
+
+
+def delinearize_text(input_lmx: str, errout: Optional[TextIO] = None) -> str:
+    """Delinearizes LMX into a MusicXML string"""
+    delinearizer = Delinearizer(
+        errout=errout
+    )
+    delinearizer.process_text(input_lmx)
+    score_etree = part_to_score(delinearizer.part_element)
+    return str(ET.tostring(
+        score_etree.getroot(),
+        encoding="utf-8",
+        xml_declaration=True
+    ), "utf-8")
+
+
+def collect_input_files(inputs: List[str], extensions: List[str]) -> List[str]:
+    """
+    Resolves the input arguments of the batch commands into a list of files.
+    An input can be a directory (searched recursively for files with the
+    given extensions), a glob pattern, a file, or a file list prefixed
+    with '@' (one path per line).
+    """
+    paths: List[str] = []
+    for input_path in inputs:
+        if input_path.startswith("@"):
+            with open(input_path[1:], "r") as file_list:
+                paths.extend(line.strip() for line in file_list if line.strip())
+        elif os.path.isdir(input_path):
+            for extension in extensions:
+                paths.extend(glob.glob(
+                    os.path.join(input_path, "**", "*" + extension),
+                    recursive=True
+                ))
+        elif os.path.isfile(input_path):
+            paths.append(input_path)
+        else:
+            paths.extend(
+                path for path in glob.glob(input_path, recursive=True)
+                if os.path.isfile(path)
+            )
+    return sorted(set(paths))
+
+
+def write_atomically(path: str, content: str):
+    """Writes the file via a temporary file in the same folder,
+    so that readers never see a partially written output"""
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=folder, prefix="." + os.path.basename(path) + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w") as file:
+            file.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _process_file(
+    task: Tuple[Literal["linearize", "delinearize"], str, str]
+) -> dict:
+    command, input_path, output_path = task
+    errout = io.StringIO()
+    record = {"input": input_path, "output": output_path, "tokens": 0}
+    try:
+        if command == "linearize":
+            output = linearize_path(input_path, errout)
+            record["tokens"] = len(output.split())
+        else:
+            with open(input_path, "r") as file:
+                input_lmx = file.read()
+            record["tokens"] = len(input_lmx.split())
+            output = delinearize_text(input_lmx, errout)
+        write_atomically(output_path, output + "\n")
+        record["status"] = "ok"
+    except Exception:
+        record["status"] = "failed"
+        record["exception"] = traceback.format_exc()
+    record["errors"] = errout.getvalue().splitlines()
+    return record
+
+
+def run_batch(
+    command: Literal["linearize", "delinearize"],
+    inputs: List[str],
+    output_dir: Optional[str] = None,
+    workers: int = 1,
+    errors_path: Optional[str] = None,
+    soft: bool = False
+):
+    """
+    Linearizes (or delinearizes) many files in a process pool.
+    Outputs are written next to the inputs, or into the output_dir
+    (preserving the paths relative to the common folder of all inputs).
+    Files with errors are reported as JSON lines into the errors_path
+    (or to stderr), throughput is reported at the end.
+    """
+    if command == "linearize":
+        extensions, output_extension = LINEARIZE_EXTENSIONS, ".lmx"
+    else:
+        extensions, output_extension = DELINEARIZE_EXTENSIONS, ".musicxml"
+
+    input_paths = collect_input_files(inputs, extensions)
+    if len(input_paths) == 0:
+        print("No input files found.", file=sys.stderr)
+        return
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in input_paths])
+
+    tasks = []
+    for input_path in input_paths:
+        output_path = os.path.splitext(input_path)[0] + output_extension
+        if output_dir is not None:
+            output_path = os.path.join(
+                output_dir,
+                os.path.relpath(os.path.abspath(output_path), root)
+            )
+        if soft and os.path.exists(output_path):
+            continue
+        tasks.append((command, input_path, output_path))
+
+    errors_file = open(errors_path, "w") if errors_path is not None else sys.stderr
+    start_time = time.time()
+    processed_files, failed_files, processed_tokens = 0, 0, 0
+    try:
+        with multiprocessing.Pool(workers) as pool:
+            for record in pool.imap_unordered(_process_file, tasks, chunksize=4):
+                processed_files += 1
+                processed_tokens += record["tokens"]
+                if record["status"] != "ok":
+                    failed_files += 1
+                if record["status"] != "ok" or len(record["errors"]) > 0:
+                    print(json.dumps(record), file=errors_file, flush=True)
+    finally:
+        if errors_path is not None:
+            errors_file.close()
+    seconds = max(time.time() - start_time, 1e-9)
+
+    print(
+        f"Processed {processed_files} files ({failed_files} failed, " +
+        f"{len(input_paths) - len(tasks)} skipped) in {seconds:.1f}s: " +
+        f"{processed_files / seconds:.1f} files/s, " +
+        f"{processed_tokens / seconds:.0f} tokens/s",
+        file=sys.stderr
+    )
@@ -0,0 +1,219 @@
+import numpy as np
+from typing import Dict, List, Iterable, Optional
+from .vocabulary import *
+from .Delinearizer import (
+    MEASURE_ITEM_ROOTS, MEASURE_ITEM_PREFIXES, MEASURE_ITEM_SUFFIXES
+)
+
+
+# The grammar of the Delinearizer, as a finite-state automaton over LMX tokens.
+# A measure is a sequence of items, each item is a root token with prefix
+# tokens before it and suffix tokens after it. Which prefixes and suffixes
+# a root accepts is given by the process_* methods of the Delinearizer,
+# anything else is reported there as a dangling or an unexpected valency.
+#
+# Note prefixes are tracked by the set of prefix kinds already seen, so each
+# kind is allowed at most once (in any order). Suffixes are not counted,
+# so repeated suffixes (e.g. two accidentals for a note) are not caught,
+# that would multiply the number of states too much. The automaton also
+# cannot check any semantics (durations, beams, slurs) which are not
+# a property of the token sequence.
+
+START = "start" # before the first 'measure' token
+MEASURE = "measure" # right after the 'measure' token
+FORWARD_BACKUP_PREFIX = "forward-backup-prefix" # 'forward' or 'backup' seen
+NOTE = "note" # after a note root, within its suffixes
+FORWARD_BACKUP = "forward-backup" # after a forward/backup root
+FORWARD_BACKUP_END = "forward-backup-end" # after its time modification
+KEY = "key" # after a key signature
+CLEF = "clef" # after a clef
+CLEF_END = "clef-end" # after the staff of a clef
+TIME = "time" # after the 'time' token
+TIME_BEATS = "time-beats" # 'time' with beats
+TIME_BEAT_TYPE = "time-beat-type" # 'time' with beat type
+TIME_END = "time-end" # 'time' with both beats and beat type
+
+# kinds of note prefixes, each allowed at most once
+# (in the order of extraction in Delinearizer.process_note)
+NOTE_PREFIX_KINDS = [
+    ["print-object:no"],
+    ["grace"],
+    ["grace:slash"],
+    ["chord"],
+    ["rest"],
+    PITCH_TOKENS,
+    VOICE_TOKENS
+]
+
+# prefixes of a note before its root, by the set of prefix kinds seen
+NOTE_PREFIXES = [
+    "note-prefixes:" + ",".join(
+        kind[0] if len(kind) == 1 else kind[0] + "..."
+        for k, kind in enumerate(NOTE_PREFIX_KINDS) if seen & (1 << k)
+    )
+    for seen in range(1 << len(NOTE_PREFIX_KINDS))
+]
+
+STATES = [
+    START, MEASURE,
+    *NOTE_PREFIXES[1:], FORWARD_BACKUP_PREFIX,
+    NOTE, FORWARD_BACKUP, FORWARD_BACKUP_END,
+    KEY, CLEF, CLEF_END,
+    TIME, TIME_BEATS, TIME_BEAT_TYPE, TIME_END
+]
+
+# states after which a new measure item (or the end) may follow
+ITEM_BOUNDARY_STATES = [
+    MEASURE,
+    NOTE, FORWARD_BACKUP, FORWARD_BACKUP_END,
+    KEY, CLEF, CLEF_END, TIME_END
+]
+
+FORWARD_BACKUP_TOKENS = ["forward", "backup"]
+
+# the automaton must cover exactly the tokens of the Delinearizer grammar
+assert set([
+    *FORWARD_BACKUP_TOKENS,
+    *[t for kind in NOTE_PREFIX_KINDS for t in kind]
+]) == MEASURE_ITEM_PREFIXES
+assert set([*NOTE_ROOT_TOKENS, "time", *KEY_TOKENS, *CLEF_TOKENS]) \
+    == MEASURE_ITEM_ROOTS
+assert set([*NOTE_SUFFIX_TOKENS, *BEATS_TOKENS, *BEAT_TYPE_TOKENS]) \
+    == MEASURE_ITEM_SUFFIXES
+
+
+class GrammarAutomaton:
+    """
+    Compiled deterministic automaton over the LMX vocabulary.
+    The transitions table has the shape (state, token id) and holds
+    the next state, or -1 when the token is not allowed in the state.
+    The end of the sequence is allowed only in the accepting states.
+    """
+    def __init__(
+        self,
+        state_names: List[str],
+        tokens: List[str],
+        transitions: np.ndarray,
+        accepting: np.ndarray,
+        initial_state: int = 0
+    ):
+        assert transitions.shape == (len(state_names), len(tokens))
+        assert accepting.shape == (len(state_names),)
+
+        self.state_names = list(state_names)
+        self.tokens = list(tokens)
+        self.token_ids: Dict[str, int] = {
+            token: i for i, token in enumerate(tokens)
+        }
+        self.transitions = transitions
+        self.accepting = accepting
+        self.initial_state = initial_state
+
+    @property
+    def allowed(self) -> np.ndarray:
+        """Boolean mask of the shape (state, token id)"""
+        return self.transitions >= 0
+
+    def step(self, state: int, token: str) -> int:
+        """Returns the next state, or -1 when the token is not allowed"""
+        token_id = self.token_ids.get(token)
+        if token_id is None:
+            return -1
+        return int(self.transitions[state, token_id])
+
+    def first_violation(self, tokens: Iterable[str]) -> Optional[int]:
+        """
+        Returns the index of the first token not allowed by the grammar,
+        the number of tokens if the sequence cannot end where it does,
+        or None if the whole sequence is accepted.
+        """
+        state = self.initial_state
+        count = 0
+        for i, token in enumerate(tokens):
+            state = self.step(state, token)
+            if state < 0:
+                return i
+            count += 1
+        if not self.accepting[state]:
+            return count
+        return None
+
+    def accepts(self, tokens: Iterable[str]) -> bool:
+        return self.first_violation(tokens) is None
+
+    def save(self, path: str):
+        """Exports the automaton as a .npz file"""
+        np.savez(
+            path,
+            state_names=np.array(self.state_names),
+            tokens=np.array(self.tokens),
+            transitions=self.transitions,
+            accepting=self.accepting,
+            initial_state=np.array(self.initial_state)
+        )
+
+    @staticmethod
+    def load(path: str) -> "GrammarAutomaton":
+        with np.load(path) as data:
+            return GrammarAutomaton(
+                state_names=[str(s) for s in data["state_names"]],
+                tokens=[str(t) for t in data["tokens"]],
+                transitions=data["transitions"],
+                accepting=data["accepting"],
+                initial_state=int(data["initial_state"])
+            )
+
+
+def compile_grammar() -> GrammarAutomaton:
+    """Builds the automaton of the Delinearizer grammar over the VOCABULARY"""
+    state_ids = {name: i for i, name in enumerate(STATES)}
+    transitions = np.full((len(STATES), len(VOCABULARY)), -1, dtype=np.int16)
+    accepting = np.zeros(len(STATES), dtype=bool)
+
+    def _add(state: str, tokens: List[str], next_state: str):
+        ids = [VOCABULARY.token_ids[token] for token in tokens]
+        assert np.all(transitions[state_ids[state], ids] < 0), \
+            "The automaton must be deterministic"
+        transitions[state_ids[state], ids] = state_ids[next_state]
+
+    _add(START, ["measure"], MEASURE)
+    accepting[state_ids[START]] = True
+
+    # a new measure item (root with its prefixes), a new measure, or the end
+    for state in ITEM_BOUNDARY_STATES:
+        _add(state, ["measure"], MEASURE)
+        for k, kind in enumerate(NOTE_PREFIX_KINDS):
+            _add(state, kind, NOTE_PREFIXES[1 << k])
+        _add(state, FORWARD_BACKUP_TOKENS, FORWARD_BACKUP_PREFIX)
+        _add(state, NOTE_ROOT_TOKENS, NOTE)
+        _add(state, KEY_TOKENS, KEY)
+        _add(state, CLEF_TOKENS, CLEF)
+        _add(state, ["time"], TIME)
+        accepting[state_ids[state]] = True
+
+    # notes (see Delinearizer.process_note)
+    for seen in range(1, len(NOTE_PREFIXES)):
+        for k, kind in enumerate(NOTE_PREFIX_KINDS):
+            if not seen & (1 << k):
+                _add(NOTE_PREFIXES[seen], kind, NOTE_PREFIXES[seen | (1 << k)])
+        _add(NOTE_PREFIXES[seen], NOTE_ROOT_TOKENS, NOTE)
+    _add(NOTE, NOTE_SUFFIX_TOKENS, NOTE)
+
+    # forward and backup (see Delinearizer.process_forward_backup)
+    _add(FORWARD_BACKUP_PREFIX, NOTE_TYPE_TOKENS, FORWARD_BACKUP)
+    _add(FORWARD_BACKUP, TIME_MODIFICATION_TOKENS, FORWARD_BACKUP_END)
+
+    # attributes (see Delinearizer.process_attributes)
+    _add(CLEF, STAFF_TOKENS, CLEF_END)
+    _add(TIME, BEATS_TOKENS, TIME_BEATS)
+    _add(TIME, BEAT_TYPE_TOKENS, TIME_BEAT_TYPE)
+    _add(TIME_BEATS, BEAT_TYPE_TOKENS, TIME_END)
+    _add(TIME_BEAT_TYPE, BEATS_TOKENS, TIME_END)
+
+    return GrammarAutomaton(
+        state_names=STATES,
+        tokens=VOCABULARY.tokens,
+        transitions=transitions,
+        accepting=accepting,
+        initial_state=state_ids[START]
+    )
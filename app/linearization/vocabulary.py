@@ -1,5 +1,6 @@
 from fractions import Fraction
-from typing import Dict
+from typing import Dict, List, Iterable
+from array import array
 
 
 KEY_TOKENS = [
@@ -189,6 +190,46 @@ ALL_TOKENS = [
     *NOTE_SUFFIX_TOKENS
 ]
 
+class Vocabulary:
+    """
+    Token vocabulary with fast membership tests and stable integer ids.
+    The id of a token is its position in the token list (the same order
+    as in the printed vocabulary.txt file), so new tokens must only be
+    appended to keep the ids of existing tokens.
+    """
+    def __init__(self, tokens: List[str]):
+        assert len(tokens) == len(set(tokens)), "Tokens must be unique"
+        assert len(tokens) <= 2 ** 16, "Token ids must fit into 16 bits"
+        
+        self.tokens: List[str] = list(tokens)
+        """Tokens by their id"""
+
+        self.token_set = frozenset(tokens)
+        """Set of all the tokens for membership tests"""
+
+        self.token_ids: Dict[str, int] = {
+            token: i for i, token in enumerate(tokens)
+        }
+        """Ids by their token"""
+    
+    def __len__(self) -> int:
+        return len(self.tokens)
+    
+    def __contains__(self, token: str) -> bool:
+        return token in self.token_set
+    
+    def encode(self, tokens: Iterable[str]) -> array:
+        """Converts tokens to an array of 16-bit ids"""
+        return array("H", (self.token_ids[token] for token in tokens))
+    
+    def decode(self, ids: Iterable[int]) -> List[str]:
+        """Converts ids back to tokens"""
+        return [self.tokens[i] for i in ids]
+
+
+VOCABULARY = Vocabulary(ALL_TOKENS)
+
+
 def print_vocabulary(file=None):
     print(
         "\n".join(ALL_TOKENS),
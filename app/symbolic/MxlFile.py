@@ -1,5 +1,17 @@
 import zipfile
+import contextlib
 import xml.etree.ElementTree as ET
+from typing import Iterator, IO, Optional
+
+
+PIANO_INSTRUMENT_NAMES = [
+    "Piano", "Grand Piano", "Acoustic Grand Piano",
+    "Harpsichord", "Pianoforte", "Piano (2)"
+]
+
+PIANO_PART_NAMES = [
+    "Pianoforte"
+]
 
 
 class MxlFile:
@@ -15,6 +27,15 @@ class MxlFile:
     @staticmethod
     def load_mxl(path: str) -> "MxlFile":
         """Loads MusicXML from the compressed MXL file"""
+        with MxlFile.open_mxl(path) as file:
+            tree = ET.parse(file)
+            return MxlFile(tree)
+    
+    @staticmethod
+    @contextlib.contextmanager
+    def open_mxl(path: str) -> Iterator[IO[bytes]]:
+        """Opens the MusicXML file inside the compressed MXL file
+        for reading, without parsing it"""
         with zipfile.ZipFile(path, "r") as archive:
             for record in archive.infolist():
                 if record.filename.startswith("META-INF"):
@@ -23,26 +44,30 @@ class MxlFile:
                     inner_file_name = record.filename
                     break
             with archive.open(inner_file_name) as file:
-                tree = ET.parse(file)
-                return MxlFile(tree)
+                yield file
     
     def resolve_piano_part_id(self) -> str:
         """Resolves the ID of the piano part, e.g. 'P2'"""
         part_list = self.tree.getroot().find("part-list")
+        part_id = MxlFile.find_piano_part_id(part_list)
+        if part_id is None:
+            raise Exception(
+                "No piano part found:\n" \
+                    + str(ET.tostring(part_list), "utf-8")
+            )
+        return part_id
+    
+    @staticmethod
+    def find_piano_part_id(part_list: ET.Element) -> Optional[str]:
+        """Finds the ID of the piano part in the <part-list> element,
+        returns None if there is no piano part"""
         for part in part_list.findall("score-part"):
-            if part.find("score-instrument/instrument-name").text in [
-                "Piano", "Grand Piano", "Acoustic Grand Piano",
-                "Harpsichord", "Pianoforte", "Piano (2)"
-            ]:
+            if part.findtext("score-instrument/instrument-name") \
+                    in PIANO_INSTRUMENT_NAMES:
                 return part.attrib["id"]
-            if part.find("part-name").text in [
-                "Pianoforte"
-            ]:
+            if part.findtext("part-name") in PIANO_PART_NAMES:
                 return part.attrib["id"]
-        raise Exception(
-            "No piano part found:\n" \
-                + str(ET.tostring(part_list), "utf-8")
-        )
+        return None
     
     def get_piano_part(self) -> ET.Element:
         """Returns the <part> element of the piano, containing measures."""
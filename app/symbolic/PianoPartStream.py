@@ -0,0 +1,167 @@
+import xml.etree.ElementTree as ET
+from typing import IO, Iterator, List, Optional, Callable
+from .MxlFile import MxlFile
+
+
+class PianoPartStream:
+    """
+    Streams the measures of the piano part of a partwise MusicXML file,
+    without loading the whole document into memory.
+
+    The file is parsed in chunks with a custom parser target. Only the
+    <part-list> and the measures of the piano part are built as elements,
+    other parts are skipped over. Each measure is handed out once it is
+    complete and is referenced only until the next one (to receive its
+    tail), so the memory stays flat regardless of the score length.
+    """
+
+    def __init__(
+        self,
+        file: IO[bytes],
+        fallback_to_first_part=False,
+        chunk_size: int = 64 * 1024
+    ):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._fallback_to_first_part = fallback_to_first_part
+        self._target = _PianoPartTarget(self._resolve_part_id)
+        self._parser = ET.XMLParser(target=self._target)
+        self._finished = False
+
+        self.part_id: Optional[str] = None
+        """ID of the streamed part, known once the constructor returns"""
+
+        # read up to the <part-list> to learn the piano part ID
+        while not self._target.part_list_done and not self._finished:
+            self._feed_chunk()
+        if not self._target.part_list_done:
+            raise Exception("The MusicXML file has no <part-list>")
+
+        if self.part_id is None:
+            raise Exception(
+                "No piano part found:\n" \
+                    + str(ET.tostring(self._target.part_list), "utf-8")
+            )
+
+    def _resolve_part_id(self, part_list: ET.Element) -> Optional[str]:
+        """Called by the parser target as soon as the <part-list> is parsed"""
+        self.part_id = MxlFile.find_piano_part_id(part_list)
+        if self.part_id is None and self._fallback_to_first_part:
+            first_score_part = part_list.find("score-part")
+            if first_score_part is not None:
+                self.part_id = first_score_part.attrib.get("id")
+        return self.part_id
+
+    def _feed_chunk(self):
+        chunk = self._file.read(self._chunk_size)
+        if len(chunk) == 0:
+            self._parser.close()
+            self._finished = True
+        else:
+            self._parser.feed(chunk)
+
+    def __iter__(self) -> Iterator[ET.Element]:
+        """Yields the <measure> elements of the part, in order"""
+        while True:
+            measures = self._target.completed_measures
+            self._target.completed_measures = []
+            yield from measures
+            if self._finished:
+                break
+            self._feed_chunk()
+
+        if self._target.parts_found == 0:
+            raise Exception(f"The part '{self.part_id}' was not found")
+        assert self._target.parts_found == 1, "There are multiple piano parts"
+
+    def load_part(self) -> ET.Element:
+        """Builds the whole <part> element (without the other parts),
+        the same as when parsing the whole document, including whitespace"""
+        part = ET.Element("part")
+        part.extend(self)
+        part.attrib.update(self._target.part_attrib)
+        part.text = self._target.part_text
+        part.tail = self._target.part_tail
+        return part
+
+
+class _PianoPartTarget:
+    """Parser target building only the <part-list> and the measures
+    of the selected part (resolved once the <part-list> is parsed)"""
+
+    def __init__(self, resolve_part_id: Callable[[ET.Element], Optional[str]]):
+        self._resolve_part_id = resolve_part_id
+        self.part_id: Optional[str] = None
+        self.part_list: Optional[ET.Element] = None
+        self.part_list_done = False
+        self.completed_measures: List[ET.Element] = []
+        self.parts_found = 0
+
+        # text of the selected part element (the whitespace between
+        # measures becomes the tails of the measures, as in a parsed tree)
+        self.part_attrib: dict = {}
+        self.part_text: Optional[str] = None
+        self.part_tail: Optional[str] = None
+
+        self._depth = 0 # depth of the current element (root has depth 1)
+        self._builder: Optional[ET.TreeBuilder] = None # subtree being built
+        self._builder_depth = 0 # depth of the root of the subtree being built
+        self._in_selected_part = False
+        self._after_selected_part = False
+        self._last_measure: Optional[ET.Element] = None
+
+    def start(self, tag: str, attrib: dict):
+        self._depth += 1
+        self._after_selected_part = False
+
+        if self._depth == 2:
+            if tag == "part-list":
+                self._builder = ET.TreeBuilder()
+                self._builder_depth = self._depth
+            elif tag == "part":
+                self._in_selected_part = attrib.get("id") == self.part_id
+                if self._in_selected_part:
+                    self.parts_found += 1
+                    self.part_attrib = dict(attrib)
+                return
+        elif self._depth == 3 and self._in_selected_part:
+            self._builder = ET.TreeBuilder()
+            self._builder_depth = self._depth
+
+        if self._builder is not None:
+            self._builder.start(tag, attrib)
+
+    def end(self, tag: str):
+        self._depth -= 1
+
+        if self._builder is None:
+            if self._depth == 1:
+                self._after_selected_part = self._in_selected_part
+                self._in_selected_part = False
+            return
+
+        self._builder.end(tag)
+        if self._depth < self._builder_depth:
+            element = self._builder.close()
+            self._builder = None
+            if element.tag == "part-list" and self._depth == 1:
+                self.part_list = element
+                self.part_list_done = True
+                self.part_id = self._resolve_part_id(element)
+            else:
+                self.completed_measures.append(element)
+                self._last_measure = element
+
+    def data(self, data: str):
+        if self._builder is not None:
+            self._builder.data(data)
+        elif self._in_selected_part and self._depth == 2:
+            if self._last_measure is None:
+                self.part_text = (self.part_text or "") + data
+            else:
+                self._last_measure.tail = (self._last_measure.tail or "") + data
+        elif self._after_selected_part:
+            self.part_tail = (self.part_tail or "") + data
+
+    def close(self):
+        pass
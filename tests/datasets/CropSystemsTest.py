@@ -0,0 +1,97 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+
+try:
+    import cv2
+    from app.datasets.crop_system_from_png_page import \
+        crop_systems_from_png_page, PageCropper
+except ImportError:
+    cv2 = None
+
+
+def _crop_system_per_page_decode(
+    page_png: str,
+    bbox: tuple,
+    out_system_png: str,
+    alpha_to_black_on_white: bool
+):
+    """The original cropping, decoding the page for every system"""
+    if alpha_to_black_on_white:
+        img = cv2.imread(page_png, cv2.IMREAD_UNCHANGED)
+        img = 255 - img[:, :, 3]
+    else:
+        img = cv2.imread(page_png, cv2.IMREAD_GRAYSCALE)
+    img_height, img_width = img.shape
+    x1, y1, x2, y2 = bbox
+    height = y2 - y1
+    x1 = int(max(x1 - 0.5 * height, 0))
+    x2 = int(min(x2 + 0.5 * height, img_width - 1))
+    y1 = int(max(y1 - 0.5 * height, 0))
+    y2 = int(min(y2 + 0.5 * height, img_height - 1))
+    cv2.imwrite(out_system_png, img[y1:y2,x1:x2])
+
+
+# systems touching the page edges and one in the middle
+BBOXES = [(20.5, 10.2, 380.7, 60.1), (40, 120, 300, 170.6), (0, 230, 399, 290)]
+
+
+@unittest.skipIf(cv2 is None, "OpenCV is not installed")
+class CropSystemsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_page(self, name: str, seed: int) -> str:
+        """Black on transparent RGBA page, like those exported by MuseScore"""
+        rng = np.random.default_rng(seed)
+        page = np.zeros((300, 400, 4), dtype=np.uint8)
+        page[:, :, 3] = rng.integers(0, 256, size=(300, 400))
+        page[:, :, 0] = rng.integers(0, 256, size=(300, 400))
+        path = os.path.join(self.folder, name)
+        cv2.imwrite(path, page)
+        return path
+
+    def assert_same_files(self, path: str, expected_path: str):
+        with open(path, "rb") as file, open(expected_path, "rb") as expected:
+            self.assertEqual(file.read(), expected.read())
+
+    def test_systems_match_the_per_system_crop(self):
+        page_png = self.write_page("page.png", seed=0)
+        for alpha in [True, False]:
+            out_pngs = [
+                os.path.join(self.folder, f"out-{alpha}", f"{i}.png")
+                for i in range(len(BBOXES))
+            ]
+            crop_systems_from_png_page(
+                page_png, BBOXES, out_pngs, alpha_to_black_on_white=alpha
+            )
+            for bbox, out_png in zip(BBOXES, out_pngs):
+                expected_png = out_png + ".expected.png"
+                _crop_system_per_page_decode(page_png, bbox, expected_png, alpha)
+                self.assert_same_files(out_png, expected_png)
+
+    def test_page_cropper_finishes_writes_on_close(self):
+        pages = [self.write_page(f"page-{p}.png", seed=p) for p in range(3)]
+        out_pngs = {
+            page_png: [f"{page_png}-systems/{i}.png" for i in range(len(BBOXES))]
+            for page_png in pages
+        }
+
+        cropper = PageCropper(threads=2)
+        for page_png in pages:
+            cropper.crop_page(
+                page_png, BBOXES, out_pngs[page_png], alpha_to_black_on_white=True
+            )
+        cropper.close()
+        self.assertEqual((cropper.pages, cropper.systems), (3, 9))
+
+        for page_png in pages:
+            for bbox, out_png in zip(BBOXES, out_pngs[page_png]):
+                expected_png = out_png + ".expected.png"
+                _crop_system_per_page_decode(page_png, bbox, expected_png, True)
+                self.assert_same_files(out_png, expected_png)
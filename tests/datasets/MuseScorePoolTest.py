@@ -0,0 +1,73 @@
+import unittest
+import os
+import sys
+import json
+import tempfile
+from app.datasets.musescore_pool import MuseScorePool
+from app.datasets.musescore_corpus_conversion import drop_failed_scores
+from app.datasets.config import LIEDER_CORPUS_PATH
+
+
+STUB_MUSESCORE = [
+    sys.executable,
+    os.path.join(os.path.dirname(__file__), "stub_musescore.py")
+]
+
+
+class MuseScorePoolTest(unittest.TestCase):
+    def test_failed_items_are_retried_alone(self):
+        with tempfile.TemporaryDirectory() as folder:
+            conversion = []
+            for name in ["crash", "a", "b", "c", "d", "broken", "e"]:
+                in_path = os.path.join(folder, name + ".mscx")
+                with open(in_path, "w") as file:
+                    file.write(name)
+                conversion.append({
+                    "in": in_path,
+                    "out": os.path.join(folder, name + ".mxl")
+                })
+
+            log_path = os.path.join(folder, "log.jsonl")
+            with MuseScorePool(
+                workers=2,
+                command=STUB_MUSESCORE,
+                xvfb=False,
+                batch_size=3,
+                log_path=log_path
+            ) as pool:
+                records = pool.convert(conversion)
+
+            self.assertEqual([r["in"] for r in records], [c["in"] for c in conversion])
+            statuses = {os.path.basename(r["out"]): r["status"] for r in records}
+            self.assertEqual(statuses["broken.mxl"], "failed")
+            self.assertTrue(all(
+                status == "ok" for name, status in statuses.items()
+                if name != "broken.mxl"
+            ))
+
+            # the crash stopped the rest of the first batch
+            attempts = {os.path.basename(r["out"]): r["attempts"] for r in records}
+            self.assertEqual(attempts["a.mxl"], 2)
+            self.assertEqual(attempts["crash.mxl"], 2)
+            self.assertEqual(attempts["d.mxl"], 1)
+            self.assertEqual(attempts["broken.mxl"], 2)
+
+            with open(os.path.join(folder, "c.mxl")) as file:
+                self.assertEqual(file.read(), "c")
+            with open(log_path) as file:
+                logged = [json.loads(line) for line in file]
+            self.assertEqual(len(logged), len(conversion))
+            self.assertTrue(all(
+                r["seconds"] >= 0 for r in logged if r["status"] == "ok"
+            ))
+
+    def test_failed_scores_are_dropped(self):
+        scores = {1: {"path": "A/one"}, 2: {"path": "B/two"}}
+        records = [
+            {"in": os.path.join(LIEDER_CORPUS_PATH, "scores", "A/one", "lc1.mscx"),
+                "status": "ok"},
+            {"in": os.path.join(LIEDER_CORPUS_PATH, "scores", "B/two", "lc2.mscx"),
+                "status": "failed"}
+        ]
+        self.assertEqual(drop_failed_scores(scores, records), {1: scores[1]})
+        self.assertEqual(drop_failed_scores(scores, records[:1]), scores)
@@ -0,0 +1,105 @@
+import unittest
+import os
+import re
+import io
+import json
+import tempfile
+import contextlib
+from app.datasets.svg_page_geometry import path_bbox, parse_transform, scan_svg_page
+from app.datasets.find_systems_in_svg_page import find_systems_in_svg_page, \
+    find_systems_in_svg_page_svgelements, \
+    PIANO_BRACKET_SIGNATURES, NON_PIANO_BRACKET_SIGNATURES, \
+    _svg_path_to_signature, _svg_path_to_structure
+from .synthetic_svg_pages import synthetic_svg_page
+
+try:
+    import svgelements
+except ImportError:
+    svgelements = None
+
+
+def _piano_bracket(x: float, top: float, bottom: float) -> str:
+    """Path data with the signature of a MuseScore piano bracket,
+    starting at the top and going to the bottom"""
+    coordinates = iter([f"{x},{top}"] + [f"{x},{bottom}"] * 1000)
+    return re.sub("_,_", lambda _: next(coordinates), PIANO_BRACKET_SIGNATURES[0])
+
+
+def _staff_lines(left: float, right: float, top: float):
+    return "\n".join(
+        f'<polyline class="StaffLines" fill="none" stroke="#000000" ' +
+        f'stroke-width="2" points="{left},{top + 10 * k} {right},{top + 10 * k}"/>'
+        for k in range(5)
+    )
+
+
+class SvgPageGeometryTest(unittest.TestCase):
+    def test_path_bbox(self):
+        # the tight bounds of the curve, not of its control points
+        self.assertEqual(path_bbox("M0,0 C0,10 10,10 10,0"), (0, 0, 10, 7.5))
+        self.assertEqual(path_bbox("m1,1 h4 v2 l-1,1 z"), (1, 1, 5, 4))
+        self.assertEqual(
+            path_bbox("M0,0 L10,10", parse_transform("translate(5) scale(2, 3)")),
+            (5, 0, 25, 30)
+        )
+
+    def test_structures_match_signatures(self):
+        signatures = PIANO_BRACKET_SIGNATURES + NON_PIANO_BRACKET_SIGNATURES
+        structures = [_svg_path_to_structure(s) for s in signatures]
+        self.assertEqual(len(set(structures)), len(set(signatures)))
+
+        d = _piano_bracket(12.5, -3, 140.25)
+        self.assertEqual(_svg_path_to_signature(d), PIANO_BRACKET_SIGNATURES[0])
+        self.assertEqual(_svg_path_to_structure(d), structures[0])
+
+    def test_find_systems(self):
+        svg = f"""<?xml version="1.0" encoding="UTF-8"?>
+<svg width="500px" height="800px" viewBox="0 0 1000 1600"
+    xmlns="http://www.w3.org/2000/svg" version="1.2">
+<title>lc1-1</title>
+<g transform="translate(0, 100)">
+{_staff_lines(100, 900, 100)}
+{_staff_lines(100, 900, 200)}
+<path class="Bracket" transform="matrix(1,0,0,1,0,0)" fill="#000000"
+    d="{_piano_bracket(80, 100, 240)}"/>
+</g>
+{_staff_lines(100, 900, 700)}
+{_staff_lines(100, 900, 800)}
+<path class="Bracket" fill="#000000" d="{_piano_bracket(80, 700, 840)}"/>
+<polyline class="Bracket" stroke="#000000" points="10,1000 10,1200"/>
+<path class="Note" d="M0,0 A10,10 0 0 0 20,20"/>
+</svg>"""
+        with tempfile.TemporaryDirectory() as folder:
+            svg_path = os.path.join(folder, "lc1-1.svg")
+            with open(svg_path, "w") as file:
+                file.write(svg)
+
+            page = scan_svg_page(svg_path, ["Bracket"])
+            self.assertEqual((page.width, page.height), (500, 800))
+            self.assertEqual(len(page.elements), 3)
+
+            geometry = find_systems_in_svg_page(svg_path)
+
+        self.assertEqual(geometry, {
+            "page_width": 500,
+            "page_height": 800,
+            "systems": [
+                {"left": 50, "top": 100, "right": 450, "bottom": 170},
+                {"left": 50, "top": 350, "right": 450, "bottom": 420}
+            ]
+        })
+
+    @unittest.skipIf(svgelements is None, "svgelements is not installed")
+    def test_find_systems_matches_svgelements(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for seed in range(20):
+                svg_path = os.path.join(folder, f"lc{seed}-1.svg")
+                with open(svg_path, "w") as file:
+                    file.write(synthetic_svg_page(seed, symbols_per_system=20))
+
+                with contextlib.redirect_stdout(io.StringIO()):
+                    geometry = find_systems_in_svg_page(svg_path)
+                    reference = find_systems_in_svg_page_svgelements(svg_path)
+
+                # the geometry.json files are byte-identical
+                self.assertEqual(json.dumps(geometry), json.dumps(reference))
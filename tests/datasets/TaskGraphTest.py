@@ -0,0 +1,105 @@
+import unittest
+import os
+import tempfile
+from app.datasets.task_graph import Task, run_task_graph
+
+
+def _log_task(folder: str, name: str):
+    if os.path.exists(os.path.join(folder, "fail-" + name)):
+        raise Exception("Failing " + name)
+    with open(os.path.join(folder, "log.txt"), "a") as file:
+        file.write(name + "\n")
+
+
+def _copy_task(folder: str, source: str, target: str):
+    _log_task(folder, target)
+    with open(os.path.join(folder, source)) as file:
+        content = file.read()
+    with open(os.path.join(folder, target), "w") as file:
+        file.write(content)
+
+
+class TaskGraphTest(unittest.TestCase):
+    def _tasks(self, folder: str):
+        def _task(name, dependencies):
+            return Task(
+                name=name,
+                function=_log_task,
+                args=(folder, name),
+                dependencies=dependencies,
+                marker_path=os.path.join(folder, "markers", name + ".done")
+            )
+        return [
+            _task("a", []),
+            _task("b", ["a"]),
+            _task("c", ["b"]),
+            _task("d", []),
+        ]
+
+    def _read_log(self, folder: str):
+        with open(os.path.join(folder, "log.txt")) as file:
+            lines = file.read().split()
+        os.remove(os.path.join(folder, "log.txt"))
+        return sorted(lines)
+
+    def test_resumes_after_failure(self):
+        with tempfile.TemporaryDirectory() as folder:
+            open(os.path.join(folder, "fail-b"), "w").close()
+            result = run_task_graph(self._tasks(folder), workers=2)
+            self.assertEqual(result["failed"], ["b"])
+            self.assertEqual(result["blocked"], ["c"])
+            self.assertEqual(self._read_log(folder), ["a", "d"])
+
+            os.remove(os.path.join(folder, "fail-b"))
+            result = run_task_graph(self._tasks(folder), workers=2)
+            self.assertEqual(sorted(result["skipped"]), ["a", "d"])
+            self.assertEqual(self._read_log(folder), ["b", "c"])
+
+            # a rerun upstream task invalidates its dependents
+            os.remove(os.path.join(folder, "markers", "a.done"))
+            run_task_graph(self._tasks(folder), workers=2)
+            self.assertEqual(self._read_log(folder), ["a", "b", "c"])
+
+            run_task_graph(self._tasks(folder), workers=2, resume=False)
+            self.assertEqual(self._read_log(folder), ["a", "b", "c", "d"])
+
+    def test_content_addressed_tasks(self):
+        def _tasks(folder, version):
+            def _task(source, target, dependencies, version=""):
+                return Task(
+                    name=target,
+                    function=_copy_task,
+                    args=(folder, source, target),
+                    dependencies=dependencies,
+                    marker_path=os.path.join(folder, "markers", target + ".done"),
+                    inputs=[os.path.join(folder, source)],
+                    outputs=[os.path.join(folder, target)],
+                    version=version
+                )
+            return [
+                _task("input.txt", "a.txt", []),
+                _task("a.txt", "b.txt", ["a.txt"], version),
+                _task("input.txt", "c.txt", [])
+            ]
+
+        with tempfile.TemporaryDirectory() as folder:
+            with open(os.path.join(folder, "input.txt"), "w") as file:
+                file.write("1")
+            run_task_graph(_tasks(folder, "v1"), workers=2)
+            self.assertEqual(self._read_log(folder), ["a.txt", "b.txt", "c.txt"])
+
+            result = run_task_graph(_tasks(folder, "v1"), workers=2)
+            self.assertEqual(len(result["unchanged"]), 3)
+
+            # a new version of a stage reruns only the stage
+            result = run_task_graph(_tasks(folder, "v2"), workers=2)
+            self.assertEqual(self._read_log(folder), ["b.txt"])
+
+            # changed inputs and missing outputs are detected
+            with open(os.path.join(folder, "input.txt"), "w") as file:
+                file.write("2")
+            os.remove(os.path.join(folder, "b.txt"))
+            run_task_graph(_tasks(folder, "v2"), workers=2)
+            self.assertEqual(self._read_log(folder), ["a.txt", "b.txt", "c.txt"])
+            with open(os.path.join(folder, "b.txt")) as file:
+                self.assertEqual(file.read(), "2")
@@ -0,0 +1,57 @@
+import argparse
+from .benchmark_find_systems import benchmark_find_systems
+
+
+##########
+# Parser #
+##########
+
+parser = argparse.ArgumentParser()
+
+subparsers = parser.add_subparsers(
+    title="available commands",
+    dest="command_name"
+)
+
+benchmark_find_systems_parser = subparsers.add_parser(
+    "benchmark-find-systems",
+    aliases=[],
+    help="Compares the streaming SVG system detector with the svgelements " + \
+        "one on the OpenScore Lieder corpus (speed and identical output)"
+)
+benchmark_find_systems_parser.add_argument(
+    "--repeat",
+    type=int,
+    default=3,
+    help="Number of repetitions, the fastest one is reported"
+)
+benchmark_find_systems_parser.add_argument(
+    "--limit",
+    type=int,
+    default=None,
+    help="Use only the first N pages"
+)
+benchmark_find_systems_parser.add_argument(
+    "--synthetic",
+    type=int,
+    default=None,
+    help="Use N synthetic pages instead of the corpus"
+)
+
+
+########
+# Main #
+########
+
+args = parser.parse_args()
+
+if args.command_name == "benchmark-find-systems":
+    benchmark_find_systems(
+        repeat=args.repeat,
+        limit=args.limit,
+        synthetic=args.synthetic
+    )
+
+else:
+    parser.print_help()
+    exit(2)
@@ -0,0 +1,99 @@
+import glob
+import io
+import os
+import json
+import time
+import tempfile
+import contextlib
+from typing import Callable, List, Optional
+from app.datasets.find_systems_in_svg_page import (
+    find_systems_in_svg_page, find_systems_in_svg_page_svgelements
+)
+from .synthetic_svg_pages import synthetic_svg_page
+
+
+def _geometry_json(geometry: dict) -> str:
+    # the same serialization as in prepare_corpus_page_geometries
+    return json.dumps(geometry, indent=2)
+
+
+def _run(detector: Callable, paths: List[str], repeat: int):
+    """Returns the outputs of the detector and the best time of all repetitions"""
+    best_seconds = None
+    outputs = []
+    for i in range(repeat):
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            outputs = [_geometry_json(detector(path)) for path in paths]
+        seconds = time.perf_counter() - start_time
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+    return outputs, best_seconds
+
+
+def benchmark_find_systems(
+    repeat: int,
+    limit: Optional[int] = None,
+    synthetic: Optional[int] = None
+):
+    """
+    Measures the pages per second of find_systems_in_svg_page and of the
+    original svgelements implementation over the SVG pages of the OpenScore
+    Lieder corpus, and checks that they produce byte-identical geometry.json
+    files (and that they match the geometry.json files in the corpus).
+    With synthetic, that many synthetic pages are used instead of the corpus.
+    """
+    if synthetic is not None:
+        with tempfile.TemporaryDirectory() as folder:
+            paths = []
+            for seed in range(synthetic):
+                paths.append(os.path.join(folder, f"lc{seed}-1.svg"))
+                with open(paths[-1], "w") as file:
+                    file.write(synthetic_svg_page(seed))
+            _benchmark(paths, repeat)
+        return
+
+    paths = sorted(glob.glob(
+        "datasets/OpenScore-Lieder/scores/**/lc*-*.svg",
+        recursive=True
+    ))
+    if limit is not None:
+        paths = paths[:limit]
+    _benchmark(paths, repeat)
+
+
+def _benchmark(paths: List[str], repeat: int):
+    print("Loaded", len(paths), "SVG pages")
+    if len(paths) == 0:
+        return
+
+    outputs, seconds = _run(find_systems_in_svg_page, paths, repeat)
+    print("Streaming detector pages per second:", round(len(paths) / seconds, 1))
+
+    mismatches = 0
+    for path, output in zip(paths, outputs):
+        geometry_path = path[:-len(".svg")] + ".geometry.json"
+        if os.path.isfile(geometry_path):
+            with open(geometry_path) as file:
+                if file.read() != output:
+                    mismatches += 1
+                    print("Differs from the corpus:", geometry_path)
+    print("Mismatches against the corpus geometry.json files:", mismatches)
+
+    try:
+        import svgelements
+    except ImportError:
+        print("The svgelements package is missing, skipping the reference.")
+        return
+
+    reference_outputs, reference_seconds = _run(
+        find_systems_in_svg_page_svgelements, paths, repeat
+    )
+    print("Svgelements detector pages per second:", round(len(paths) / reference_seconds, 1))
+    print("Speedup:", round(reference_seconds / seconds, 1))
+
+    mismatches = 0
+    for path, output, reference in zip(paths, outputs, reference_outputs):
+        if output != reference:
+            mismatches += 1
+            print("Differs from svgelements:", path)
+    print("Mismatches against svgelements:", mismatches)
@@ -0,0 +1,107 @@
+import re
+import random
+from app.datasets.find_systems_in_svg_page import \
+    PIANO_BRACKET_SIGNATURES, NON_PIANO_BRACKET_SIGNATURES
+
+
+# Synthetic pages resembling the SVG export of MuseScore 3: staff lines
+# as polylines, brackets and notation symbols as paths with matrix
+# transforms, the page scaled by its viewBox. Used to test and benchmark
+# the system detectors without the corpus.
+
+
+def _number(rng: random.Random, low: float, high: float) -> str:
+    return f"{rng.uniform(low, high):.3f}".rstrip("0").rstrip(".")
+
+
+def path_from_signature(
+    signature: str,
+    rng: random.Random,
+    x: float,
+    top: float,
+    bottom: float
+) -> str:
+    """Path data with the given signature, spanning from top to bottom"""
+    def _point(i: int) -> str:
+        if i == 0:
+            y = top
+        elif i == 1:
+            y = bottom
+        else:
+            y = rng.uniform(top, bottom)
+        return f"{_number(rng, x, x + 12)},{y:.3f}"
+    counter = iter(range(10 ** 6))
+    return re.sub("_,_", lambda _: _point(next(counter)), signature)
+
+
+def _staff_lines(rng: random.Random, left: float, right: float, top: float):
+    return "\n".join(
+        f'<polyline class="StaffLines" fill="none" stroke="#000000" ' +
+        f'stroke-width="2.73" stroke-linejoin="bevel" ' +
+        f'points="{left:.3f},{top + 24.8 * k:.3f} {right:.3f},{top + 24.8 * k:.3f}"/>'
+        for k in range(5)
+    )
+
+
+def _symbol(rng: random.Random, css_class: str, x: float, y: float) -> str:
+    segments = " ".join(
+        "C" + " ".join(
+            f"{_number(rng, -12, 12)},{_number(rng, -12, 12)}" for _ in range(3)
+        )
+        for _ in range(rng.randint(4, 24))
+    )
+    return (
+        f'<path class="{css_class}" transform="matrix(0.992126,0,0,0.992126,' +
+        f'{x:.3f},{y:.3f})" d="M{_number(rng, -12, 12)},{_number(rng, -12, 12)} ' +
+        f'{segments} Z"/>'
+    )
+
+
+def synthetic_svg_page(seed: int, symbols_per_system: int = 400) -> str:
+    """Returns the SVG code of a page with one to six piano systems,
+    some pages also contain an ensemble bracket of other staves"""
+    rng = random.Random(seed)
+    width, height = 2977.0, 4208.0
+    systems = rng.randint(1, 6)
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8" standalone="no"?>',
+        f'<svg width="{width / 3.75:.2f}mm" height="{height / 3.75:.2f}mm" ' +
+            f'viewBox="0 0 {width:.0f} {height:.0f}" ' +
+            'xmlns="http://www.w3.org/2000/svg" ' +
+            'xmlns:xlink="http://www.w3.org/1999/xlink" version="1.2" baseProfile="tiny">',
+        f'<title>lc{seed}-1</title>',
+        '<desc>Generated by MuseScore 3.6.2</desc>'
+    ]
+    system_height = (height - 400) / systems
+    for s in range(systems):
+        top = 300 + s * system_height + rng.uniform(0, system_height * 0.3)
+        left, right = rng.uniform(150, 300), rng.uniform(2700, 2830)
+        lower_top = top + rng.uniform(200, 300)
+        bottom = lower_top + 4 * 24.8
+        lines.append(_staff_lines(rng, left, right, top))
+        lines.append(_staff_lines(rng, left, right, lower_top))
+        lines.append(
+            '<path class="Bracket" transform="matrix(0.992126,0,0,0.992126,0,0)" ' +
+            'fill="#000000" fill-rule="evenodd" d="' +
+            path_from_signature(
+                rng.choice(PIANO_BRACKET_SIGNATURES), rng, left - 40, top, bottom
+            ) + '"/>'
+        )
+        for _ in range(symbols_per_system):
+            lines.append(_symbol(
+                rng, rng.choice(["Note", "Accidental", "Rest", "Clef", "Beam"]),
+                rng.uniform(left, right), rng.uniform(top - 80, bottom + 80)
+            ))
+    if rng.random() < 0.3:
+        # an ensemble bracket (body and ends) of another staff group
+        lines.append(
+            '<polyline class="Bracket" fill="none" stroke="#000000" ' +
+            'stroke-width="9.5" points="40,100 40,260"/>'
+        )
+        for signature in NON_PIANO_BRACKET_SIGNATURES[1:3]:
+            lines.append(
+                '<path class="Bracket" fill="#000000" d="' +
+                path_from_signature(signature, rng, 36, 90, 110) + '"/>'
+            )
+    lines.append("</svg>")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,78 @@
+import unittest
+import os
+import tempfile
+from app.evaluation.TEDn import TEDnResult
+from app.evaluation.TEDn_cache import TEDnCache
+from app.evaluation.TEDn_lmx_xml import TEDn_lmx_xml
+from app.linearization.Linearizer import Linearizer
+import xml.etree.ElementTree as ET
+
+
+class TEDnCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "cache.sqlite")
+    
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_results_persist(self):
+        key = TEDnCache.make_key("clef:G2", "<score-partwise/>", "lmx")
+        with TEDnCache(self.path) as cache:
+            self.assertIsNone(cache.get(key))
+            cache.put(key, TEDnResult(gold_cost=10, edit_cost=3, evaluation_time_seconds=1.0))
+        
+        with TEDnCache(self.path) as cache:
+            result = cache.get(key)
+            self.assertEqual(result.gold_cost, 10)
+            self.assertEqual(result.edit_cost, 3)
+            self.assertTrue(result.is_exact)
+            self.assertEqual(cache.hits, 1)
+
+    def test_key_depends_on_options(self):
+        self.assertNotEqual(
+            TEDnCache.make_key("clef:G2", "<score-partwise/>", "lmx"),
+            TEDnCache.make_key("clef:G2", "<score-partwise/>", "full")
+        )
+        self.assertNotEqual(
+            TEDnCache.make_key("clef:G2", "<score-partwise/>", "lmx", decomposed=True),
+            TEDnCache.make_key("clef:G2", "<score-partwise/>", "lmx", decomposed=False)
+        )
+
+    def test_least_recently_used_entries_are_evicted(self):
+        keys = [TEDnCache.make_key(str(i), "", "lmx") for i in range(4)]
+        with TEDnCache(self.path, max_entries=3) as cache:
+            for i, key in enumerate(keys[:3]):
+                cache.put(key, TEDnResult(gold_cost=10, edit_cost=i, evaluation_time_seconds=0))
+            cache.get(keys[0]) # keep the first one fresh
+            cache.put(keys[3], TEDnResult(gold_cost=10, edit_cost=3, evaluation_time_seconds=0))
+            
+            self.assertIsNotNone(cache.get(keys[0]))
+            self.assertIsNone(cache.get(keys[1]))
+            self.assertIsNotNone(cache.get(keys[2]))
+            self.assertIsNotNone(cache.get(keys[3]))
+
+    def test_cached_bound_only_call_computes_only_the_bounds(self):
+        sample_path = os.path.join(
+            os.path.dirname(__file__),
+            "../linearization/samples/basics/grandstaff.xml"
+        )
+        linearizer = Linearizer()
+        linearizer.process_part(ET.parse(sample_path).find("part"))
+        gold_lmx = " ".join(linearizer.output_tokens)
+        predicted_lmx = gold_lmx.split(" measure ")[0] # only the first measure
+        with open(sample_path, "r") as file:
+            gold_musicxml = file.read()
+
+        with TEDnCache(self.path) as cache:
+            for _ in range(2): # computed, then taken from the cache
+                bounded = TEDn_lmx_xml(
+                    predicted_lmx, gold_musicxml, "lmx",
+                    cache=cache, bound_only=True
+                )
+                self.assertFalse(bounded.is_exact)
+            self.assertEqual(cache.hits, 1)
+
+            exact = TEDn_lmx_xml(predicted_lmx, gold_musicxml, "lmx", cache=cache)
+            self.assertTrue(exact.is_exact)
+            self.assertLessEqual(bounded.edit_cost_lower_bound, exact.edit_cost)
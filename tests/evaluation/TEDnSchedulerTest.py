@@ -0,0 +1,53 @@
+import unittest
+import glob
+import os
+import multiprocessing
+from app.evaluation.TEDn_lmx_xml import TEDn_lmx_xml
+from app.evaluation.TEDn_scheduler import TEDnScheduler
+
+
+class TEDnSchedulerTest(unittest.TestCase):
+    def load_tasks(self):
+        samples_dir = os.path.join(
+            os.path.dirname(__file__), "../linearization/samples"
+        )
+        tasks = []
+        paths = sorted(glob.glob(os.path.join(samples_dir, "**/*.xml")))
+        for index, path in enumerate(paths):
+            with open(path, "r") as file:
+                gold_musicxml = file.read()
+            with open(path[:-len(".xml")] + ".lmx", "r") as file:
+                predicted_lmx = " ".join(file.read().split()[:30])
+            tasks.append((index, predicted_lmx, gold_musicxml))
+        return tasks
+
+    def test_results_match_serial_evaluation(self):
+        tasks = self.load_tasks()
+        scheduler = TEDnScheduler(
+            workers=2, flavor="lmx", engine="fast",
+            context=multiprocessing.get_context("spawn")
+        )
+        results = {
+            index: (result, status)
+            for index, result, status in scheduler.run(tasks)
+        }
+        self.assertEqual(set(results.keys()), set(t[0] for t in tasks))
+        for index, predicted_lmx, gold_musicxml in tasks:
+            expected = TEDn_lmx_xml(predicted_lmx, gold_musicxml, "lmx")
+            result, status = results[index]
+            self.assertEqual(status, TEDnScheduler.EXACT)
+            self.assertEqual(result.edit_cost, expected.edit_cost)
+            self.assertEqual(result.gold_cost, expected.gold_cost)
+
+    def test_timeout_falls_back_to_bounds(self):
+        tasks = self.load_tasks()
+        scheduler = TEDnScheduler(
+            workers=2, flavor="lmx", engine="fast", timeout=0
+        )
+        for index, result, status in scheduler.run(tasks):
+            _, predicted_lmx, gold_musicxml = tasks[index]
+            expected = TEDn_lmx_xml(predicted_lmx, gold_musicxml, "lmx")
+            # (exact results that arrive in time are still taken)
+            self.assertIn(status, [TEDnScheduler.TIMEOUT, TEDnScheduler.EXACT])
+            self.assertLessEqual(result.edit_cost_lower_bound, expected.edit_cost)
+            self.assertGreaterEqual(result.edit_cost_upper_bound, expected.edit_cost)
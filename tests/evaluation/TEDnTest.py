@@ -0,0 +1,124 @@
+import unittest
+import copy
+import glob
+import os
+import random
+import pickle
+import xml.etree.ElementTree as ET
+from app.evaluation.TEDn import TEDn, Xml4ZSS_Levenshtein, \
+    NoteContentCoder, encode_notes
+from app.evaluation.TEDn_decomposed import TEDn_decomposed
+from app.evaluation.TEDn_lmx_xml import TEDn_lmx_xml, prepare_gold
+
+
+class TEDnTest(unittest.TestCase):
+    def load_sample_parts(self):
+        samples_dir = os.path.join(
+            os.path.dirname(__file__), "../linearization/samples"
+        )
+        for path in sorted(glob.glob(os.path.join(samples_dir, "**/*.xml"))):
+            yield ET.parse(path).find("part")
+
+    def corrupt_part(self, part: ET.Element, seed: int) -> ET.Element:
+        rng = random.Random(seed)
+        part = copy.deepcopy(part)
+        for element in list(part.iter()):
+            children = list(element)
+            if len(children) > 0 and rng.random() < 0.2:
+                element.remove(rng.choice(children))
+            elif element.tag == "step" and rng.random() < 0.3:
+                element.text = rng.choice("ABCDEFG")
+        return part
+
+    def assert_engines_agree(self, predicted: ET.Element, gold: ET.Element):
+        zss_result = TEDn(predicted, gold, engine="zss")
+        fast_result = TEDn(predicted, gold, engine="fast")
+        self.assertEqual(zss_result.edit_cost, fast_result.edit_cost)
+        self.assertEqual(zss_result.gold_cost, fast_result.gold_cost)
+
+    def test_fast_engine_matches_zss(self):
+        for i, gold in enumerate(self.load_sample_parts()):
+            self.assert_engines_agree(self.corrupt_part(gold, seed=i), gold)
+
+    def test_fast_engine_matches_zss_for_empty_prediction(self):
+        for gold in self.load_sample_parts():
+            self.assert_engines_agree(ET.Element("part"), gold)
+
+    def test_fast_engine_on_identical_trees(self):
+        for gold in self.load_sample_parts():
+            result = TEDn(copy.deepcopy(gold), gold, engine="fast")
+            self.assertEqual(result.edit_cost, 0)
+
+    def test_update_cost_matrix_matches_update(self):
+        coder = NoteContentCoder()
+        for i, gold in enumerate(self.load_sample_parts()):
+            predicted = self.corrupt_part(gold, seed=i)
+            a_nodes = list(encode_notes(predicted, coder).iter())
+            b_nodes = list(encode_notes(copy.deepcopy(gold), coder).iter())
+            costs = Xml4ZSS_Levenshtein.update_costs(a_nodes, b_nodes)
+            for x, e in enumerate(a_nodes):
+                for y, f in enumerate(b_nodes):
+                    self.assertEqual(costs[x, y], Xml4ZSS_Levenshtein.update(e, f))
+
+    def test_bounds_contain_the_exact_cost(self):
+        for i, gold in enumerate(self.load_sample_parts()):
+            predicted = self.corrupt_part(gold, seed=i)
+            exact = TEDn(predicted, gold, engine="fast")
+            bounded = TEDn(predicted, gold, bound_only=True)
+            self.assertLessEqual(bounded.edit_cost_lower_bound, exact.edit_cost)
+            self.assertGreaterEqual(bounded.edit_cost_upper_bound, exact.edit_cost)
+            self.assertEqual(bounded.gold_cost, exact.gold_cost)
+            if bounded.is_exact:
+                self.assertEqual(bounded.edit_cost, exact.edit_cost)
+
+    def test_max_cost(self):
+        for i, gold in enumerate(self.load_sample_parts()):
+            predicted = self.corrupt_part(gold, seed=i)
+            exact = TEDn(predicted, gold, engine="fast")
+            for max_cost in [0, exact.edit_cost - 1, exact.edit_cost]:
+                result = TEDn(predicted, gold, engine="fast", max_cost=max_cost)
+                if max_cost >= exact.edit_cost:
+                    self.assertTrue(result.is_exact)
+                    self.assertEqual(result.edit_cost, exact.edit_cost)
+                else:
+                    self.assertGreater(result.edit_cost_lower_bound, max_cost)
+                    self.assertGreaterEqual(result.edit_cost_upper_bound, exact.edit_cost)
+
+    def test_decomposed_is_an_upper_bound(self):
+        for i, gold in enumerate(self.load_sample_parts()):
+            predicted = self.corrupt_part(gold, seed=i)
+            exact = TEDn(predicted, gold, engine="fast")
+            decomposed = TEDn_decomposed(predicted, gold, exact_max_nodes=None)
+            self.assertFalse(decomposed.is_exact)
+            self.assertEqual(decomposed.gold_cost, exact.gold_cost)
+            self.assertGreaterEqual(decomposed.edit_cost, exact.edit_cost)
+            self.assertLessEqual(decomposed.edit_cost_lower_bound, exact.edit_cost)
+
+    def test_decomposed_handles_missing_measures(self):
+        for gold in self.load_sample_parts():
+            predicted = copy.deepcopy(gold)
+            measures = list(predicted)
+            if len(measures) < 2:
+                continue
+            predicted.remove(measures[0])
+            exact = TEDn(predicted, gold, engine="fast")
+            decomposed = TEDn_decomposed(predicted, gold, exact_max_nodes=None)
+            self.assertEqual(decomposed.edit_cost, exact.edit_cost)
+
+    def test_prepared_gold_gives_the_same_result(self):
+        samples_dir = os.path.join(
+            os.path.dirname(__file__), "../linearization/samples"
+        )
+        for path in sorted(glob.glob(os.path.join(samples_dir, "**/*.xml"))):
+            with open(path, "r") as file:
+                gold_musicxml = file.read()
+            with open(path[:-len(".xml")] + ".lmx", "r") as file:
+                predicted_lmx = " ".join(file.read().split()[:40])
+            for flavor in ["full", "lmx"]:
+                prepared = pickle.loads(pickle.dumps(
+                    prepare_gold(gold_musicxml, flavor)
+                ))
+                raw = TEDn_lmx_xml(predicted_lmx, gold_musicxml, flavor)
+                result = TEDn_lmx_xml(predicted_lmx, prepared, flavor)
+                self.assertEqual(result.gold_cost, raw.gold_cost)
+                self.assertEqual(result.edit_cost, raw.edit_cost)
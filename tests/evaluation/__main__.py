@@ -2,6 +2,7 @@ import argparse
 import os
 from .scan_corpus import scan_corpus
 from .scan_testset import scan_testset
+from .compare_decomposed import compare_decomposed
 
 
 ##########
@@ -39,6 +40,24 @@ scan_testset_parser.add_argument(
     help="TEDn flavor to use, one of: 'full', 'lmx'"
 )
 
+compare_decomposed_parser = subparsers.add_parser(
+    "compare-decomposed",
+    aliases=[],
+    help="Compares the measure-decomposed TEDn to the exact TEDn on the scanned testset"
+)
+compare_decomposed_parser.add_argument(
+    "--tedn_flavor",
+    required=True,
+    type=str,
+    help="TEDn flavor to use, one of: 'full', 'lmx'"
+)
+compare_decomposed_parser.add_argument(
+    "--predictions",
+    default=None,
+    type=str,
+    help="File with predicted LMX, one per line, in the testset order (default: gold LMX)"
+)
+
 
 ########
 # Main #
@@ -55,6 +74,8 @@ elif args.command_name == "scan-corpus":
     scan_corpus()
 elif args.command_name == "scan-testset":
     scan_testset(args.tedn_flavor)
+elif args.command_name == "compare-decomposed":
+    compare_decomposed(args.tedn_flavor, args.predictions)
 else:
     parser.print_help()
     exit(2)
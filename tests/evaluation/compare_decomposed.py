@@ -0,0 +1,66 @@
+import os
+from typing import Optional
+from app.datasets.config import SCANNED_DATASET_PATH
+from app.evaluation.TEDn_lmx_xml import TEDn_lmx_xml
+
+
+def compare_decomposed(tedn_flavor: str, predictions_path: Optional[str]):
+    """Measures how far the measure-decomposed TEDn is from the exact TEDn
+    on the scanned testset. The predictions file contains one LMX string
+    per line (in the order of samples.test.txt), if not given, the gold
+    LMX files are used as predictions."""
+    samples_path = os.path.join(SCANNED_DATASET_PATH, "samples.test.txt")
+    with open(samples_path) as file:
+        sample_paths = [
+            os.path.join(SCANNED_DATASET_PATH, line.strip())
+            for line in file
+        ]
+    
+    if predictions_path is not None:
+        with open(predictions_path) as file:
+            predictions = [line.rstrip("\r\n") for line in file]
+        assert len(predictions) == len(sample_paths)
+    else:
+        predictions = []
+        for sample_path in sample_paths:
+            with open(sample_path + ".lmx") as file:
+                predictions.append(file.read())
+
+    total_gold = 0
+    total_exact_cost = 0
+    total_decomposed_cost = 0
+    differing_samples = 0
+    for sample_path, lmx_string in zip(sample_paths, predictions):
+        with open(sample_path + ".musicxml") as file:
+            musicxml_string = file.read()
+        
+        exact = TEDn_lmx_xml(
+            predicted_lmx=lmx_string,
+            gold_musicxml=musicxml_string,
+            flavor=tedn_flavor,
+            engine="fast"
+        )
+        decomposed = TEDn_lmx_xml(
+            predicted_lmx=lmx_string,
+            gold_musicxml=musicxml_string,
+            flavor=tedn_flavor,
+            engine="fast",
+            decomposed=True
+        )
+        
+        total_gold += exact.gold_cost
+        total_exact_cost += exact.edit_cost
+        total_decomposed_cost += decomposed.edit_cost
+        if exact.edit_cost != decomposed.edit_cost:
+            differing_samples += 1
+        
+        print(
+            sample_path,
+            "exact:", exact.edit_cost,
+            "decomposed:", decomposed.edit_cost,
+            "gold:", exact.gold_cost
+        )
+    
+    print("[TOTAL] Exact TEDn error:", round((total_exact_cost / total_gold) * 100, 2), "%")
+    print("[TOTAL] Decomposed TEDn error:", round((total_decomposed_cost / total_gold) * 100, 2), "%")
+    print("[TOTAL] Samples with a different cost:", differing_samples, "/", len(sample_paths))
@@ -0,0 +1,44 @@
+import unittest
+import glob
+import json
+import os
+import shutil
+import tempfile
+from app.linearization.batch import run_batch
+from app.linearization.LmxFile import LmxFile
+
+
+class BatchTest(unittest.TestCase):
+    def test_linearize_batch_matches_samples(self):
+        samples_dir = os.path.join(os.path.dirname(__file__), "samples")
+        with tempfile.TemporaryDirectory() as tmp:
+            input_dir = os.path.join(tmp, "in")
+            shutil.copytree(samples_dir, input_dir)
+            with open(os.path.join(input_dir, "broken.xml"), "w") as file:
+                file.write("<score-partwise>")
+            
+            errors_path = os.path.join(tmp, "errors.jsonl")
+            run_batch(
+                "linearize",
+                [input_dir],
+                output_dir=os.path.join(tmp, "out"),
+                workers=2,
+                errors_path=errors_path
+            )
+
+            for lmx_path in glob.glob(os.path.join(samples_dir, "**/*.lmx")):
+                output_path = os.path.join(
+                    tmp, "out", os.path.relpath(lmx_path, samples_dir)
+                )
+                with open(output_path, "r") as file:
+                    output_tokens = file.read().split()
+                # samples have a single system
+                expected_tokens = LmxFile.load(lmx_path).systems[0]
+                self.assertEqual(expected_tokens, output_tokens)
+            
+            with open(errors_path, "r") as file:
+                records = [json.loads(line) for line in file]
+            self.assertEqual(
+                [os.path.join(input_dir, "broken.xml")],
+                [r["input"] for r in records if r["status"] == "failed"]
+            )
@@ -0,0 +1,69 @@
+import unittest
+import glob
+import io
+import os
+import random
+import tempfile
+import numpy as np
+from app.linearization.grammar import compile_grammar, GrammarAutomaton
+from app.linearization.Delinearizer import Delinearizer
+from app.linearization.LmxFile import LmxFile
+
+
+class GrammarTest(unittest.TestCase):
+    def test_samples_are_accepted(self):
+        grammar = compile_grammar()
+        samples_dir = os.path.join(os.path.dirname(__file__), "samples")
+        for path in sorted(glob.glob(os.path.join(samples_dir, "**/*.lmx"))):
+            for system in LmxFile.load(path).systems:
+                self.assertIsNone(grammar.first_violation(system), path)
+
+    def test_violations(self):
+        grammar = compile_grammar()
+        self.assertTrue(grammar.accepts([]))
+        self.assertTrue(grammar.accepts(["measure", "measure"]))
+        self.assertEqual(grammar.first_violation("quarter".split()), 0)
+        self.assertEqual(grammar.first_violation("measure staff:1 quarter".split()), 1)
+        self.assertEqual(grammar.first_violation("measure C4 D4 quarter".split()), 2)
+        self.assertEqual(grammar.first_violation("measure C4 key:fifths:0".split()), 2)
+        self.assertEqual(grammar.first_violation("measure time beats:4".split()), 3)
+        self.assertEqual(grammar.first_violation("measure backup rest:measure".split()), 2)
+        self.assertEqual(grammar.first_violation("measure key:fifths:0 staff:1".split()), 2)
+        self.assertEqual(grammar.first_violation("measure C4".split()), 2)
+        self.assertTrue(grammar.accepts(
+            "measure time beat-type:4 beats:3 clef:G2 staff:1 " \
+                "voice:1 C4 chord eighth stem:up backup half".split()
+        ))
+
+    def test_accepted_sequences_delinearize_without_errors(self):
+        grammar = compile_grammar()
+        rng = random.Random(42)
+        for _ in range(200):
+            state = grammar.initial_state
+            tokens = []
+            while not (grammar.accepting[state] and rng.random() < 0.05):
+                token_id = rng.choice(np.nonzero(grammar.allowed[state])[0])
+                tokens.append(grammar.tokens[token_id])
+                state = int(grammar.transitions[state, token_id])
+
+            errout = io.StringIO()
+            delinearizer = Delinearizer(errout, keep_fractional_durations=True)
+            delinearizer.process_text(" ".join(tokens))
+            errors = [
+                # repeated suffixes are not covered by the grammar
+                line for line in errout.getvalue().splitlines()
+                if "Additional suffix" not in line
+            ]
+            self.assertEqual(errors, [], " ".join(tokens))
+
+    def test_save_and_load(self):
+        grammar = compile_grammar()
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "grammar.npz")
+            grammar.save(path)
+            loaded = GrammarAutomaton.load(path)
+        self.assertEqual(loaded.state_names, grammar.state_names)
+        self.assertEqual(loaded.tokens, grammar.tokens)
+        self.assertEqual(loaded.initial_state, grammar.initial_state)
+        self.assertTrue(np.array_equal(loaded.transitions, grammar.transitions))
+        self.assertTrue(np.array_equal(loaded.accepting, grammar.accepting))
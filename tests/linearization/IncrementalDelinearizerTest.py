@@ -0,0 +1,68 @@
+import unittest
+import glob
+import os
+import random
+import xml.etree.ElementTree as ET
+from typing import List
+from app.linearization.Delinearizer import Delinearizer
+from app.linearization.LmxFile import LmxFile
+
+
+class IncrementalDelinearizerTest(unittest.TestCase):
+    def load_sample_tokens(self) -> List[List[str]]:
+        samples_dir = os.path.join(os.path.dirname(__file__), "samples")
+        return [
+            system
+            for path in sorted(glob.glob(os.path.join(samples_dir, "**/*.lmx")))
+            for system in LmxFile.load(path).systems
+        ]
+
+    def assert_same_output(self, tokens: List[str]):
+        for keep_fractional_durations in [False, True]:
+            delinearizer = Delinearizer(
+                keep_fractional_durations=keep_fractional_durations
+            )
+            try:
+                expected = ET.tostring(delinearizer.process_text(" ".join(tokens)))
+            except Exception as e:
+                expected = type(e)
+
+            incremental = Delinearizer(
+                keep_fractional_durations=keep_fractional_durations
+            )
+            try:
+                for token in tokens:
+                    incremental.feed(token)
+                given = ET.tostring(incremental.finish())
+            except Exception as e:
+                given = type(e)
+
+            self.assertEqual(expected, given)
+
+    def test_samples(self):
+        for tokens in self.load_sample_tokens():
+            self.assert_same_output(tokens)
+
+    def test_corrupted_samples(self):
+        rng = random.Random(42)
+        all_tokens = sorted(set(
+            token for tokens in self.load_sample_tokens() for token in tokens
+        )) + ["unknown-token"]
+        for tokens in self.load_sample_tokens():
+            for _ in range(10):
+                corrupted = list(tokens)
+                for _ in range(5):
+                    corrupted.insert(
+                        rng.randrange(len(corrupted) + 1),
+                        rng.choice(all_tokens)
+                    )
+                    del corrupted[rng.randrange(len(corrupted))]
+                self.assert_same_output(corrupted)
+
+    def test_measures_are_closed_by_the_next_measure_token(self):
+        tokens = self.load_sample_tokens()[0]
+        delinearizer = Delinearizer()
+        delinearizer.feed_many(tokens)
+        self.assertEqual(len(delinearizer.part_element), tokens.count("measure") - 1)
+        delinearizer.feed("measure")
+        self.assertEqual(len(delinearizer.part_element), tokens.count("measure"))
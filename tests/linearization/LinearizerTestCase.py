@@ -1,6 +1,7 @@
 import unittest
 from app.linearization.Linearizer import Linearizer
 from app.linearization.LmxFile import LmxFile
+from app.linearization.vocabulary import VOCABULARY
 from app.symbolic.split_part_to_systems import split_part_to_systems
 import os
 import xml.etree.ElementTree as ET
@@ -28,7 +29,7 @@ class LinearizerTestCase(unittest.TestCase):
         )
 
         for i in range(len(lmx.systems)):
-            linearizer = Linearizer()
+            linearizer = Linearizer(emit_ids=True)
             linearizer.process_part(input_systems[i].part)
 
             errors = linearizer._errout.readlines()
@@ -43,3 +44,9 @@ class LinearizerTestCase(unittest.TestCase):
                 linearizer.output_tokens,
                 "Token sequences differ."
             )
+
+            self.assertEqual(
+                VOCABULARY.decode(linearizer.output_ids),
+                linearizer.output_tokens,
+                "Token ids do not match the tokens."
+            )
@@ -3,6 +3,7 @@ import os
 import glob
 import json
 from .scan_corpus import scan_corpus
+from .benchmark_linearizer import benchmark_linearizer
 
 
 ##########
@@ -34,6 +35,23 @@ subparsers.add_parser(
     help="Executes the linearizer on the entire OpenScore Lieder corpus"
 )
 
+benchmark_linearizer_parser = subparsers.add_parser(
+    "benchmark-linearizer",
+    aliases=[],
+    help="Measures the linearizer throughput on the OpenScore Lieder corpus"
+)
+benchmark_linearizer_parser.add_argument(
+    "--samples",
+    action="store_true",
+    help="Run on the test samples instead of the corpus"
+)
+benchmark_linearizer_parser.add_argument(
+    "--repeat",
+    type=int,
+    default=3,
+    help="Number of repetitions, the fastest one is reported"
+)
+
 subparsers.add_parser(
     "print-vocabulary",
     aliases=[],
@@ -73,6 +91,9 @@ elif args.command_name == "convert-corpus":
 elif args.command_name == "scan-corpus":
     scan_corpus()
 
+elif args.command_name == "benchmark-linearizer":
+    benchmark_linearizer(use_samples=args.samples, repeat=args.repeat)
+
 elif args.command_name == "print-vocabulary":
     from app.linearization.vocabulary import ALL_TOKENS
     print("\n".join(ALL_TOKENS))
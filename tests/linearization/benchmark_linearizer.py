@@ -0,0 +1,52 @@
+import glob
+import os
+import time
+import hashlib
+import xml.etree.ElementTree as ET
+from typing import List
+from app.linearization.Linearizer import Linearizer
+from app.symbolic.MxlFile import MxlFile
+
+
+def benchmark_linearizer(use_samples: bool, repeat: int):
+    """
+    Measures the linearization throughput in notes per second over the
+    OpenScore Lieder corpus (or over the test samples). Also prints
+    a digest of the produced LMX, so that runs on two versions of the code
+    can be checked to produce identical output.
+    """
+    if use_samples:
+        samples_dir = os.path.join(os.path.dirname(__file__), "samples")
+        paths = glob.glob(os.path.join(samples_dir, "**/*.xml"))
+    else:
+        paths = glob.glob(
+            "datasets/OpenScore-Lieder/scores/**/*.mxl",
+            recursive=True
+        )
+    paths.sort()
+
+    # load the parts beforehand, only the linearization is measured
+    parts: List[ET.Element] = []
+    for path in paths:
+        if path.endswith(".mxl"):
+            parts.extend(MxlFile.load_mxl(path).tree.findall("part"))
+        else:
+            parts.extend(ET.parse(path).findall("part"))
+    notes = sum(1 for part in parts for _ in part.iter("note"))
+    print("Loaded", len(parts), "parts with", notes, "notes")
+
+    digest = hashlib.sha256()
+    best_seconds = None
+    for i in range(repeat):
+        start_time = time.perf_counter()
+        for part in parts:
+            linearizer = Linearizer(fail_on_unknown_tokens=False)
+            linearizer.process_part(part)
+            if i == 0:
+                digest.update(" ".join(linearizer.output_tokens).encode("utf-8"))
+                digest.update(b"\n")
+        seconds = time.perf_counter() - start_time
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+
+    print("Notes per second:", round(notes / best_seconds))
+    print("Output digest:", digest.hexdigest())
@@ -0,0 +1,69 @@
+import unittest
+import copy
+import glob
+import io
+import os
+import xml.etree.ElementTree as ET
+from app.symbolic.PianoPartStream import PianoPartStream
+from app.symbolic.MxlFile import MxlFile
+from app.linearization.Linearizer import Linearizer
+
+
+class PianoPartStreamTest(unittest.TestCase):
+    def load_samples(self):
+        samples_dir = os.path.join(
+            os.path.dirname(__file__), "../linearization/samples"
+        )
+        for path in sorted(glob.glob(os.path.join(samples_dir, "**/*.xml"))):
+            with open(path, "rb") as file:
+                yield file.read()
+
+    def test_streamed_linearization_is_identical(self):
+        for data in self.load_samples():
+            linearizer = Linearizer()
+            linearizer.process_part(ET.fromstring(data).find("part"))
+
+            stream = PianoPartStream(io.BytesIO(data), chunk_size=100)
+            streaming_linearizer = Linearizer()
+            streaming_linearizer.process_measures(stream, part_id=stream.part_id)
+
+            self.assertEqual(
+                linearizer.output_tokens,
+                streaming_linearizer.output_tokens
+            )
+
+    def test_loaded_part_is_identical_to_the_parsed_one(self):
+        for data in self.load_samples():
+            mxl = MxlFile(ET.ElementTree(ET.fromstring(data)))
+            for chunk_size in [7, 64 * 1024]:
+                stream = PianoPartStream(io.BytesIO(data), chunk_size=chunk_size)
+                self.assertEqual(
+                    ET.tostring(mxl.get_piano_part()),
+                    ET.tostring(stream.load_part())
+                )
+
+    def test_other_parts_are_skipped(self):
+        for data in self.load_samples():
+            score = ET.fromstring(data)
+            piano_part = score.find("part")
+
+            # add a violin part before the piano part
+            part_list = score.find("part-list")
+            part_list.insert(0, ET.fromstring("""
+                <score-part id="V1">
+                    <part-name>Violin</part-name>
+                    <score-instrument id="V1-I1">
+                        <instrument-name>Violin</instrument-name>
+                    </score-instrument>
+                </score-part>
+            """))
+            violin_part = copy.deepcopy(piano_part)
+            violin_part.attrib["id"] = "V1"
+            score.insert(list(score).index(piano_part), violin_part)
+
+            stream = PianoPartStream(io.BytesIO(ET.tostring(score)))
+            self.assertEqual(stream.part_id, piano_part.attrib["id"])
+            self.assertEqual(
+                ET.canonicalize(ET.tostring(piano_part), strip_text=True),
+                ET.canonicalize(ET.tostring(stream.load_part()), strip_text=True)
+            )
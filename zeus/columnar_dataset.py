@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Columnar on-disk dataset format, memory-mapped on load.
+
+A dataset is a directory with the following files:
+- `meta.json` with the format version and the number of samples,
+- `vocabulary.txt` with the LMX tokens, in the order of their first occurrence,
+- `tokens.npy` with the int16 token ids of all samples, concatenated,
+- `images.bin`, `musicxml.bin`, `paths.bin` with the encoded images, the MusicXML
+  and the sample paths, concatenated,
+- `{tokens,images,musicxml,paths}.offsets.npy` with the int64 start offsets
+  of all samples (plus the end offset) in the above files.
+
+Loading is O(1), all the files are memory-mapped (so that the pages are shared by all
+processes using the dataset) and the values of a sample are read only when accessed.
+"""
+import collections.abc
+import json
+import os
+import shutil
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+
+VERSION = 1
+
+
+class _Blobs:
+    """Concatenated byte strings with their offsets."""
+    def __init__(self, path: str, name: str) -> None:
+        self._offsets = np.load(os.path.join(path, f"{name}.offsets.npy"), mmap_mode="r")
+        if self._offsets[-1] > 0:
+            self._data = np.memmap(os.path.join(path, f"{name}.bin"), dtype=np.uint8, mode="r")
+        else:
+            self._data = np.zeros([0], dtype=np.uint8)  # Empty files cannot be memory-mapped
+
+    def __getitem__(self, index: int) -> bytes:
+        return self._data[self._offsets[index]:self._offsets[index + 1]].tobytes()
+
+
+class ColumnarDataset:
+    """A memory-mapped columnar dataset."""
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r") as meta_file:
+            meta = json.load(meta_file)
+        if meta["version"] != VERSION:
+            raise ValueError(f"Unsupported columnar dataset version {meta['version']} of {path}")
+        self.size = meta["size"]
+
+        with open(os.path.join(path, "vocabulary.txt"), "r", encoding="utf-8") as vocabulary_file:
+            self.vocabulary = [line.rstrip("\r\n") for line in vocabulary_file]
+        self.tokens = np.load(os.path.join(path, "tokens.npy"), mmap_mode="r")
+        self.token_offsets = np.load(os.path.join(path, "tokens.offsets.npy"), mmap_mode="r")
+        self._images = _Blobs(path, "images")
+        self._musicxml = _Blobs(path, "musicxml")
+        self._paths = _Blobs(path, "paths")
+
+    def __len__(self) -> int:
+        return self.size
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, "meta.json"))
+
+    def lengths(self) -> np.ndarray:
+        """Return the number of tokens of all samples."""
+        return np.diff(self.token_offsets)
+
+    def token_ids(self, index: int) -> np.ndarray:
+        """Return the token ids (into the `vocabulary`) of the given sample."""
+        return self.tokens[self.token_offsets[index]:self.token_offsets[index + 1]]
+
+    def lmx(self, index: int) -> str:
+        return " ".join(self.vocabulary[token] for token in self.token_ids(index))
+
+    def image(self, index: int) -> bytes:
+        return self._images[index]
+
+    def musicxml(self, index: int) -> str:
+        return self._musicxml[index].decode("utf-8")
+
+    def sample_path(self, index: int) -> str:
+        return self._paths[index].decode("utf-8")
+
+
+class ColumnarEntry(collections.abc.Mapping):
+    """A lazily-loaded sample, with the same keys as the entries of the dataset pickles,
+    plus the `index` of the sample, and optionally the `seq` of the tag ids of its tokens."""
+    def __init__(self, dataset: ColumnarDataset, index: int, tag_ids: np.ndarray | None = None) -> None:
+        self._dataset = dataset
+        self._index = index
+        self._tag_ids = tag_ids
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "index":
+            return self._index
+        if key == "path":
+            return self._dataset.sample_path(self._index)
+        if key == "image":
+            return self._dataset.image(self._index)
+        if key == "lmx":
+            return self._dataset.lmx(self._index)
+        if key == "musicxml":
+            return self._dataset.musicxml(self._index)
+        if key == "seq" and self._tag_ids is not None:
+            return self._tag_ids[self._dataset.token_ids(self._index)]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from ["index", "path", "image", "lmx", "musicxml"]
+        if self._tag_ids is not None:
+            yield "seq"
+
+    def __len__(self) -> int:
+        return 5 + (self._tag_ids is not None)
+
+
+class ColumnarEntries(collections.abc.Sequence):
+    """The samples of a columnar dataset in the given order, as lazily-loaded entries."""
+    def __init__(self, dataset: ColumnarDataset, tag_ids: np.ndarray | None = None, order: np.ndarray | None = None) -> None:
+        self.dataset = dataset
+        self.tag_ids = tag_ids
+        self.order = order if order is not None else np.arange(len(dataset))
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __getitem__(self, index: int) -> ColumnarEntry:
+        return ColumnarEntry(self.dataset, int(self.order[index]), self.tag_ids)
+
+
+def write_columnar_dataset(path: str, entries: Iterable[dict]) -> None:
+    """Write the entries (with the `path`, `image`, `lmx` and `musicxml` keys) into
+    a columnar dataset directory, replacing it atomically."""
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    vocabulary, tokens, size = {}, [], 0
+    offsets = {name: [0] for name in ["tokens", "images", "musicxml", "paths"]}
+    blob_files = {name: open(os.path.join(tmp_path, f"{name}.bin"), "wb") for name in ["images", "musicxml", "paths"]}
+    try:
+        for entry in entries:
+            for token in entry["lmx"].split():
+                tokens.append(vocabulary.setdefault(token, len(vocabulary)))
+            offsets["tokens"].append(len(tokens))
+            for name, blob in [("images", entry["image"]), ("musicxml", entry["musicxml"].encode("utf-8")),
+                               ("paths", entry["path"].encode("utf-8"))]:
+                blob_files[name].write(blob)
+                offsets[name].append(offsets[name][-1] + len(blob))
+            size += 1
+    finally:
+        for blob_file in blob_files.values():
+            blob_file.close()
+
+    if len(vocabulary) > np.iinfo(np.int16).max + 1:
+        raise ValueError(f"The vocabulary of {len(vocabulary)} tokens does not fit into int16")
+    np.save(os.path.join(tmp_path, "tokens.npy"), np.array(tokens, dtype=np.int16))
+    for name, name_offsets in offsets.items():
+        np.save(os.path.join(tmp_path, f"{name}.offsets.npy"), np.array(name_offsets, dtype=np.int64))
+    with open(os.path.join(tmp_path, "vocabulary.txt"), "w", encoding="utf-8") as vocabulary_file:
+        for token in vocabulary:
+            print(token, file=vocabulary_file)
+    with open(os.path.join(tmp_path, "meta.json"), "w") as meta_file:
+        json.dump({"version": VERSION, "size": size}, meta_file)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
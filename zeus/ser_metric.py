@@ -3,6 +3,8 @@ import os
 import pickle
 import re
 
+import numpy as np
+
 def levenshtein_distance_pure(a: list, b: list) -> int:
     len_a, len_b = len(a), len(b)
 
@@ -18,11 +20,41 @@ def levenshtein_distance_pure(a: list, b: list) -> int:
 
     return distances[-1]
 
+def levenshtein_distance_myers(a: list, b: list) -> int:
+    """Bit-parallel edit distance (Myers, Hyyrö), the bits of python ints
+    represent the positions in `a`, so each item of `b` is processed
+    by a constant number of (big) integer operations."""
+    if len(a) == 0:
+        return len(b)
+
+    peq = {}
+    for i, x in enumerate(a):
+        peq[x] = peq.get(x, 0) | (1 << i)
+    full, last = (1 << len(a)) - 1, 1 << (len(a) - 1)
+
+    pv, mv, score = full, 0, len(a)
+    for y in b:
+        eq = peq.get(y, 0)
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & full) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & full
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = (mh | ~(xv | ph)) & full
+        mv = ph & xv
+
+    return score
+
 try:
     import Levenshtein
     levenshtein_distance = Levenshtein.distance
 except:
-    levenshtein_distance = levenshtein_distance_pure
+    levenshtein_distance = levenshtein_distance_myers
 
 tuplets_exceptions = {
     "tuplet:start",
@@ -30,25 +62,98 @@ tuplets_exceptions = {
 }
 tuplets_exception_re = re.compile(r"^\d+in\d+$")
 
-def ser_metric(gold: list[str], pred: list[str]) -> float:
+token_classes = [
+    ("measure", re.compile(r"^measure$")),
+    ("attributes", re.compile(r"^(key:.*|time|beats:.*|beat-type:.*|clef:.*)$")),
+    ("pitch", re.compile(r"^[A-G]\d$")),
+    ("accidental", re.compile(r"^(sharp|flat|natural|double-sharp|flat-flat|natural-sharp|natural-flat)$")),
+    ("rhythm", re.compile(r"^(\d+(th|nd)|eighth|quarter|half|whole|breve|long|maxima|dot|rest|rest:measure|forward|backup)$")),
+    ("tuplet", re.compile(r"^(tuplet:start|tuplet:stop|\d+in\d+)$")),
+    ("chord", re.compile(r"^(chord|grace|grace:slash)$")),
+    ("beam", re.compile(r"^beam:.*$")),
+    ("stem", re.compile(r"^stem:.*$")),
+    ("staff", re.compile(r"^staff:.*$")),
+    ("voice", re.compile(r"^voice:.*$")),
+    ("tie_slur", re.compile(r"^(tied|slur):.*$")),
+]
+"""Token classes of the per-class breakdown, other tokens are in the "other" class"""
+
+def token_class(token: str) -> str:
+    for name, token_re in token_classes:
+        if token_re.match(token):
+            return name
+    return "other"
+
+def ser_metric_batch(gold: list[str], pred: list[str], per_class: bool = False) -> dict:
+    """Computes per-sample error counts and gold lengths as numpy arrays.
+
+    Tokens are mapped to integer ids at once, the tuplet and token-class
+    filtering is done by masks over the id arrays, and the edit distance
+    is computed over the id sequences. Returns a dictionary with keys
+    "errors", "lengths", "errors_notuplets", "lengths_notuplets" and,
+    if per_class, "class_errors", "class_lengths" (dictionaries from the
+    token class name, see token_classes).
+    """
     assert len(gold) == len(pred), "Gold and predicted data must have the same length"
 
-    ser_errors, ser_total = 0, 0
-    sert_errors, sert_total = 0, 0
-    for gold_lmx, pred_lmx in zip(gold, pred):
-        gold_lmx = gold_lmx.rstrip("\r\n").split()
-        pred_lmx = pred_lmx.rstrip("\r\n").split()
+    # map all tokens to integer ids
+    gold_tokens = [lmx.rstrip("\r\n").split() for lmx in gold]
+    pred_tokens = [lmx.rstrip("\r\n").split() for lmx in pred]
+    lengths = np.array([len(tokens) for tokens in gold_tokens + pred_tokens], dtype=np.int64)
+    vocabulary, ids = np.unique(
+        np.array([token for tokens in gold_tokens + pred_tokens for token in tokens], dtype=str),
+        return_inverse=True,
+    )
+    ids = np.split(ids.astype(np.int32), np.cumsum(lengths)[:-1]) if len(lengths) else []
+    gold_ids, pred_ids = ids[:len(gold)], ids[len(gold):]
+
+    # properties of the distinct tokens
+    is_tuplet = np.array([
+        x in tuplets_exceptions or tuplets_exception_re.match(x) is not None for x in vocabulary
+    ], dtype=bool)
+
+    def distances(mask=None):
+        errors = np.zeros(len(gold), dtype=np.int64)
+        lengths = np.zeros(len(gold), dtype=np.int64)
+        for i, (g, p) in enumerate(zip(gold_ids, pred_ids)):
+            if mask is not None:
+                g, p = g[mask[g]], p[mask[p]]
+            errors[i] = levenshtein_distance(g.tolist(), p.tolist())
+            lengths[i] = len(g)
+        return errors, lengths
 
-        ser_errors += levenshtein_distance(gold_lmx, pred_lmx)
-        ser_total += len(gold_lmx)
+    errors, lengths = distances()
+    errors_notuplets, lengths_notuplets = distances(~is_tuplet)
+    results = {
+        "errors": errors,
+        "lengths": lengths,
+        "errors_notuplets": errors_notuplets,
+        "lengths_notuplets": lengths_notuplets,
+    }
 
-        gold_tuplets = [x for x in gold_lmx if x not in tuplets_exceptions and not tuplets_exception_re.match(x)]
-        pred_tuplets = [x for x in pred_lmx if x not in tuplets_exceptions and not tuplets_exception_re.match(x)]
-        sert_errors += levenshtein_distance(gold_tuplets, pred_tuplets)
-        sert_total += len(gold_tuplets)
+    if per_class:
+        class_names = [name for name, _ in token_classes] + ["other"]
+        class_ids = np.array([class_names.index(token_class(x)) for x in vocabulary], dtype=np.int32)
+        results["class_errors"], results["class_lengths"] = {}, {}
+        for class_id, name in enumerate(class_names):
+            results["class_errors"][name], results["class_lengths"][name] = distances(class_ids == class_id)
 
+    return results
+
+def ser_metric(gold: list[str], pred: list[str], per_class: bool = False) -> dict:
+    results = ser_metric_batch(gold, pred, per_class=per_class)
+
+    ser_total = results["lengths"].sum()
     assert ser_total > 0, "Gold data cannot be empty"
-    return {"SER": 100 * ser_errors / ser_total, "SERnotuplets": 100 * sert_errors / sert_total}
+    metrics = {
+        "SER": 100 * results["errors"].sum() / ser_total,
+        "SERnotuplets": 100 * results["errors_notuplets"].sum() / results["lengths_notuplets"].sum(),
+    }
+    if per_class:
+        for name, class_lengths in results["class_lengths"].items():
+            if class_lengths.sum():
+                metrics[f"SER-{name}"] = 100 * results["class_errors"][name].sum() / class_lengths.sum()
+    return {metric: float(value) for metric, value in metrics.items()}
 
 
 if __name__ == "__main__":
@@ -57,6 +162,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("gold", type=str, help="File with gold dataset")
     parser.add_argument("pred", type=str, help="File with predicted data")
+    parser.add_argument("--per_class", default=False, action="store_true", help="Also print SER of token classes")
+    parser.add_argument("--per_sample", default=None, type=str, help="Write per-sample error counts to this TSV file")
     args = parser.parse_args()
 
     with open(f"{args.gold}.pickle", "rb") as dataset_file:
@@ -65,5 +172,12 @@ if __name__ == "__main__":
     with open(args.pred, "r", encoding="utf-8") as pred_file:
         pred = [line.rstrip("\r\n") for line in pred_file]
 
-    for metric, value in ser_metric(gold, pred).items():
+    if args.per_sample:
+        results = ser_metric_batch(gold, pred, per_class=False)
+        with open(args.per_sample, "w", encoding="utf-8") as per_sample_file:
+            print("errors", "length", "errors_notuplets", "length_notuplets", sep="\t", file=per_sample_file)
+            for row in zip(results["errors"], results["lengths"], results["errors_notuplets"], results["lengths_notuplets"]):
+                print(*row, sep="\t", file=per_sample_file)
+
+    for metric, value in ser_metric(gold, pred, per_class=args.per_class).items():
         print("{}: {:.3f}%".format(metric, value))
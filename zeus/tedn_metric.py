@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
+import functools
+import json
 import multiprocessing
+import os
 import pickle
 import sys
 
+import columnar_dataset
+
 sys.path.append("..")
-from app.evaluation.TEDn_lmx_xml import TEDn_lmx_xml
+from app.evaluation.TEDn import METRIC_VERSION
+from app.evaluation.TEDn_lmx_xml import prepare_gold, gold_source_hash
+from app.evaluation.TEDn_cache import TEDnCache
+from app.evaluation.TEDn_scheduler import TEDnScheduler
 
 if __name__ == "__main__":
     import argparse
@@ -12,30 +20,144 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("gold", type=str, help="Gold dataset")
     parser.add_argument("pred", type=str, help="File with predicted LMX")
+    parser.add_argument("--checkpoint", default=None, type=str, help="JSONL file with per-sample results, resumed when it exists")
+    parser.add_argument("--cache", default=None, type=str, help="SQLite file caching the computed results")
+    parser.add_argument("--cache_size", default=1_000_000, type=int, help="Maximum number of cached results")
+    parser.add_argument("--engine", default="zss", choices=["zss", "fast"], help="Tree edit distance engine")
     parser.add_argument("--flavor", default="full", choices=["full", "lmx"], help="Flavor of the evaluation")
+    parser.add_argument("--timeout", default=None, type=float, help="Seconds after which only the bounds are computed")
+    parser.add_argument("--prepared_gold", default=0, type=int, help="Store preprocessed gold trees next to the dataset (reused by later runs)")
     parser.add_argument("--verbose", default=1, type=int, help="Verbosity level")
     parser.add_argument("--workers", default=1, type=int, help="Number of workers to use")
     args = parser.parse_args()
 
-    with open(f"{args.gold}.pickle", "rb") as dataset_file:
-        gold = pickle.load(dataset_file)
+    if columnar_dataset.ColumnarDataset.exists(f"{args.gold}.columns"):
+        gold = columnar_dataset.ColumnarDataset(f"{args.gold}.columns")
+        gold = [gold.musicxml(i) for i in range(len(gold))]
+    else:
+        with open(f"{args.gold}.pickle", "rb") as dataset_file:
+            gold = pickle.load(dataset_file)
+        gold = [entry["musicxml"] for entry in gold]
     with open(args.pred, "r", encoding="utf-8") as pred_file:
         pred = [line.rstrip("\r\n") for line in pred_file]
 
-    def TEDn_metric(inputs):
-        gold, pred = inputs
-        return TEDn_lmx_xml(pred, gold, flavor=args.flavor)
+    # The gold trees are preprocessed only once and stored next to the dataset,
+    # entries of a stale file (different gold or metric version) are rebuilt
+    if args.prepared_gold:
+        prepared_path = f"{args.gold}.tedn-{args.flavor}.pickle"
+        prepared = {}
+        try:
+            with open(prepared_path, "rb") as prepared_file:
+                stored = pickle.load(prepared_file)
+            if stored["metric_version"] == METRIC_VERSION:
+                prepared = {entry.source_hash: entry for entry in stored["golds"]}
+        except FileNotFoundError:
+            pass
+        hashes = [gold_source_hash(gold_musicxml) for gold_musicxml in gold]
+        missing = [gold_musicxml for gold_musicxml, h in zip(gold, hashes) if h not in prepared]
+        if missing or len(prepared) != len(set(hashes)):
+            with multiprocessing.Pool(args.workers) as pool:
+                for entry in pool.imap(functools.partial(prepare_gold, flavor=args.flavor), missing, chunksize=16):
+                    prepared[entry.source_hash] = entry
+            with open(prepared_path, "wb") as prepared_file:
+                pickle.dump({
+                    "metric_version": METRIC_VERSION,
+                    "golds": [prepared[h] for h in dict.fromkeys(hashes)],
+                }, prepared_file)
+            if args.verbose:
+                print("Prepared {} of {} gold trees".format(len(missing), len(gold)), file=sys.stderr)
+        gold = [prepared[h] for h in hashes]
+
+    keys = [
+        TEDnCache.make_key(pred_lmx, gold_musicxml, args.flavor, canonicalize_gold=True, decomposed=False, bound_only=False)
+        for gold_musicxml, pred_lmx in zip(gold, pred)
+    ]
+
+    # Results of an interrupted run are resumed from the checkpoint
+    # (as long as the predictions did not change)
+    samples = {}
+    if args.checkpoint is not None and os.path.exists(args.checkpoint):
+        with open(args.checkpoint, "r", encoding="utf-8") as checkpoint_file:
+            for line in checkpoint_file:
+                try:
+                    sample = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # the last line may be cut off by a crash
+                if sample["index"] < len(keys) and sample["key"] == keys[sample["index"]]:
+                    samples[sample["index"]] = sample
+    resumed = len(samples)
+
+    def make_sample(index, result, status):
+        return {
+            "index": index,
+            "key": keys[index],
+            "status": status,
+            "gold_cost": result.gold_cost if result else None,
+            "edit_cost": result.edit_cost if result else None,
+            "edit_cost_lower_bound": result.edit_cost_lower_bound if result else None,
+            "evaluation_time_seconds": result.evaluation_time_seconds if result else None,
+        }
+
+    checkpoint = open(args.checkpoint, "a", encoding="utf-8") if args.checkpoint is not None else None
+    def record(sample):
+        samples[sample["index"]] = sample
+        if checkpoint is not None:
+            print(json.dumps(sample), file=checkpoint, flush=True)
+
+    # Results of unchanged predictions are taken from the cache
+    cache = TEDnCache(args.cache, args.cache_size) if args.cache else None
+    inputs = []
+    for index, (gold_musicxml, pred_lmx) in enumerate(zip(gold, pred)):
+        if index in samples:
+            continue
+        result = cache.get(keys[index]) if cache is not None else None
+        if result is not None:
+            record(make_sample(index, result, TEDnScheduler.EXACT))
+        else:
+            inputs.append((index, pred_lmx, gold_musicxml))
+    cached = len(samples) - resumed
+
+    # The remaining samples are evaluated, the most expensive ones first
+    scheduler = TEDnScheduler(args.workers, flavor=args.flavor, engine=args.engine, timeout=args.timeout)
+    for total, (index, result, status) in enumerate(scheduler.run(inputs), start=1):
+        if cache is not None and status == TEDnScheduler.EXACT:
+            cache.put(keys[index], result)
+        record(make_sample(index, result, status))
+        if args.verbose and total % 10 == 0:
+            print("Processed", total, "files", end="\r", file=sys.stderr)
+    if checkpoint is not None:
+        checkpoint.close()
+    if cache is not None:
+        cache.close()
 
     total_gold_cost, total_edit_cost = 0, 0
-    with multiprocessing.Pool(args.workers) as pool:
-        total = 0
-        for result in pool.imap_unordered(TEDn_metric, sorted(zip([entry["musicxml"] for entry in gold], pred), key=lambda x: len(x[1]), reverse=True)):
-            total_gold_cost += result.gold_cost
-            total_edit_cost += result.edit_cost
-            total += 1
-            if args.verbose and total % 10 == 0:
-                print("Processed", total, "files", end="\r", file=sys.stderr)
+    statuses = {}
+    for sample in samples.values():
+        statuses[sample["status"]] = statuses.get(sample["status"], 0) + 1
+        if sample["status"] != TEDnScheduler.FAILED:
+            total_gold_cost += sample["gold_cost"]
+            total_edit_cost += sample["edit_cost"]
+
     if args.verbose:
         print("Done", file=sys.stderr)
+        if resumed:
+            print("Resumed from checkpoint: {} of {} files".format(resumed, len(samples)), file=sys.stderr)
+        if cache is not None:
+            print("Taken from cache: {} of {} files".format(cached, len(samples)), file=sys.stderr)
+        print("Statuses:", ", ".join("{} {}".format(k, v) for k, v in sorted(statuses.items())), file=sys.stderr)
+        slowest = sorted(
+            (s for s in samples.values() if s["evaluation_time_seconds"] is not None),
+            key=lambda s: s["evaluation_time_seconds"], reverse=True
+        )[:5]
+        for sample in slowest:
+            print("Slow sample {}: {:.2f}s ({})".format(
+                sample["index"], sample["evaluation_time_seconds"], sample["status"]
+            ), file=sys.stderr)
+    if statuses.get(TEDnScheduler.TIMEOUT) or statuses.get(TEDnScheduler.CRASH):
+        print("Warning: {} results are only upper bounds".format(
+            statuses.get(TEDnScheduler.TIMEOUT, 0) + statuses.get(TEDnScheduler.CRASH, 0)
+        ), file=sys.stderr)
+    if statuses.get(TEDnScheduler.FAILED):
+        print("Warning: {} samples failed and are not counted".format(statuses[TEDnScheduler.FAILED]), file=sys.stderr)
 
     print("TEDn-{}: {:.3f}%".format(args.flavor, 100 * total_edit_cost / total_gold_cost))
@@ -2,10 +2,12 @@
 import argparse
 import contextlib
 import datetime
+import hashlib
 import json
 import os
 import pickle
 import re
+import time
 #from typing import Self
 from typing_extensions import Self
 os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")  # Report only TF errors by default
@@ -13,11 +15,16 @@ os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")  # Report only TF errors by d
 import numpy as np
 import tensorflow as tf
 
+import columnar_dataset
 import ser_metric
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--augment", default="h:8", type=str, help="Augmentation type.")
 parser.add_argument("--batch_size", default=64, type=int, help="Batch size.")
+parser.add_argument("--batch_tokens", default=0, type=int, help="If nonzero, training batch sizes of buckets are given by this budget.")
+parser.add_argument("--beam_alpha", default=0.6, type=float, help="Beam search length normalization exponent.")
+parser.add_argument("--beam_size", default=[1], nargs="+", type=int, help="Beam sizes to predict with (1 is greedy).")
+parser.add_argument("--bucket_boundaries", default=[], nargs="*", type=int, help="Bucket training batches by length with these boundaries.")
 parser.add_argument("--cnn_dim", default=32, type=int, help="CNN dim at original resolution.")
 parser.add_argument("--cnn_resblocks", default=2, type=int, help="CNN ResNet blocks per layer.")
 parser.add_argument("--cnn_stages", default=4, type=int, help="CNN layers.")
@@ -28,7 +35,9 @@ parser.add_argument("--epochs", default=50, type=int, help="Number of epochs.")
 parser.add_argument("--evaluation_each", default=50, type=int, help="Evaluate each epoch.")
 parser.add_argument("--evaluation_from", default=50, type=int, help="Evaluate from epoch.")
 parser.add_argument("--exp", default="", type=str, help="Exp name.")
+parser.add_argument("--grammar", default=None, type=str, help="Grammar automaton .npz masking the predictions.")
 parser.add_argument("--height", default=192, type=int, help="Image height.")
+parser.add_argument("--image_cache", default=False, action="store_true", help="Cache the prepared images in memory-mapped files.")
 parser.add_argument("--load", default=None, type=str, help="Load weights from model and predict.")
 parser.add_argument("--max_predict_length", default=700, type=int, help="Maximum prediction sequence length.")
 parser.add_argument("--max_train_length", default=500, type=int, help="Maximum training sequence length.")
@@ -44,15 +53,54 @@ parser.add_argument("--verbose", default=1, type=int, help="Verbosity")
 parser.add_argument("--visualize_only", default=False, action="store_true", help="Visualize only.")
 
 
+def prepare_image(image: tf.Tensor, transformations: list[str], height: int) -> tf.Tensor:
+    """Decode an encoded PNG/JPG image, apply the dataset transformations, and resize it to the given height."""
+    image = tf.image.convert_image_dtype(tf.image.decode_image(image, channels=1, expand_animations=False), tf.float32)
+    for transformation, *parameters in map(lambda part: part.split(":"), transformations):
+        if transformation == "threshold":
+            l, r, *rest = parameters
+            l, r, smooth = float(l), float(r), rest.count("smooth")
+            if not smooth:
+                image = tf.cast(image >= l, tf.float32) * tf.cast(image <= r, tf.float32) * image + tf.cast(image > r, tf.float32)
+            else:
+                image = tf.clip_by_value((image - l) / (r - l), 0., 1.)
+        elif transformation:
+            raise ValueError(f"The transformation '{transformation}' is unknown.")
+    image = tf.image.resize(image, size=[height, tf.int32.max], preserve_aspect_ratio=True, antialias=True)
+    return image
+
+
+def image_size(image: bytes) -> tuple[int, int]:
+    """Return the height and width of an encoded PNG/JPG image, without decoding it."""
+    if image.startswith(b"\x89PNG\r\n\x1a\n"):
+        return int.from_bytes(image[20:24], "big"), int.from_bytes(image[16:20], "big")
+    height, width, _ = tf.image.extract_jpeg_shape(image).numpy()
+    return int(height), int(width)
+
+
+def padding_ratio(widths: np.ndarray, batches: list[list[int]]) -> float:
+    """Return the ratio of padding in the given batches of images with the given widths."""
+    padded = sum(len(batch) * max(widths[batch]) for batch in batches)
+    return 1 - sum(sum(widths[batch]) for batch in batches) / padded
+
+
 class LMXDataset:
     def __init__(self, description: str, args: argparse.Namespace, train_dataset: Self|None = None):
         self._args = args
         self._tf_dataset = None
+        self._image_cache = None
 
         self.path, *self._transformations = description.split(",")
         self.basename = os.path.splitext(os.path.basename(self.path))[0]
-        with open(f"{self.path}.pickle", "rb") as data_file:
-            self.data = pickle.load(data_file)
+        columnar = columnar_dataset.ColumnarDataset.exists(f"{self.path}.columns")
+        if columnar:
+            # The columnar dataset is memory-mapped, the entries are loaded lazily
+            columns = columnar_dataset.ColumnarDataset(f"{self.path}.columns")
+            self._source_path = os.path.join(columns.path, "meta.json")
+        else:
+            self._source_path = f"{self.path}.pickle"
+            with open(self._source_path, "rb") as data_file:
+                self.data = pickle.load(data_file)
 
         if train_dataset is None:
             self.tags = ["<unk>"]
@@ -61,28 +109,42 @@ class LMXDataset:
             self.tags = train_dataset.tags
             self.tags_map = train_dataset.tags_map
 
-        for entry in self.data:
-            lmx = entry[f"lmx"]
-            seq = []
-            for part in lmx.split():
-                if part not in self.tags_map:
-                    if train_dataset is None:
-                        self.tags_map[part] = len(self.tags)
-                        self.tags.append(part)
-                    else:
-                        part = "<unk>"
-                seq.append(self.tags_map[part])
-            entry["seq"] = np.array(seq, dtype=np.int32)
+        if columnar:
+            # The vocabulary is in the order of the first occurrence, so the tags are the same as from a pickle
+            for token in columns.vocabulary:
+                if token not in self.tags_map and train_dataset is None:
+                    self.tags_map[token] = len(self.tags)
+                    self.tags.append(token)
+            tag_ids = np.array([self.tags_map.get(token, self.tags_map["<unk>"]) for token in columns.vocabulary], dtype=np.int32)
+            self.data = columnar_dataset.ColumnarEntries(columns, tag_ids)
+        else:
+            for index, entry in enumerate(self.data):
+                entry["index"] = index  # The position in the pickle, used by the image cache
+                lmx = entry[f"lmx"]
+                seq = []
+                for part in lmx.split():
+                    if part not in self.tags_map:
+                        if train_dataset is None:
+                            self.tags_map[part] = len(self.tags)
+                            self.tags.append(part)
+                        else:
+                            part = "<unk>"
+                    seq.append(self.tags_map[part])
+                entry["seq"] = np.array(seq, dtype=np.int32)
 
         # Shuffle train, because it is sorted by authors, and we use only a small window in tf.data pipeline.
         if train_dataset is None:
-            np.random.RandomState(42).shuffle(self.data)
+            if columnar:
+                self.data.order = np.random.RandomState(42).permutation(len(self.data))  # The same order as shuffle
+            else:
+                np.random.RandomState(42).shuffle(self.data)
 
         # Print statistics
         if train_dataset is None:
             print("Tags: {}".format(len(self.tags)))
         print("Loaded dataset {}, {} examples, {:.2f} avg length".format(
-            self.basename, len(self.data), np.mean([len(entry["seq"]) for entry in self.data])))
+            self.basename, len(self.data),
+            np.mean(columns.lengths()) if columnar else np.mean([len(entry["seq"]) for entry in self.data])))
 
     def save_tags(self, path: str) -> None:
         with open(path, "w") as tags_file:
@@ -99,10 +161,115 @@ class LMXDataset:
         dataset.tags_map = {tag: index for index, tag in enumerate(dataset.tags)}
         return dataset
 
+    def bucketing(self, widths: np.ndarray) -> tuple[np.ndarray, np.ndarray, list[list[int]]]:
+        """Assign the examples with the given resized widths to buckets, returning the bucket ids, the batch sizes of the buckets,
+        and the batches the examples would form in the dataset order.
+
+        The length of an example is the larger of the number of encoder timesteps of the resized
+        image and the target length (including EOS); the bucket batch sizes are given either by
+        the `batch_tokens` budget divided by the bucket maximum length, or by the `batch_size`.
+        """
+        if isinstance(self.data, columnar_dataset.ColumnarEntries):
+            target_lengths = self.data.dataset.lengths()[self.data.order] + 1
+        else:
+            target_lengths = np.array([len(entry["seq"]) + 1 for entry in self.data])
+        lengths = np.maximum((widths + self._args.timestep_width - 1) // self._args.timestep_width, target_lengths)
+        boundaries = np.array(self._args.bucket_boundaries)
+        buckets = np.searchsorted(boundaries, lengths, side="right")
+        if self._args.batch_tokens:
+            maxima = np.append(boundaries - 1, max(lengths.max(), boundaries[-1]))
+            batch_sizes = np.maximum(1, self._args.batch_tokens // maxima)
+        else:
+            batch_sizes = np.full(len(boundaries) + 1, self._args.batch_size)
+
+        # The same windows as in `group_by_window`, emitted when full and at the end
+        batches, windows = [], [[] for _ in batch_sizes]
+        for i, bucket in enumerate(buckets):
+            windows[bucket].append(i)
+            if len(windows[bucket]) == batch_sizes[bucket]:
+                batches.append(windows[bucket])
+                windows[bucket] = []
+        batches.extend(window for window in windows if window)
+        return buckets, batch_sizes, batches
+
+    def resized_widths(self) -> np.ndarray:
+        """Return the image widths after resizing to the model height."""
+        if self._image_cache is not None:
+            _, _, widths = self._image_cache
+            return widths[[entry["index"] for entry in self.data]]
+        widths = []
+        for entry in self.data:
+            height, width = image_size(entry["image"])
+            widths.append(round(width * self._args.height / height))
+        return np.array(widths)
+
+    def load_image_cache(self) -> None:
+        """Memory-map the decoded, transformed, and resized images, preparing them first if needed.
+
+        The uint8 pixels of all images (in the pickle order) are concatenated in a single file,
+        and an index file stores their offsets and widths. The files are stored next to the
+        dataset, keyed by the height and the transformations, and are rebuilt when the dataset
+        file changes.
+        """
+        key = hashlib.sha1(",".join(self._transformations).encode("utf-8")).hexdigest()[:12]
+        path = f"{self.path}.images-h{self._args.height}-{key}"
+        source = os.stat(self._source_path)
+        source = f"{source.st_size}:{source.st_mtime_ns}"
+
+        index = None
+        if os.path.exists(f"{path}.index.npz"):
+            with np.load(f"{path}.index.npz") as index_file:
+                if str(index_file["source"]) == source and len(index_file["widths"]) == len(self.data):
+                    index = index_file["offsets"], index_file["widths"]
+        if index is None:
+            print(f"Preparing the image cache {path}", flush=True)
+            entries = sorted(self.data, key=lambda entry: entry["index"])
+            images = tf.data.Dataset.from_generator(
+                lambda: (entry["image"] for entry in entries), output_signature=tf.TensorSpec(shape=(), dtype=tf.string))
+            images = images.map(lambda image: tf.cast(tf.round(255 * tf.clip_by_value(
+                prepare_image(image, self._transformations, self._args.height), 0., 1.)), tf.uint8), num_parallel_calls=tf.data.AUTOTUNE)
+            widths = []
+            with open(f"{path}.u8.tmp", "wb") as cache_file:
+                for image in images.as_numpy_iterator():
+                    cache_file.write(image.tobytes())
+                    widths.append(image.shape[1])
+            widths = np.array(widths, dtype=np.int64)
+            offsets = np.concatenate([[0], np.cumsum(widths * self._args.height)[:-1]]).astype(np.int64)
+            os.replace(f"{path}.u8.tmp", f"{path}.u8")
+            # The index is written last, so that an interrupted preparation is not used
+            with open(f"{path}.index.npz.tmp", "wb") as index_file:
+                np.savez(index_file, source=source, offsets=offsets, widths=widths)
+            os.replace(f"{path}.index.npz.tmp", f"{path}.index.npz")
+            index = offsets, widths
+
+        self._image_cache = (np.memmap(f"{path}.u8", dtype=np.uint8, mode="r"), *index)
+
+    def cached_image(self, index: int) -> np.ndarray:
+        """Return the prepared uint8 image of the entry with the given index from the image cache."""
+        images, offsets, widths = self._image_cache
+        offset, width = offsets[index], widths[index]
+        return np.array(images[offset:offset + self._args.height * width]).reshape([self._args.height, width, 1])
+
     def tf_dataset(self, training: bool = False) -> tf.data.Dataset:
         if self._tf_dataset is not None:
             return self._tf_dataset
 
+        # With the image cache, only the entry indices go through the pipeline
+        if self._args.image_cache and self._image_cache is None:
+            self.load_image_cache()
+        image_cache = self._image_cache is not None
+
+        # Bucketing by length is used only for training, to keep the prediction order
+        bucketing = training and len(self._args.bucket_boundaries) > 0
+        if bucketing:
+            widths = self.resized_widths()
+            buckets, batch_sizes, batches = self.bucketing(widths)
+            fixed_batches = [list(range(i, min(i + self._args.batch_size, len(widths))))
+                             for i in range(0, len(widths), self._args.batch_size)]
+            print("Padding ratio of {}: {:.1f}% with fixed batches, {:.1f}% with buckets (batch sizes {})".format(
+                self.basename, 100 * padding_ratio(widths, fixed_batches), 100 * padding_ratio(widths, batches),
+                ", ".join(map(str, batch_sizes))))
+
         if training:
             # Prepare augmentation operations
             self._generator = tf.random.Generator.from_seed(self._args.seed)
@@ -111,23 +278,17 @@ class LMXDataset:
                     float(match.group(1)) / 360, fill_mode="constant", interpolation="bilinear", seed=self._args.seed, fill_value=1.0)
 
         def generator():
-            for entry in self.data:
-                yield entry["image"], entry["seq"]
-        def prepare_example(image, tags):
-            image = tf.image.convert_image_dtype(tf.image.decode_image(image, channels=1, expand_animations=False), tf.float32)
-            for transformation, *parameters in map(lambda part: part.split(":"), self._transformations):
-                if transformation == "threshold":
-                    l, r, *rest = parameters
-                    l, r, smooth = float(l), float(r), rest.count("smooth")
-                    if not smooth:
-                        image = tf.cast(image >= l, tf.float32) * tf.cast(image <= r, tf.float32) * image + tf.cast(image > r, tf.float32)
-                    else:
-                        image = tf.clip_by_value((image - l) / (r - l), 0., 1.)
-                elif transformation:
-                    raise ValueError(f"The transformation '{transformation}' is unknown.")
-            image = tf.image.resize(image, size=[self._args.height, tf.int32.max], preserve_aspect_ratio=True, antialias=True)
-            return image, tags
-        def augment(image, tags):
+            for i, entry in enumerate(self.data):
+                image = entry["index"] if image_cache else entry["image"]
+                yield (image, entry["seq"], buckets[i]) if bucketing else (image, entry["seq"])
+        def prepare_example(image, tags, *bucket):
+            if image_cache:
+                image = tf.numpy_function(self.cached_image, [image], tf.uint8, stateful=False)
+                image = tf.cast(tf.ensure_shape(image, [self._args.height, None, 1]), tf.float32) / 255
+            else:
+                image = prepare_image(image, self._transformations, self._args.height)
+            return image, tags, *bucket
+        def augment(image, tags, *bucket):
             for augmentation, *parameters in map(lambda part: part.split(":"), self._args.augment.split(",")):
                 if self._generator.uniform([], 0, 1) >= 0.5:
                     continue
@@ -168,21 +329,52 @@ class LMXDataset:
                         image = tf.clip_by_value(image + moved - 1, 0., 1.)
                 elif augmentation:
                     raise ValueError(f"The augmentation '{augmentation}' is unknown.")
-            return image, tags
+            return image, tags, *bucket
 
         dataset = tf.data.Dataset.from_generator(generator, output_signature=(
-            tf.TensorSpec(shape=(), dtype=tf.string), tf.TensorSpec(shape=(None,), dtype=tf.int32)))
+            tf.TensorSpec(shape=(), dtype=tf.int64 if image_cache else tf.string), tf.TensorSpec(shape=(None,), dtype=tf.int32),
+            *([tf.TensorSpec(shape=(), dtype=tf.int64)] if bucketing else [])))
         dataset = dataset.cache()
         dataset = dataset.apply(tf.data.experimental.assert_cardinality(sum(1 for _ in dataset)))
         dataset = dataset.shuffle(5_000, seed=self._args.seed) if training else dataset
         dataset = dataset.map(prepare_example, num_parallel_calls=tf.data.AUTOTUNE)
         dataset = dataset.map(augment, num_parallel_calls=tf.data.AUTOTUNE) if training and self._args.augment else dataset
-        dataset = dataset.ragged_batch(self._args.batch_size)
+        if bucketing:
+            # Like `bucket_by_sequence_length`, but producing ragged batches
+            batch_sizes = tf.constant(batch_sizes, tf.int64)
+            dataset = dataset.group_by_window(
+                key_func=lambda image, tags, bucket: bucket,
+                reduce_func=lambda bucket, window: window.map(lambda image, tags, _: (image, tags)).ragged_batch(batch_sizes[bucket]),
+                window_size_func=lambda bucket: batch_sizes[bucket])
+            dataset = dataset.apply(tf.data.experimental.assert_cardinality(len(batches)))
+        else:
+            dataset = dataset.ragged_batch(self._args.batch_size)
         dataset = dataset.prefetch(tf.data.AUTOTUNE)
         self._tf_dataset = dataset
         return dataset
 
 
+def load_grammar_table(path: str, tags: list[str]) -> tuple[np.ndarray, int]:
+    """Load the LMX grammar automaton (exported by `python3 -m app.linearization export-grammar`).
+
+    Returns the initial state and a table of the shape [states, 1 + len(tags)] with the next
+    state for each model output (or -1 if the output is not allowed), where the output 0 is EOS,
+    allowed only in the accepting states, and the output i + 1 is the tags[i].
+    """
+    with np.load(path) as grammar:
+        token_ids = {str(token): i for i, token in enumerate(grammar["tokens"])}
+        transitions = grammar["transitions"].astype(np.int32)
+        accepting = grammar["accepting"]
+        initial_state = int(grammar["initial_state"])
+
+    table = np.full([len(transitions), 1 + len(tags)], -1, dtype=np.int32)
+    table[:, Model.EOS] = np.where(accepting, np.arange(len(transitions)), -1)
+    for i, tag in enumerate(tags):
+        if tag in token_ids:
+            table[:, 1 + i] = transitions[:, token_ids[tag]]
+    return table, initial_state
+
+
 class Model(tf.keras.Model):
     BOS = EOS = 0
 
@@ -276,6 +468,15 @@ class Model(tf.keras.Model):
             Model.WithAttention([tf.keras.layers.LSTMCell(args.rnn_dim) for _ in range(args.rnn_layers_decoder)], args.rnn_dim), return_sequences=True)
         self._target_output_layer = tf.keras.layers.Dense(1 + len(dataset.tags))
 
+        # Beam size used by predict_step, see set_beam_size
+        self._beam_size = args.beam_size[0]
+
+        # Grammar automaton over the outputs, used to mask the predictions
+        self._grammar_table = None
+        if args.grammar:
+            table, self._grammar_initial_state = load_grammar_table(args.grammar, dataset.tags)
+            self._grammar_table = tf.constant(table)
+
         # Compilation
         if not args.load:
             lr = 1e-3
@@ -299,7 +500,8 @@ class Model(tf.keras.Model):
         return hidden
 
     @tf.function
-    def decoder_inference(self, encoded: tf.Tensor, max_length: tf.Tensor) -> tf.Tensor:
+    def decoder_inference(self, encoded: tf.Tensor, max_length: tf.Tensor, grammar_mask: bool = False) -> tf.Tensor:
+        """Greedy decoding; with `grammar_mask`, only outputs allowed by the grammar automaton are predicted."""
         self._target_rnn.cell.setup_memory(encoded)
 
         batch_size = tf.shape(encoded)[0]
@@ -308,11 +510,22 @@ class Model(tf.keras.Model):
         states = self._target_rnn.cell.get_initial_state(batch_size=batch_size, dtype=tf.float32)
         results = tf.TensorArray(tf.int32, size=max_length)
         result_lengths = tf.fill([batch_size], max_length)
+        if grammar_mask:
+            grammar_states = tf.fill([batch_size], self._grammar_initial_state)
         while tf.math.logical_and(index < max_length, tf.math.reduce_any(result_lengths == max_length)):
             hidden = self._target_embedding(inputs)
             hidden, states = self._target_rnn.cell(hidden, states)
             hidden = self._target_output_layer(hidden)
+            if grammar_mask:
+                # Mask the disallowed outputs, unless the grammar allows none of the model outputs
+                next_states = tf.gather(self._grammar_table, grammar_states)
+                allowed = next_states >= 0
+                allowed |= ~tf.math.reduce_any(allowed, axis=-1, keepdims=True)
+                hidden = tf.where(allowed, hidden, hidden.dtype.min)
             predictions = tf.argmax(hidden, axis=-1, output_type=tf.int32)
+            if grammar_mask:
+                next_states = tf.gather(next_states, predictions, batch_dims=1)
+                grammar_states = tf.where(next_states >= 0, next_states, grammar_states)
             results = results.write(index, predictions)
             result_lengths = tf.where((predictions == Model.EOS) & (result_lengths > index), index, result_lengths)
             inputs = predictions
@@ -320,6 +533,82 @@ class Model(tf.keras.Model):
         results = tf.RaggedTensor.from_tensor(tf.transpose(results.stack()), lengths=result_lengths)
         return results
 
+    @tf.function
+    def decoder_beam_search(self, encoded: tf.Tensor, max_length: tf.Tensor, beam_size: int, grammar_mask: bool = False) -> tf.Tensor:
+        """Beam search decoding, returning the best hypothesis by length-normalized log-probability."""
+        # The encoder memory is tiled once, beams of a batch example are consecutive.
+        encoded = tf.repeat(encoded, beam_size, axis=0)
+        self._target_rnn.cell.setup_memory(encoded)
+
+        batch_size = tf.shape(encoded)[0] // beam_size
+        outputs = self._target_output_layer.units
+        beam_offsets = tf.range(batch_size)[:, tf.newaxis] * beam_size
+        eos_only = tf.where(tf.range(outputs) == Model.EOS, 0., -np.inf)
+        def length_penalty(lengths):
+            return ((5. + tf.cast(lengths, tf.float32)) / 6.) ** self._args.beam_alpha
+
+        index = tf.zeros([], tf.int32)
+        inputs = tf.fill([batch_size * beam_size], Model.BOS)
+        states = self._target_rnn.cell.get_initial_state(batch_size=batch_size * beam_size, dtype=tf.float32)
+        # Only the first beam is alive initially, so that the beams do not start identical.
+        scores = tf.tile(tf.concat([[0.], tf.fill([beam_size - 1], -np.inf)], axis=0)[tf.newaxis], [batch_size, 1])
+        lengths = tf.zeros([batch_size, beam_size], tf.int32)
+        finished = tf.zeros([batch_size, beam_size], tf.bool)
+        if grammar_mask:
+            grammar_states = tf.fill([batch_size * beam_size], self._grammar_initial_state)
+        tokens = tf.TensorArray(tf.int32, size=max_length)
+        parents = tf.TensorArray(tf.int32, size=max_length)
+        while tf.math.logical_and(index < max_length, tf.math.logical_not(tf.math.reduce_all(finished))):
+            hidden = self._target_embedding(inputs)
+            hidden, states = self._target_rnn.cell(hidden, states)
+            hidden = self._target_output_layer(hidden)
+            if grammar_mask:
+                next_states = tf.gather(self._grammar_table, grammar_states)
+                allowed = next_states >= 0
+                allowed |= ~tf.math.reduce_any(allowed, axis=-1, keepdims=True)
+                hidden = tf.where(allowed, hidden, -np.inf)
+            log_probs = tf.reshape(tf.nn.log_softmax(hidden), [batch_size, beam_size, outputs])
+            # Finished hypotheses can only be extended by EOS, without changing their score and length.
+            log_probs = tf.where(finished[:, :, tf.newaxis], eos_only, log_probs)
+            candidate_scores = tf.reshape(scores[:, :, tf.newaxis] + log_probs, [batch_size, beam_size * outputs])
+            candidate_lengths = tf.where(finished, lengths, index + 1)
+            normalized = candidate_scores / tf.repeat(length_penalty(candidate_lengths), outputs, axis=1)
+            _, selected = tf.math.top_k(normalized, k=beam_size)
+
+            beam_parents, predictions = selected // outputs, selected % outputs
+            scores = tf.gather(candidate_scores, selected, batch_dims=1)
+            lengths = tf.gather(candidate_lengths, beam_parents, batch_dims=1)
+            # Hypotheses with zero probability (when there are too few candidates) are finished too.
+            finished = tf.gather(finished, beam_parents, batch_dims=1) | (predictions == Model.EOS) | (scores == -np.inf)
+            tokens = tokens.write(index, predictions)
+            parents = parents.write(index, beam_parents)
+
+            # Reorder the per-beam states by the selected parents.
+            flat_parents = tf.reshape(beam_offsets + beam_parents, [-1])
+            states = tf.nest.map_structure(lambda state: tf.gather(state, flat_parents), states)
+            if grammar_mask:
+                selected_states = tf.gather(tf.reshape(next_states, [batch_size, beam_size * outputs]), selected, batch_dims=1)
+                grammar_states = tf.where(
+                    tf.reshape(selected_states, [-1]) >= 0, tf.reshape(selected_states, [-1]), tf.gather(grammar_states, flat_parents))
+            inputs = tf.reshape(predictions, [-1])
+            index += 1
+
+        # Pick the best hypothesis and follow its parents back to the start.
+        best = tf.argmax(scores / length_penalty(lengths), axis=1, output_type=tf.int32)
+        result_lengths = tf.gather(tf.where(finished, lengths - 1, lengths), best, batch_dims=1)
+        tokens, parents = tokens.stack()[:index], parents.stack()[:index]
+        results = tf.TensorArray(tf.int32, size=index)
+        beam = best
+        for step in tf.range(index - 1, -1, -1):
+            results = results.write(step, tf.gather(tokens[step], beam, batch_dims=1))
+            beam = tf.gather(parents[step], beam, batch_dims=1)
+        results = tf.RaggedTensor.from_tensor(tf.transpose(results.stack()), lengths=result_lengths)
+        return results
+
+    def set_beam_size(self, beam_size: int) -> None:
+        self._beam_size = beam_size
+        self.predict_function = None  # The predict_step must be traced again.
+
     def train_step(self, data):
         x, y = data
         y = tf.concat([y + 1, tf.fill([tf.shape(y)[0], 1], Model.EOS)], axis=-1)[:, :self._args.max_train_length]
@@ -334,7 +623,11 @@ class Model(tf.keras.Model):
         if isinstance(data, tuple):
             data = data[0]
         encoded = self.encoder(data, training=False)
-        y_pred = self.decoder_inference(encoded, self._args.max_predict_length)
+        grammar_mask = self._grammar_table is not None
+        if self._beam_size > 1:
+            y_pred = self.decoder_beam_search(encoded, self._args.max_predict_length, self._beam_size, grammar_mask=grammar_mask)
+        else:
+            y_pred = self.decoder_inference(encoded, self._args.max_predict_length, grammar_mask=grammar_mask)
         return y_pred - 1
 
 
@@ -403,24 +696,28 @@ def main(params: list[str] | None = None) -> None:
     class Evaluator(tf.keras.callbacks.Callback):
         @staticmethod
         def predict(dataset, tag):
+            start = time.time()
             predicted_tags = model.predict(dataset.tf_dataset(), verbose=0)
+            systems_per_second = len(predicted_tags) / (time.time() - start)
             predicted_strings = []
             for tags in predicted_tags:
                 predicted_strings.append(" ".join(train.tags[tag] for tag in tags.numpy()))
             with open(os.path.join(args.logdir, "{}.{}.lmx".format(dataset.basename, tag)), mode="w") as out_file:
                 print(*predicted_strings, sep="\n", file=out_file)
             gold = [entry["lmx"] for entry in dataset.data]
-            metrics = ser_metric.ser_metric(gold, predicted_strings)
+            metrics = ser_metric.ser_metric(gold, predicted_strings, per_class=True)
             with open(os.path.join(args.logdir, "{}.{}.lmx.eval".format(dataset.basename, tag)), mode="w") as eval_file:
                 for metric, value in metrics.items():
                     print("{}: {:.3f}%".format(metric, value), file=eval_file)
-            return metrics
+                print("systems/s: {:.2f}".format(systems_per_second), file=eval_file)
+            return metrics, systems_per_second
 
         def on_epoch_end(self, epoch, logs=None):
             if epoch + 1 < args.epochs and (epoch + 1 < args.evaluation_from or (epoch + 1) % args.evaluation_each != 0):
                 return
             for dataset in devs + (tests if epoch + 1 == args.epochs else []):
-                for metric, value in self.predict(dataset, str(epoch + 1)).items():
+                metrics, _ = self.predict(dataset, str(epoch + 1))
+                for metric, value in metrics.items():
                     logs[f"{dataset.basename}_{metric}"] = value
 
     if args.load:
@@ -428,9 +725,14 @@ def main(params: list[str] | None = None) -> None:
         model.built = True
         model.load_weights(os.path.join(args.load, "weights.h5"))
         os.makedirs(args.logdir, exist_ok=True)
-        for dataset in devs + tests:
-            for metric, value in Evaluator.predict(dataset, tag="predicted").items():
-                print("{} {}: {:.3f}%".format(dataset.basename, metric, value))
+        for beam_size in args.beam_size:
+            model.set_beam_size(beam_size)
+            beam = "" if len(args.beam_size) == 1 else f"-beam{beam_size}"
+            for dataset in devs + tests:
+                metrics, systems_per_second = Evaluator.predict(dataset, tag="predicted" + beam)
+                for metric, value in metrics.items():
+                    print("{}{} {}: {:.3f}%".format(dataset.basename, beam, metric, value))
+                print("{}{} systems/s: {:.2f}".format(dataset.basename, beam, systems_per_second))
     else:
         model.fit(train.tf_dataset(training=True), epochs=args.epochs, callbacks=[Evaluator(), model.tb_callback], verbose=args.verbose)
         model.save_weights(os.path.join(args.logdir, "weights.h5"))
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import os
+import sys
+import time
+import urllib.parse
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")  # Report only TF errors by default
+
+import numpy as np
+import tensorflow as tf
+
+import zeus
+
+sys.path.append("..")
+from app.linearization.batch import delinearize_text
+
+parser = argparse.ArgumentParser()
+parser.add_argument("model", type=str, help="Trained model directory.")
+parser.add_argument("--bucket_width", default=256, type=int, help="Width granularity of the batches, images of one batch fall into the same bucket.")
+parser.add_argument("--grammar", default=None, type=str, help="Grammar automaton .npz masking the predictions.")
+parser.add_argument("--host", default="127.0.0.1", type=str, help="Host to listen on.")
+parser.add_argument("--max_batch_size", default=16, type=int, help="Maximum number of images in a batch.")
+parser.add_argument("--max_latency", default=0.05, type=float, help="Maximum seconds a request waits for its batch to fill.")
+parser.add_argument("--max_predict_length", default=None, type=int, help="Maximum prediction sequence length, the trained one by default.")
+parser.add_argument("--port", default=8000, type=int, help="Port to listen on.")
+parser.add_argument("--threads", default=0, type=int, help="Maximum number of threads to use.")
+parser.add_argument("--transformations", default="", type=str, help="Image transformations, as in the dataset descriptions (comma-separated).")
+parser.add_argument("--unix_socket", default=None, type=str, help="Listen on this Unix socket instead of the host and port.")
+parser.add_argument("--warmup_widths", default=[512, 1024, 1536, 2048, 2560, 3072], nargs="*", type=int, help="Image widths to warm up.")
+
+
+class Recognizer:
+    """The trained Zeus model, recognizing batches of resized images of arbitrary widths."""
+    def __init__(self, args: argparse.Namespace) -> None:
+        # Load the configuration of the trained model, like `zeus.py --load`
+        with open(os.path.join(args.model, "options.json"), mode="r") as options_file:
+            model_args = argparse.Namespace(**{k: v for k, v in json.load(options_file).items() if k not in [
+                "dev", "exp", "load", "test", "threads", "verbose"]})
+        model_args = zeus.parser.parse_args([], namespace=model_args)
+        model_args.load, model_args.grammar = args.model, args.grammar
+        if args.max_predict_length is not None:
+            model_args.max_predict_length = args.max_predict_length
+
+        self.height = model_args.height
+        self.max_predict_length = model_args.max_predict_length
+        self.transformations = [transformation for transformation in args.transformations.split(",") if transformation]
+        train = zeus.LMXDataset.from_tags(os.path.join(args.model, "tags.txt"))
+        self.tags = train.tags
+
+        self.model = zeus.Model(model_args, train)
+        self.model.decoder_inference(self.model.encoder(tf.RaggedTensor.from_tensor(
+            tf.ones([1, self.height, 128, 1], dtype=tf.float32), ragged_rank=2)), 1)
+        self.model.built = True
+        self.model.load_weights(os.path.join(args.model, "weights.h5"))
+
+        # A single trace serves all the batch sizes and widths
+        grammar_mask = args.grammar is not None
+        @tf.function(input_signature=[
+            tf.TensorSpec([None, self.height, None, 1], tf.float32), tf.TensorSpec([None], tf.int32), tf.TensorSpec([], tf.int32)])
+        def recognize(images, widths, max_length):
+            batch_size = tf.shape(images)[0]
+            images = tf.RaggedTensor.from_tensor(images, lengths=(tf.fill([batch_size], self.height), tf.repeat(widths, self.height)))
+            encoded = self.model.encoder(images, training=False)
+            return self.model.decoder_inference(encoded, max_length, grammar_mask=grammar_mask) - 1
+        self._recognize = recognize
+
+    def prepare_image(self, image: bytes) -> np.ndarray:
+        """Decode and resize an encoded PNG/JPG image to the model height."""
+        return zeus.prepare_image(tf.constant(image), self.transformations, self.height).numpy()
+
+    def recognize(self, images: list[np.ndarray], max_length: int | None = None) -> list[str]:
+        """Recognize a batch of prepared images, returning their LMX."""
+        widths = np.array([image.shape[1] for image in images], np.int32)
+        batch = np.zeros([len(images), self.height, max(widths), 1], np.float32)
+        for i, image in enumerate(images):
+            batch[i, :, :image.shape[1]] = image
+        predictions = self._recognize(batch, widths, max_length or self.max_predict_length)
+        return [" ".join(self.tags[tag] for tag in tags) for tags in predictions.to_list()]
+
+    def warmup(self, widths: list[int], batch_sizes: list[int]) -> None:
+        """Trace the recognition and initialize the kernels for the given widths and batch sizes."""
+        for width in widths:
+            for batch_size in batch_sizes:
+                self.recognize([np.ones([self.height, width, 1], np.float32)] * batch_size, max_length=2)
+
+
+class Metrics:
+    """Latency and batching statistics of the server."""
+    def __init__(self, max_batch_size: int, window: int = 10_000) -> None:
+        self._max_batch_size = max_batch_size
+        self._latencies = collections.deque(maxlen=window)
+        self._started = time.time()
+        self.requests, self.failures, self.batches, self.batched_images = 0, 0, 0, 0
+        self.buckets = collections.Counter()
+
+    def add_request(self, latency: float, failed: bool) -> None:
+        self.requests += 1
+        self.failures += failed
+        self._latencies.append(latency)
+
+    def add_batch(self, bucket: int, size: int) -> None:
+        self.batches += 1
+        self.batched_images += size
+        self.buckets[bucket] += size
+
+    def summary(self) -> dict:
+        latencies = 1000 * np.array(self._latencies)
+        return {
+            "uptime_s": time.time() - self._started,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency_p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "latency_p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else None,
+            "batches": self.batches,
+            "mean_batch_size": self.batched_images / self.batches if self.batches else None,
+            "batch_fill": self.batched_images / (self.batches * self._max_batch_size) if self.batches else None,
+            "images_per_bucket": {str(bucket): count for bucket, count in sorted(self.buckets.items())},
+        }
+
+
+class DynamicBatcher:
+    """Groups the prepared images by their width bucket into micro-batches.
+
+    A batch is recognized as soon as it is full, or when its oldest image has waited
+    for `max_latency` seconds. The batches run one at a time in a dedicated thread,
+    so that the event loop keeps accepting requests.
+    """
+    def __init__(self, recognizer: Recognizer, metrics: Metrics, max_batch_size: int, max_latency: float, bucket_width: int) -> None:
+        self._recognizer = recognizer
+        self._metrics = metrics
+        self._max_batch_size = max_batch_size
+        self._max_latency = max_latency
+        self._bucket_width = bucket_width
+        self._executor = concurrent.futures.ThreadPoolExecutor(1)
+        self._pending: dict[int, list[tuple[np.ndarray, asyncio.Future]]] = {}
+        self._timers: dict[int, asyncio.TimerHandle] = {}
+
+    def bucket(self, width: int) -> int:
+        return -(-width // self._bucket_width) * self._bucket_width
+
+    async def recognize(self, image: np.ndarray) -> str:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        bucket = self.bucket(image.shape[1])
+        pending = self._pending.setdefault(bucket, [])
+        pending.append((image, future))
+        if len(pending) >= self._max_batch_size:
+            self._flush(bucket)
+        elif len(pending) == 1:
+            self._timers[bucket] = loop.call_later(self._max_latency, self._flush, bucket)
+        return await future
+
+    def _flush(self, bucket: int) -> None:
+        timer = self._timers.pop(bucket, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(bucket, [])
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(bucket, batch))
+
+    async def _run(self, bucket: int, batch: list[tuple[np.ndarray, asyncio.Future]]) -> None:
+        images, futures = zip(*batch)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self._executor, self._recognizer.recognize, list(images))
+        except Exception as exception:
+            results = [exception] * len(futures)
+        self._metrics.add_batch(bucket, len(batch))
+        for future, result in zip(futures, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class Server:
+    """A minimal HTTP/1.1 server, one request per connection.
+
+    - `POST /recognize[?musicxml=1]` with an encoded PNG/JPG system image as the body
+      returns `{"lmx": ..., "musicxml": ...}`
+    - `GET /metrics` returns the latency and batching statistics
+    - `GET /health` returns `{"status": "ok"}`
+    """
+    def __init__(self, recognizer: Recognizer, batcher: DynamicBatcher, metrics: Metrics) -> None:
+        self._recognizer = recognizer
+        self._batcher = batcher
+        self._metrics = metrics
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+            headers = {}
+            while (line := await reader.readline()) not in [b"\r\n", b"\n", b""]:
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+        except (ValueError, asyncio.IncompleteReadError):
+            status, response = 400, {"error": "Malformed request."}
+        else:
+            status, response = await self.route(method, target, body)
+
+        payload = json.dumps(response, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def route(self, method: str, target: str, body: bytes) -> tuple[int, dict]:
+        url = urllib.parse.urlsplit(target)
+        if method == "GET" and url.path == "/health":
+            return 200, {"status": "ok"}
+        if method == "GET" and url.path == "/metrics":
+            return 200, self._metrics.summary()
+        if method != "POST" or url.path != "/recognize":
+            return 404, {"error": f"Unknown endpoint {method} {url.path}."}
+
+        start = time.time()
+        loop = asyncio.get_running_loop()
+        try:
+            image = await loop.run_in_executor(None, self._recognizer.prepare_image, body)
+            response = {"lmx": await self._batcher.recognize(image)}
+            if urllib.parse.parse_qs(url.query).get("musicxml", ["0"])[0] not in ["", "0", "false"]:
+                response["musicxml"] = await loop.run_in_executor(None, delinearize_text, response["lmx"])
+        except tf.errors.InvalidArgumentError:
+            self._metrics.add_request(time.time() - start, failed=True)
+            return 400, {"error": "The body is not a PNG/JPG image."}
+        except Exception as exception:
+            self._metrics.add_request(time.time() - start, failed=True)
+            return 500, {"error": repr(exception)}
+        self._metrics.add_request(time.time() - start, failed=False)
+        return 200, response
+
+
+async def serve(args: argparse.Namespace) -> None:
+    recognizer = Recognizer(args)
+    start = time.time()
+    recognizer.warmup(sorted(set(-(-width // args.bucket_width) * args.bucket_width for width in args.warmup_widths)),
+                      sorted(set([1, args.max_batch_size])))
+    print("Warmed up {} widths in {:.1f}s".format(len(args.warmup_widths), time.time() - start), file=sys.stderr)
+
+    metrics = Metrics(args.max_batch_size)
+    batcher = DynamicBatcher(recognizer, metrics, args.max_batch_size, args.max_latency, args.bucket_width)
+    server = Server(recognizer, batcher, metrics)
+    if args.unix_socket:
+        listener = await asyncio.start_unix_server(server.handle, path=args.unix_socket)
+    else:
+        listener = await asyncio.start_server(server.handle, args.host, args.port)
+    print("Serving on {}".format(", ".join(str(socket.getsockname()) for socket in listener.sockets)), file=sys.stderr)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(params: list[str] | None = None) -> None:
+    args = parser.parse_args(params)
+
+    tf.config.threading.set_inter_op_parallelism_threads(args.threads)
+    tf.config.threading.set_intra_op_parallelism_threads(args.threads)
+
+    asyncio.run(serve(args))
+
+
+if __name__ == "__main__":
+    main()